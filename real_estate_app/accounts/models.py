@@ -26,6 +26,14 @@ class User(AbstractUser):
     phone_number = models.CharField(max_length=15, blank=True)
     bio = models.TextField(blank=True)
     
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Keyset pagination of the admin users list
+            models.Index(fields=['date_joined', 'id']),
+            # Agent and customer counts and lists of the admin dashboard
+            models.Index(fields=['user_type']),
+        ]
+    
     def is_agent(self):
         return self.user_type == 'agent'
     
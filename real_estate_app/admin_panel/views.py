@@ -1,7 +1,6 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.db.models import Q, Count, Sum
 from django.db.models.functions import Extract
 from django.http import JsonResponse
@@ -19,6 +18,7 @@ import os
 from datetime import datetime, timedelta
 
 from accounts.models import User
+from core.pagination import paginate_request
 from properties.models import Property, PropertyBooking
 from .models import SystemSettings
 
@@ -104,17 +104,16 @@ def admin_users_list(request):
     elif status == 'inactive':
         users = users.filter(is_active=False)
     
-    # Pagination
-    paginator = Paginator(users, 20)
-    page_number = request.GET.get('page')
-    users = paginator.get_page(page_number)
+    # Pagination (keyset pagination with ?cursor=)
+    users, total_count, cursor_page = paginate_request(request, users, 20, ('-date_joined', '-id'))
     
     context = {
         'users': users,
         'search': search,
         'user_type': user_type,
         'status': status,
-        'total_count': paginator.count,
+        'total_count': total_count,
+        'cursor_page': cursor_page,
         'user_types': [
             ('customer', 'Customer'),
             ('agent', 'Agent'),
@@ -200,10 +199,8 @@ def admin_properties_list(request):
     if listing_type:
         properties = properties.filter(listing_type=listing_type)
     
-    # Pagination
-    paginator = Paginator(properties, 20)
-    page_number = request.GET.get('page')
-    properties = paginator.get_page(page_number)
+    # Pagination (keyset pagination with ?cursor=)
+    properties, total_count, cursor_page = paginate_request(request, properties, 20, ('-created_at', '-id'))
     
     context = {
         'properties': properties,
@@ -211,7 +208,8 @@ def admin_properties_list(request):
         'status': status,
         'property_type': property_type,
         'listing_type': listing_type,
-        'total_count': paginator.count,
+        'total_count': total_count,
+        'cursor_page': cursor_page,
     }
     
     return render(request, 'admin_panel/properties/list.html', context)
@@ -262,17 +260,16 @@ def admin_bookings_list(request):
     if booking_type:
         bookings = bookings.filter(booking_type=booking_type)
     
-    # Pagination
-    paginator = Paginator(bookings, 20)
-    page_number = request.GET.get('page')
-    bookings = paginator.get_page(page_number)
+    # Pagination (keyset pagination with ?cursor=)
+    bookings, total_count, cursor_page = paginate_request(request, bookings, 20, ('-created_at', '-id'))
     
     context = {
         'bookings': bookings,
         'search': search,
         'status': status,
         'booking_type': booking_type,
-        'total_count': paginator.count,
+        'total_count': total_count,
+        'cursor_page': cursor_page,
     }
     
     return render(request, 'admin_panel/bookings/list.html', context)
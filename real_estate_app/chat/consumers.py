@@ -0,0 +1,49 @@
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import JsonWebsocketConsumer
+from django.db.models import Q
+
+from . import events
+from .models import ChatRoom
+
+
+class ChatConsumer(JsonWebsocketConsumer):
+    """
+    WebSocket of one open chat tab. Joins the room's group and relays its
+    events (see chat/events.py): {"type": "message", "message": {...}} for
+    every new message and {"type": "read", "reader_id": id} when a
+    participant has read the other's messages. The client sends
+    {"type": "read"} after showing messages it received.
+    """
+
+    def connect(self):
+        self.group = None
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            self.close()
+            return
+
+        room_id = self.scope['url_route']['kwargs']['room_id']
+        self.room = ChatRoom.objects.filter(Q(customer=user) | Q(agent=user), pk=room_id).first()
+        if self.room is None:
+            self.close()
+            return
+
+        self.group = events.group_name(self.room.pk)
+        async_to_sync(self.channel_layer.group_add)(self.group, self.channel_name)
+        self.accept()
+
+    def disconnect(self, code):
+        if self.group:
+            async_to_sync(self.channel_layer.group_discard)(self.group, self.channel_name)
+
+    def receive_json(self, content, **kwargs):
+        if content.get('type') == 'read':
+            events.mark_read(self.room, self.scope['user'])
+
+    # Group events
+
+    def chat_message(self, event):
+        self.send_json({'type': 'message', 'message': event['message']})
+
+    def chat_read(self, event):
+        self.send_json({'type': 'read', 'reader_id': event['reader_id']})
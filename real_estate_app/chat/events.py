@@ -0,0 +1,67 @@
+"""
+Push events for chat rooms, sent over the channel layer.
+
+Every ChatRoom has a group (group_name) that the ChatConsumer of each open
+chat tab joins. New ChatMessage rows are broadcast by a post_save receiver
+in models.py once the transaction commits. Read receipts are broadcast by
+mark_read, which the views and the consumer use to mark messages as read
+(and which lowers the reader's unread count, see unread.py, and tells
+the reader's other pages through notifications.py).
+When the channel layer is missing or unreachable the events are dropped;
+the chat pages then fall back to polling get_messages.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def group_name(room_id):
+    return f'chat_room_{room_id}'
+
+
+def message_payload(message):
+    """JSON form of a ChatMessage, as returned by get_messages (without is_mine)"""
+    return {
+        'id': message.id,
+        'content': message.content,
+        'sender_name': message.sender.get_full_name() or message.sender.username,
+        'sender_id': message.sender_id,
+        'timestamp': message.timestamp.isoformat(),
+        'read': message.read,
+    }
+
+
+def send_to_room(room_id, event):
+    try:
+        layer = get_channel_layer()
+        if layer is not None:
+            async_to_sync(layer.group_send)(group_name(room_id), event)
+    except Exception as e:
+        logger.warning(f"Could not push chat event to room {room_id}: {e}")
+
+
+def broadcast_message(message):
+    send_to_room(message.room_id, {'type': 'chat.message', 'message': message_payload(message)})
+
+
+def mark_read(room, reader):
+    """
+    Mark the messages of `room` sent by the other participant as read and,
+    when any were unread, tell the room after commit. Returns the number of
+    messages marked. The reader's unread count of the room is lowered by as
+    many in the same transaction.
+    """
+    from .notifications import unread_room
+    from .unread import mark_room_read
+
+    with transaction.atomic(savepoint=False):
+        updated = room.messages.filter(read=False).exclude(sender=reader).update(read=True)
+        mark_room_read(reader.pk, room, updated)
+    if updated:
+        unread_room(reader.pk, room, -updated)
+        transaction.on_commit(lambda: send_to_room(room.pk, {'type': 'chat.read', 'reader_id': reader.pk}))
+    return updated
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Recompute the unread message counters of every user from the chat and property messages'
+
+    def handle(self, *args, **options):
+        from chat.unread import rebuild
+
+        self.stdout.write('Rebuilding unread message counters...')
+        rooms, counters = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Updated {rooms} chat rooms and stored {counters} inquiry counters'))
@@ -0,0 +1,38 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def compute_unread_counters(apps, schema_editor):
+    PropertyMessage = apps.get_model('properties', 'PropertyMessage')
+    UnreadCounter = apps.get_model('chat', 'UnreadCounter')
+
+    property_counts = (
+        PropertyMessage.objects.filter(read=False).order_by()
+        .values('property_id')
+        .annotate(count=Count('id'))
+    )
+    UnreadCounter.objects.bulk_create([
+        UnreadCounter(property_id=row['property_id'], count=row['count'])
+        for row in property_counts.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_chatmessage_indexes'),
+        ('properties', '0025_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('property', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='unread_counter', to='properties.property')),
+            ],
+        ),
+        migrations.RunPython(compute_unread_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Left
+
+
+def compute_room_summaries(apps, schema_editor):
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+
+    latest = ChatMessage.objects.filter(room=OuterRef('pk')).order_by('-timestamp', '-id')
+    unread = ChatMessage.objects.filter(room=OuterRef('pk'), read=False).order_by().values('room')
+    ChatRoom.objects.update(
+        last_message_at=Coalesce(Subquery(latest.values('timestamp')[:1]), F('created_at')),
+        last_message_preview=Coalesce(
+            Subquery(latest.annotate(preview=Left('content', 100)).values('preview')[:1]), Value(''),
+        ),
+        last_sender=Subquery(latest.values('sender_id')[:1]),
+        customer_unread_count=Coalesce(Subquery(
+            unread.exclude(sender=OuterRef('customer')).annotate(count=Count('id')).values('count')
+        ), 0),
+        agent_unread_count=Coalesce(Subquery(
+            unread.exclude(sender=OuterRef('agent')).annotate(count=Count('id')).values('count')
+        ), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_unreadcounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, help_text="Time of the newest message (of the room's creation before any)"),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_preview',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_sender',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='customer_unread_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='agent_unread_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(compute_room_summaries, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='chatroom',
+            options={'ordering': ['-last_message_at']},
+        ),
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['customer', 'last_message_at'], name='chat_chatro_custome_333093_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['agent', 'last_message_at'], name='chat_chatro_agent_i_c5a3f0_idx'),
+        ),
+    ]
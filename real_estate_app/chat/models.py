@@ -1,6 +1,19 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
-from properties.models import Property
+from django.contrib.auth import get_user_model
+from django.db.models import F, OuterRef, QuerySet, Subquery, Value
+from django.db.models.functions import Coalesce, Left
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from properties.models import Property, PropertyBooking, PropertyMessage
+
+# Characters of the newest message kept on its ChatRoom
+PREVIEW_LENGTH = 100
+SUMMARY_FIELDS = (
+    'last_message_at', 'last_message_preview', 'last_sender',
+    'customer_unread_count', 'agent_unread_count',
+)
 
 class ChatRoom(models.Model):
     """
@@ -11,13 +24,37 @@ class ChatRoom(models.Model):
     agent = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='agent_chats')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    # Summary of the newest message and the unread messages of each
+    # participant, kept up to date by the ChatMessage receivers below and
+    # by events.mark_read
+    last_message_at = models.DateTimeField(default=timezone.now, editable=False,
+                                           help_text="Time of the newest message (of the room's creation before any)")
+    last_message_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, editable=False)
+    last_sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                    editable=False, related_name='+')
+    customer_unread_count = models.PositiveIntegerField(default=0, editable=False)
+    agent_unread_count = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         unique_together = ('property', 'customer', 'agent')
-        ordering = ['-updated_at']
+        ordering = ['-last_message_at']
+        indexes = [
+            models.Index(fields=['customer', 'last_message_at']),
+            models.Index(fields=['agent', 'last_message_at']),
+        ]
     
     def __str__(self):
         return f"Chat: {self.customer.username} - {self.agent.username} ({self.property.title})"
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # The summary is owned by the ChatMessage receivers; never save a stale copy
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in SUMMARY_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
 
 class ChatMessage(models.Model):
@@ -32,6 +69,182 @@ class ChatMessage(models.Model):
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['room', 'read']),
+            models.Index(fields=['room', 'timestamp']),
+        ]
     
     def __str__(self):
         return f"Message from {self.sender.username} at {self.timestamp}"
+
+
+@receiver(post_save, sender=ChatMessage)
+def broadcast_new_message(sender, instance, created, **kwargs):
+    # Push to the room's open WebSockets (chat/events.py) once committed
+    if created:
+        from .events import broadcast_message
+        transaction.on_commit(lambda: broadcast_message(instance))
+
+
+class UnreadCounter(models.Model):
+    """
+    Number of unread inquiries (PropertyMessage) on a property, counted for
+    whoever is its agent; maintained by chat/unread.py. Chat room counts
+    live on ChatRoom.
+    """
+    property = models.OneToOneField(Property, on_delete=models.CASCADE, related_name='unread_counter')
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.count} unread in {self.property_id}"
+
+
+def latest_message_summary():
+    """update() arguments setting each room's summary from its newest remaining message"""
+    latest = ChatMessage.objects.filter(room=OuterRef('pk')).order_by('-timestamp', '-id')
+    return {
+        'last_message_at': Coalesce(Subquery(latest.values('timestamp')[:1]), F('created_at')),
+        'last_message_preview': Coalesce(
+            Subquery(latest.annotate(preview=Left('content', PREVIEW_LENGTH)).values('preview')[:1]), Value(''),
+        ),
+        'last_sender': Subquery(latest.values('sender_id')[:1]),
+    }
+
+
+def _deleted_with_parent(origin, model):
+    """True when a `model` row is deleted because something it belongs to is"""
+    if origin is None:
+        return False
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return origin_model is not model
+
+
+def _deletes_user(origin, user_id):
+    """True when a delete() started from `origin` may include the user `user_id`"""
+    User = get_user_model()
+    if isinstance(origin, QuerySet):
+        return origin.model is User
+    return isinstance(origin, User) and origin.pk == user_id
+
+
+def _remember_read_state(model, instance):
+    instance._previous_read = None
+    if instance.pk:
+        instance._previous_read = model.objects.filter(pk=instance.pk).values_list('read', flat=True).first()
+
+
+def _unread_delta(instance, created):
+    """+1/-1/0 change of a message's unread state caused by a save"""
+    if created or instance._previous_read is None:
+        return 0 if instance.read else 1
+    return int(instance._previous_read) - int(instance.read)
+
+
+@receiver(pre_save, sender=ChatMessage)
+def remember_chat_message_read(sender, instance, **kwargs):
+    _remember_read_state(ChatMessage, instance)
+
+
+@receiver(post_save, sender=ChatMessage)
+def update_room_summary(sender, instance, created, **kwargs):
+    from . import notifications, unread
+    room = instance.room
+    delta = _unread_delta(instance, created)
+    recipients = unread.room_recipients(room, instance.sender_id)
+    # One UPDATE for the newest message and the recipients' unread counts
+    changes = unread.room_count_changes(room, recipients, delta)
+    if created:
+        changes.update(
+            last_message_at=instance.timestamp,
+            last_message_preview=instance.content[:PREVIEW_LENGTH],
+            last_sender_id=instance.sender_id,
+            updated_at=timezone.now(),
+        )
+    if changes:
+        ChatRoom.objects.filter(pk=room.pk).update(**changes)
+    for user_id in recipients:
+        if delta:
+            unread.invalidate_on_commit(user_id)
+            notifications.unread_room(user_id, room, delta)
+        if created:
+            notifications.chat_message(user_id, instance)
+
+
+@receiver(post_delete, sender=ChatMessage)
+def update_room_summary_on_delete(sender, instance, origin=None, **kwargs):
+    from . import notifications, unread
+    if _deleted_with_parent(origin, ChatMessage):
+        # Its room (or the room's property or a participant) is being
+        # deleted, so the room goes too; nothing to update
+        return
+    room = instance.room
+    recipients = unread.room_recipients(room, instance.sender_id) if not instance.read else []
+    changes = unread.room_count_changes(room, recipients, -1)
+    changes.update(latest_message_summary())
+    ChatRoom.objects.filter(pk=room.pk).update(**changes)
+    for user_id in recipients:
+        unread.invalidate_on_commit(user_id)
+        notifications.unread_room(user_id, room, -1)
+
+
+@receiver(post_delete, sender=ChatRoom)
+def forget_room_unread_counts(sender, instance, **kwargs):
+    # The room's counts go with it (its messages skip their receivers)
+    from . import unread
+    for user_id in (instance.customer_id, instance.agent_id):
+        unread.invalidate_on_commit(user_id)
+
+
+@receiver(post_delete, sender=Property)
+def forget_property_unread_counts(sender, instance, **kwargs):
+    # Its inquiry counter cascades away without uncount_property_message
+    from . import unread
+    unread.invalidate_on_commit(instance.agent_id)
+
+
+@receiver(post_save, sender=Property)
+def move_property_unread_counts(sender, instance, **kwargs):
+    # The inquiry counter follows the property to its new agent
+    previous = getattr(instance, '_previous_agent_id', None)
+    if previous is not None and previous != instance.agent_id:
+        from . import unread
+        unread.invalidate_on_commit(previous)
+        unread.invalidate_on_commit(instance.agent_id)
+
+
+@receiver(pre_save, sender=PropertyMessage)
+def remember_property_message_read(sender, instance, **kwargs):
+    _remember_read_state(PropertyMessage, instance)
+
+
+@receiver(post_save, sender=PropertyMessage)
+def count_property_message(sender, instance, created, **kwargs):
+    from . import notifications
+    from .unread import add
+    delta = _unread_delta(instance, created)
+    if delta:
+        add(instance.property.agent_id, instance.property_id, delta)
+        notifications.unread_property(instance.property.agent_id, instance.property_id, delta)
+    if created:
+        notifications.property_message(instance)
+
+
+@receiver(post_delete, sender=PropertyMessage)
+def uncount_property_message(sender, instance, origin=None, **kwargs):
+    from . import notifications
+    from .unread import add
+    if _deleted_with_parent(origin, PropertyMessage) and not _deletes_user(origin, instance.sender_id):
+        # The property (and its counter) or its agent is being deleted; only
+        # a deleted sender's inquiries still count on a remaining property
+        return
+    if not instance.read:
+        add(instance.property.agent_id, instance.property_id, -1)
+        notifications.unread_property(instance.property.agent_id, instance.property_id, -1)
+
+
+@receiver(post_save, sender=PropertyBooking)
+def notify_new_booking(sender, instance, created, **kwargs):
+    # Live notification for the property's agent (notifications.py)
+    if created:
+        from .notifications import booking
+        booking(instance)
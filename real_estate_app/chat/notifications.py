@@ -0,0 +1,129 @@
+"""
+Live notifications for each signed-in user, streamed to the browser as
+server-sent events by the notification_stream view (see stream()).
+
+Every user has a pub/sub channel (pubsub.py). Once the transaction that
+caused them commits, the receivers in models.py and events.mark_read
+publish these events on it:
+
+    unread            an unread counter changed by `delta`; scope 'room'
+                      (room_id, property_id, customer_id) or 'property'
+                      (property_id, for the agent's inquiries)
+    chat_message      a new ChatMessage for the user
+    property_message  a new inquiry on one of the agent's properties
+    booking           a new booking or visit request on one of the
+                      agent's properties
+
+The stream opens with a `snapshot` of the user's unread counters and
+sends a new one whenever the subscriber fell behind and lost events. It
+replaces polling chat/unread-counts/.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+
+from . import pubsub
+
+# Seconds between comment lines that keep idle connections open through proxies
+KEEPALIVE_SECONDS = 15
+# Milliseconds the browser waits before reconnecting a dropped stream
+RETRY_MS = 5000
+
+
+def channel_name(user_id):
+    return f'notifications.user.{user_id}'
+
+
+def notify(user_id, event):
+    """Publish an event to a user once the current transaction commits"""
+    if user_id:
+        transaction.on_commit(lambda: pubsub.publish(channel_name(user_id), event))
+
+
+def unread_room(user_id, room, delta):
+    notify(user_id, {
+        'type': 'unread',
+        'scope': 'room',
+        'room_id': room.pk,
+        'property_id': room.property_id,
+        'customer_id': room.customer_id,
+        'delta': delta,
+    })
+
+
+def unread_property(user_id, property_id, delta):
+    notify(user_id, {'type': 'unread', 'scope': 'property', 'property_id': property_id, 'delta': delta})
+
+
+def chat_message(user_id, message):
+    from .events import message_payload
+
+    notify(user_id, {
+        'type': 'chat_message',
+        'room_id': message.room_id,
+        'property_id': message.room.property_id,
+        'message': message_payload(message),
+    })
+
+
+def property_message(message):
+    notify(message.property.agent_id, {
+        'type': 'property_message',
+        'id': message.pk,
+        'property_id': message.property_id,
+        'property_title': message.property.title,
+        'sender_name': message.sender.get_full_name() or message.sender.username,
+        'content': message.content,
+        'timestamp': message.timestamp.isoformat(),
+    })
+
+
+def booking(booking):
+    notify(booking.property_ref.agent_id, {
+        'type': 'booking',
+        'id': booking.pk,
+        'property_id': booking.property_ref_id,
+        'property_title': booking.property_ref.title,
+        'booking_type': booking.booking_type,
+        'status': booking.status,
+        'customer_name': booking.customer_name,
+        'preferred_date': booking.preferred_date.isoformat() if booking.preferred_date else None,
+        'created_at': booking.created_at.isoformat(),
+    })
+
+
+def snapshot(user):
+    """The user's unread counters, as the first event of a stream"""
+    from .unread import get_counts
+
+    counts = get_counts(user)
+    return {
+        'type': 'snapshot',
+        'rooms': [
+            {'room_id': room_id, 'property_id': row.property_id, 'customer_id': row.customer_id, 'count': row.count}
+            for room_id, row in counts.rooms.items()
+        ],
+        'properties': {str(property_id): count for property_id, count in counts.properties.items()},
+    }
+
+
+def format_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+async def stream(user):
+    """Server-sent event stream of a user's notifications (never ends by itself)"""
+    yield f'retry: {RETRY_MS}\n\n'
+    async with pubsub.get_broker().subscribe(channel_name(user.pk)) as subscription:
+        yield format_event(await sync_to_async(snapshot)(user))
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event['type'] == pubsub.RESYNC['type']:
+                event = await sync_to_async(snapshot)(user)
+            yield format_event(event)
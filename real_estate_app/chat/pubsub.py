@@ -0,0 +1,156 @@
+"""
+Publish/subscribe for live notifications.
+
+Sync code (views, model receivers) publishes JSON-serialisable messages
+on a named channel; async code (the notification stream) subscribes to a
+channel and awaits them:
+
+    get_broker().publish('notifications.user.7', {'type': 'unread', ...})
+
+    async with get_broker().subscribe('notifications.user.7') as subscription:
+        message = await subscription.get()
+
+NOTIFICATION_BROKER names the Broker class. InProcessBroker, the default,
+only reaches subscribers in the publishing process, which suits a single
+ASGI worker. ChannelLayerBroker goes through the Channels layer
+(CHANNEL_LAYERS), so with Redis it reaches the subscribers of every
+worker. Channel names may only use ASCII letters, digits, '-', '_' and '.'.
+
+A subscriber that falls QUEUE_SIZE messages behind loses them and gets
+RESYNC instead, after which it should reload its state.
+"""
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 100
+RESYNC = {'type': 'resync'}
+
+
+class Broker:
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        """An async context manager yielding an object with `async get()`"""
+        raise NotImplementedError
+
+
+class _QueueSubscription:
+    """Messages for one subscriber, delivered to its event loop from any thread"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def _put(self, message):
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = RESYNC
+        self.queue.put_nowait(message)
+
+    def deliver(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The subscriber's loop is closed; it unsubscribes on its way out
+            pass
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class InProcessBroker(Broker):
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.deliver(message)
+
+    def subscribe(self, channel):
+        return _InProcessSubscribe(self, channel)
+
+
+class _InProcessSubscribe:
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+
+    async def __aenter__(self):
+        self.subscription = _QueueSubscription(asyncio.get_running_loop())
+        with self.broker._lock:
+            self.broker._subscriptions[self.channel].add(self.subscription)
+        return self.subscription
+
+    async def __aexit__(self, *exc_info):
+        with self.broker._lock:
+            subscriptions = self.broker._subscriptions[self.channel]
+            subscriptions.discard(self.subscription)
+            if not subscriptions:
+                del self.broker._subscriptions[self.channel]
+
+
+class ChannelLayerBroker(Broker):
+    """Channels are channel layer groups; every subscriber has its own layer channel"""
+
+    def publish(self, channel, message):
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+
+        async_to_sync(get_channel_layer().group_send)(channel, {'type': 'pubsub.message', 'message': message})
+
+    def subscribe(self, channel):
+        return _ChannelLayerSubscribe(channel)
+
+
+class _ChannelLayerSubscribe:
+    def __init__(self, group):
+        self.group = group
+
+    async def __aenter__(self):
+        from channels.layers import get_channel_layer
+
+        self.layer = get_channel_layer()
+        self.channel_name = await self.layer.new_channel()
+        await self.layer.group_add(self.group, self.channel_name)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.layer.group_discard(self.group, self.channel_name)
+
+    async def get(self):
+        event = await self.layer.receive(self.channel_name)
+        return event['message']
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'NOTIFICATION_BROKER', 'chat.pubsub.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def publish(channel, message):
+    """Publish, logging (not raising) broker errors so the caller's request still succeeds"""
+    try:
+        get_broker().publish(channel, message)
+    except Exception as e:
+        logger.warning(f"Could not publish to {channel}: {e}")
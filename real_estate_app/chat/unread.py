@@ -0,0 +1,167 @@
+"""
+Per-user unread message counts for chat rooms and property inquiries.
+
+Badges used to count unread ChatMessage / PropertyMessage rows on every
+page. Instead, each ChatRoom carries the unread count of its customer and
+of its agent, and UnreadCounter (models.py) keeps one row per property for
+inquiries, counted for the property's current agent. The receivers in models.py adjust them in the
+same transaction as the message insert, read flag change or delete, and
+mark_read in events.py takes the messages it marks read off the reader's
+count. A user's non-zero counts are cached as one entry for
+UNREAD_COUNTS_CACHE_TTL seconds and dropped whenever one of them changes, so
+a badge is one cache read; the cache has to be shared by all worker
+processes (CACHE_REDIS_URL in settings) for the drop to reach every worker.
+
+rebuild() recomputes every count from the messages (rebuild_unread_counters
+management command) in case they drift, e.g. after raw SQL changes.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+KEY_PREFIX = 'chat:unread'
+
+# rooms: {room_id: RoomUnread}; properties: {property_id: count} (as agent)
+UnreadCounts = namedtuple('UnreadCounts', ['rooms', 'properties'])
+RoomUnread = namedtuple('RoomUnread', ['property_id', 'customer_id', 'count'])
+
+
+def get_ttl():
+    return getattr(settings, 'UNREAD_COUNTS_CACHE_TTL', 300)
+
+
+def _key(user_id):
+    return f'{KEY_PREFIX}:{user_id}'
+
+
+def invalidate_user(user_id):
+    cache.delete(_key(user_id))
+
+
+def invalidate_on_commit(user_id):
+    transaction.on_commit(lambda: invalidate_user(user_id))
+
+
+def get_counts(user):
+    """UnreadCounts of a user, with only the non-zero counts"""
+    key = _key(user.pk)
+    cached = cache.get(key)
+    if cached is not None:
+        rooms, properties = cached
+        return UnreadCounts({room_id: RoomUnread(*row) for room_id, row in rooms.items()}, properties)
+
+    from .models import ChatRoom, UnreadCounter
+
+    rooms = {}
+    rows = ChatRoom.objects.filter(
+        Q(customer=user, customer_unread_count__gt=0) | Q(agent=user, agent_unread_count__gt=0)
+    ).order_by().values_list('pk', 'property_id', 'customer_id', 'customer_unread_count', 'agent_unread_count')
+    for room_id, property_id, customer_id, customer_unread, agent_unread in rows:
+        count = customer_unread if customer_id == user.pk else agent_unread
+        if count:
+            rooms[room_id] = RoomUnread(property_id, customer_id, count)
+    properties = dict(
+        UnreadCounter.objects.filter(property__agent=user, count__gt=0).values_list('property_id', 'count')
+    )
+    cache.set(key, ({room_id: tuple(row) for room_id, row in rooms.items()}, properties), get_ttl())
+    return UnreadCounts(rooms, properties)
+
+
+def chat_total(user):
+    return sum(row.count for row in get_counts(user).rooms.values())
+
+
+def property_total(user):
+    return sum(get_counts(user).properties.values())
+
+
+def room_recipients(room, sender_id):
+    """Participants of a room that a message from `sender_id` is unread for"""
+    return [user_id for user_id in (room.customer_id, room.agent_id) if user_id != sender_id]
+
+
+def _room_column(room, user_id):
+    return 'customer_unread_count' if user_id == room.customer_id else 'agent_unread_count'
+
+
+def room_count_changes(room, user_ids, delta):
+    """ChatRoom update() arguments adding `delta` to the unread counts of the participants `user_ids`"""
+    if not delta:
+        return {}
+    changes = {}
+    for user_id in user_ids:
+        column = _room_column(room, user_id)
+        changes[column] = Greatest(F(column) + delta, 0)
+    return changes
+
+
+def mark_room_read(user_id, room, count):
+    """
+    Take `count` messages just marked read off a participant's unread count
+    of a room; messages that arrived after they were marked stay counted
+    """
+    from .models import ChatRoom
+
+    column = _room_column(room, user_id)
+    if count and ChatRoom.objects.filter(pk=room.pk).update(**{column: Greatest(F(column) - count, 0)}):
+        invalidate_on_commit(user_id)
+
+
+def add(agent_id, property_id, delta):
+    """Add `delta` to the unread inquiry counter of a property (never below 0) for its agent"""
+    from .models import UnreadCounter
+
+    if not delta:
+        return
+    counters = UnreadCounter.objects.filter(property_id=property_id)
+    if not counters.update(count=Greatest(F('count') + delta, 0)) and delta > 0:
+        try:
+            with transaction.atomic():
+                UnreadCounter.objects.create(property_id=property_id, count=delta)
+        except IntegrityError:
+            # Created by a concurrent message in the meantime
+            counters.update(count=F('count') + delta)
+    if agent_id:
+        invalidate_on_commit(agent_id)
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute every unread count from the unread messages; returns (rooms, inquiry counters)"""
+    from properties.models import PropertyMessage
+    from .models import ChatMessage, ChatRoom, UnreadCounter
+
+    unread = ChatMessage.objects.filter(room=OuterRef('pk'), read=False).order_by().values('room')
+    rooms = ChatRoom.objects.update(
+        customer_unread_count=Coalesce(Subquery(
+            unread.exclude(sender=OuterRef('customer')).annotate(count=Count('id')).values('count')
+        ), 0),
+        agent_unread_count=Coalesce(Subquery(
+            unread.exclude(sender=OuterRef('agent')).annotate(count=Count('id')).values('count')
+        ), 0),
+    )
+
+    property_counts = (
+        PropertyMessage.objects.filter(read=False).order_by()
+        .values('property_id', 'property__agent_id')
+        .annotate(count=Count('id'))
+    )
+    # Agents whose counters are replaced, and participants of every room,
+    # may have cached counts
+    user_ids = set(UnreadCounter.objects.values_list('property__agent_id', flat=True))
+    for customer_id, agent_id in ChatRoom.objects.values_list('customer_id', 'agent_id').iterator():
+        user_ids.update((customer_id, agent_id))
+
+    UnreadCounter.objects.all().delete()
+    counters = []
+    for row in property_counts.iterator():
+        counters.append(UnreadCounter(property_id=row['property_id'], count=row['count']))
+        user_ids.add(row['property__agent_id'])
+    UnreadCounter.objects.bulk_create(counters, batch_size=1000)
+
+    transaction.on_commit(lambda: cache.delete_many([_key(user_id) for user_id in user_ids]))
+    return rooms, len(counters)
@@ -9,5 +9,6 @@ urlpatterns = [
     path('property/<int:property_id>/send/', views.send_message, name='send_message'),
     path('property/<int:property_id>/messages/', views.get_messages, name='get_messages'),
     path('unread-counts/', views.unread_counts, name='unread_counts'),
+    path('notifications/stream/', views.notification_stream, name='notification_stream'),
     path('list/', views.chat_list, name='chat_list'),
 ]
@@ -1,52 +1,65 @@
+from collections import defaultdict
+
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Q, Max, Count
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
 from properties.models import Property
 from .models import ChatRoom, ChatMessage
+from . import events, notifications, unread
 from django.core.paginator import Paginator
 
+# get_messages page size (default and maximum ?limit)
+MESSAGES_PAGE_SIZE = 50
+MAX_MESSAGES_PAGE_SIZE = 200
+
 
 @login_required
 def agent_chat_overview(request):
     """Agent overview of all properties and their conversations"""
-    # Get all properties owned by the agent
-    properties = Property.objects.filter(agent=request.user).annotate(
-        conversation_count=Count('chatrooms'),
-        last_activity=Max('chatrooms__messages__timestamp')
-    ).order_by('-last_activity')
-    
-    # Calculate statistics
-    total_properties = properties.count()
-    total_conversations = ChatRoom.objects.filter(property__agent=request.user).count()
-    unread_count = ChatMessage.objects.filter(
-        room__property__agent=request.user,
-        read=False
-    ).exclude(sender=request.user).count()
-    
-    # Active today (conversations with messages today)
-    today = timezone.now().date()
-    active_today = ChatRoom.objects.filter(
-        property__agent=request.user,
-        messages__timestamp__date=today
-    ).distinct().count()
+    # All conversations, newest activity first, in one indexed query; the
+    # last message and unread counts are columns of ChatRoom
+    chat_rooms = ChatRoom.objects.filter(agent=request.user).select_related(
+        'customer', 'last_sender'
+    ).order_by('-last_message_at')
+    conversations = defaultdict(list)
+    for chat_room in chat_rooms:
+        conversations[chat_room.property_id].append(chat_room)
     
-    # Add additional data to properties
+    # Properties with the most recent conversations first, then the rest
+    activity_order = {property_id: position for position, property_id in enumerate(conversations)}
+    properties = sorted(
+        Property.objects.filter(agent=request.user).order_by('-created_at'),
+        key=lambda prop: activity_order.get(prop.id, len(activity_order)),
+    )
     for prop in properties:
-        prop.has_unread_messages = ChatMessage.objects.filter(
-            room__property=prop,
-            read=False
-        ).exclude(sender=request.user).exists()
+        prop.conversations = conversations.get(prop.id, [])
+        prop.conversation_count = len(prop.conversations)
+        prop.has_unread_messages = any(chat_room.agent_unread_count for chat_room in prop.conversations)
+    
+    # Calculate statistics
+    listed_rooms = [chat_room for prop in properties for chat_room in prop.conversations]
+    now = timezone.localtime() if settings.USE_TZ else timezone.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
     
     context = {
         'properties': properties,
-        'total_properties': total_properties,
-        'total_conversations': total_conversations,
-        'unread_count': unread_count,
-        'active_today': active_today,
+        'total_properties': len(properties),
+        'total_conversations': len(listed_rooms),
+        'unread_count': sum(chat_room.agent_unread_count for chat_room in listed_rooms),
+        # Conversations with messages today
+        'active_today': sum(
+            1 for chat_room in listed_rooms
+            if chat_room.last_sender_id and chat_room.last_message_at >= today
+        ),
     }
     return render(request, 'chat/agent_chat_list.html', context)
 
@@ -56,25 +69,33 @@ def unread_counts(request):
     """Get unread message counts for agent dashboard"""
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         if hasattr(request.user, 'is_agent') and request.user.is_agent():
-            # Get unread counts grouped by property and customer
-            unread_messages = ChatMessage.objects.filter(
-                room__property__agent=request.user,
-                read=False
-            ).exclude(sender=request.user).values(
-                'room__property__id',
-                'room__customer__id'
-            ).annotate(count=Count('id'))
-            
-            counts = {}
-            for item in unread_messages:
-                key = f"{item['room__property__id']}_{item['room__customer__id']}"
-                counts[key] = item['count']
+            # Unread counts by property and customer, from the counter cache
+            counts = {
+                f"{row.property_id}_{row.customer_id}": row.count
+                for row in unread.get_counts(request.user).rooms.values()
+                if row.customer_id != request.user.pk
+            }
             
             return JsonResponse({'success': True, 'counts': counts})
     
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
 
+@login_required
+async def notification_stream(request):
+    """Server-sent events with the user's unread count changes, messages and bookings"""
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server would buffer the endless stream; 204 stops EventSource
+        # from reconnecting and the page polls instead
+        return HttpResponse(status=204)
+    user = await request.auser()
+    response = StreamingHttpResponse(notifications.stream(user), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def property_chat(request, property_id):
     """
@@ -88,9 +109,7 @@ def property_chat(request, property_id):
         chat_rooms = ChatRoom.objects.filter(
             property=property_obj,
             agent=request.user
-        ).select_related('customer').annotate(
-            last_message_time=Max('messages__timestamp')
-        ).order_by('-last_message_time')
+        ).select_related('customer').order_by('-last_message_at')
         
         # If specific customer_id is provided, show that conversation
         customer_id = request.GET.get('customer_id')
@@ -106,11 +125,10 @@ def property_chat(request, property_id):
                     customer=specific_customer,
                     agent=request.user
                 )
-                messages_list = current_chat.messages.all().order_by('timestamp')
+                messages_list = current_chat.messages.select_related('sender').order_by('timestamp')
                 
                 # Mark messages as read for agent
-                unread_messages = messages_list.filter(read=False).exclude(sender=request.user)
-                unread_messages.update(read=True)
+                events.mark_read(current_chat, request.user)
                 
                 return render(request, 'chat/agent_chat_detail.html', {
                     'property': property_obj,
@@ -135,11 +153,10 @@ def property_chat(request, property_id):
             agent=property_obj.agent
         )
         
-        messages_list = chat_room.messages.all().order_by('timestamp')
+        messages_list = chat_room.messages.select_related('sender').order_by('timestamp')
         
         # Mark agent messages as read for customer
-        unread_messages = messages_list.filter(read=False).exclude(sender=request.user)
-        unread_messages.update(read=True)
+        events.mark_read(chat_room, request.user)
         
         return render(request, 'chat/customer_chat.html', {
             'property': property_obj,
@@ -187,15 +204,14 @@ def send_message(request, property_id):
             agent=property_obj.agent
         )
     
-    # Create the message
-    message = ChatMessage.objects.create(
-        room=chat_room,
-        sender=request.user,
-        content=content
-    )
-    
-    # Update chat room timestamp
-    chat_room.save()  # This updates the updated_at field
+    # Create the message (the room's summary and unread counts are updated
+    # in the same transaction)
+    with transaction.atomic():
+        message = ChatMessage.objects.create(
+            room=chat_room,
+            sender=request.user,
+            content=content
+        )
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({
@@ -221,6 +237,12 @@ def send_message(request, property_id):
 def get_messages(request, property_id):
     """
     Get messages for a property chat (AJAX endpoint)
+    
+    ?since_id=N returns the messages after N (for polling), ?before_id=N the
+    page before N (for scrolling back), neither the latest page; ?limit sets
+    the page size. has_more tells whether another page follows in that
+    direction. Responses carry an ETag, and a matching If-None-Match gets a
+    304 when the room has not changed.
     """
     property_obj = get_object_or_404(Property, id=property_id)
     
@@ -247,26 +269,66 @@ def get_messages(request, property_id):
         except ChatRoom.DoesNotExist:
             return JsonResponse({'success': True, 'messages': []})
     
-    messages_list = chat_room.messages.all().order_by('timestamp')
+    try:
+        since_id = int(request.GET.get('since_id', 0))
+        before_id = int(request.GET['before_id']) if request.GET.get('before_id') else None
+        limit = min(max(int(request.GET.get('limit', MESSAGES_PAGE_SIZE)), 1), MAX_MESSAGES_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid since_id, before_id or limit'}, status=400)
     
-    # Mark unread messages as read
-    unread_messages = messages_list.filter(read=False).exclude(sender=request.user)
-    unread_messages.update(read=True)
+    # The room's state in one query: nothing changed for the client if the
+    # newest message and the number of unread messages are the same
+    state = chat_room.messages.aggregate(
+        latest_id=Max('id'),
+        unread=Count('id', filter=Q(read=False)),
+        unread_for_me=Count('id', filter=Q(read=False) & ~Q(sender=request.user)),
+    )
+    
+    # Mark unread messages as read (one UPDATE, only when there are any)
+    if state['unread_for_me']:
+        events.mark_read(chat_room, request.user)
+    
+    etag = quote_etag(
+        f"{chat_room.pk}-{state['latest_id'] or 0}-{state['unread'] - state['unread_for_me']}"
+        f"-{since_id}-{before_id or ''}-{limit}"
+    )
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    
+    # Newer than since_id (oldest first), older than before_id, or the
+    # latest page; returned in chronological order either way
+    messages_list = chat_room.messages.select_related('sender')
+    if since_id and before_id is None:
+        page = list(messages_list.filter(id__gt=since_id).order_by('id')[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+    else:
+        if before_id is not None:
+            messages_list = messages_list.filter(id__lt=before_id)
+        page = list(messages_list.order_by('-id')[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit][::-1]
     
     messages_data = [{
         'id': msg.id,
         'content': msg.content,
         'sender_name': msg.sender.get_full_name() or msg.sender.username,
-        'sender_id': msg.sender.id,
+        'sender_id': msg.sender_id,
         'timestamp': msg.timestamp.isoformat(),
-        'is_mine': msg.sender == request.user,
+        'is_mine': msg.sender_id == request.user.id,
         'read': msg.read
-    } for msg in messages_list]
+    } for msg in page]
     
-    return JsonResponse({
+    response = JsonResponse({
         'success': True,
-        'messages': messages_data
+        'messages': messages_data,
+        'has_more': has_more,
     })
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @login_required
@@ -278,16 +340,13 @@ def chat_list(request):
         # Agent - show all chats across all properties
         chat_rooms = ChatRoom.objects.filter(
             agent=request.user
-        ).select_related('property', 'customer').annotate(
-            last_message_time=Max('messages__timestamp')
-        ).order_by('-last_message_time')
+        ).select_related('property', 'customer', 'last_sender')
     else:
         # Customer - show all chats
         chat_rooms = ChatRoom.objects.filter(
             customer=request.user
-        ).select_related('property', 'agent').annotate(
-            last_message_time=Max('messages__timestamp')
-        ).order_by('-last_message_time')
+        ).select_related('property', 'agent', 'last_sender')
+    chat_rooms = chat_rooms.prefetch_related('property__images').order_by('-last_message_at')
     
     return render(request, 'chat/chat_list.html', {
         'chat_rooms': chat_rooms
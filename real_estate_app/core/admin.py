@@ -1,3 +1,10 @@
 from django.contrib import admin
+from .models import BackgroundTask
 
-# Register your models here.
+
+@admin.register(BackgroundTask)
+class BackgroundTaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'key', 'status', 'attempts', 'created_at', 'started_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'key', 'last_error')
+    readonly_fields = ('created_at', 'started_at', 'claimed_by', 'last_error')
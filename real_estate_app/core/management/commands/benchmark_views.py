@@ -0,0 +1,345 @@
+import json
+import math
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+# Most queries any run of a view may issue; more fails the benchmark. These
+# are the counts measured with the default dataset: lower them when a view
+# gets cheaper. --budgets FILE replaces them and can also set "max_ms" (95th
+# percentile wall time) per view.
+QUERY_BUDGETS = {
+    'property_list': 23,
+    'property_detail': 11,
+    # Thumbnails and search history are fetched once for the whole page; the
+    # warm runs add the embedding read of semantic ranking
+    'search_properties': 12,
+    'search_suggestions': 2,
+    'similar_properties': 5,
+    'dashboard_customer': 16,
+    # Includes the two queries of a cold unread count cache (chat/unread.py)
+    'dashboard_agent': 12,
+    'admin_dashboard': 31,
+    # Conversations and properties, plus a cold unread count cache
+    'agent_chat_overview': 6,
+    # Includes resetting the reader's unread count
+    'get_messages': 9,
+}
+
+TITLE_WORDS = [
+    'Modern', 'Spacious', 'Cozy', 'Luxury', 'Family', 'Sunny', 'Quiet', 'Renovated',
+    'Garden', 'Lake View', 'Mountain View', 'Corner', 'Furnished', 'Duplex', 'Penthouse',
+]
+AREAS = [
+    'Baneshwor', 'Lazimpat', 'Baluwatar', 'Jhamsikhel', 'Thamel', 'Boudha', 'Budhanilkantha',
+    'Kalanki', 'Koteshwor', 'Sanepa', 'Bhaktapur', 'Lakeside', 'Chabahil', 'Maharajgunj',
+]
+DESCRIPTION_WORDS = [
+    'parking', 'balcony', 'garden', 'garage', 'furnished', 'security', 'school', 'market',
+    'hospital', 'view', 'terrace', 'kitchen', 'modular', 'marble', 'water', 'backup', 'road',
+]
+SEARCH_QUERIES = [
+    'house', 'apartment baneshwor', 'villa', 'lake view', 'furnished apartment', 'garden house',
+    'condo lazimpat', 'parking', 'family house bhaktapur', 'rent thamel',
+]
+
+
+def seed_dataset(rng, users, agents, properties, images, bookings, chats, messages, searches):
+    """
+    Bulk-insert a synthetic catalogue and rebuild the indexes that model
+    receivers would otherwise maintain. Returns the objects the views are
+    requested as/for.
+    """
+    from accounts.models import User
+    from chat import unread
+    from chat.models import ChatMessage, ChatRoom, latest_message_summary
+    from properties import fulltext, lsh
+    from properties.geo import encode
+    from properties.keywords import apply_keyword_masks
+    from properties.models import Favorite, Property, PropertyBooking, PropertyImage, update_booking_state
+    from properties.similarity import refresh_neighbours
+    from search.models import SearchHistory
+
+    run = uuid.uuid4().hex[:8]
+
+    def make_users(count, user_type):
+        created = []
+        for index in range(count):
+            user = User(
+                username=f'bench-{run}-{user_type}-{index}', email=f'{user_type}{index}@{run}.example.com',
+                first_name=user_type.title(), last_name=str(index), user_type=user_type,
+            )
+            user.set_unusable_password()
+            created.append(user)
+        return User.objects.bulk_create(created, batch_size=1000)
+
+    customer_users = make_users(users, 'customer')
+    agent_users = make_users(agents, 'agent')
+    admin = User.objects.create_superuser(f'bench-{run}-admin', f'admin@{run}.example.com', None)
+
+    listings = []
+    for index in range(properties):
+        area = rng.choice(AREAS)
+        bedrooms = rng.randint(1, 6)
+        prop = Property(
+            title=f'{rng.choice(TITLE_WORDS)} {bedrooms} BHK {rng.choice(["House", "Apartment", "Villa", "Flat"])} in {area}',
+            address=f'{rng.randint(1, 400)} {area} Marg, {area}',
+            latitude=Decimal(f'{27.6 + rng.random() * 0.2:.8f}'),
+            longitude=Decimal(f'{85.2 + rng.random() * 0.3:.8f}'),
+            price=Decimal(rng.randrange(20, 2000) * 10000),
+            bedrooms=bedrooms,
+            bathrooms=Decimal(rng.randint(1, 4)),
+            square_footage=rng.randint(500, 5000),
+            description=' '.join(rng.choice(DESCRIPTION_WORDS) for _ in range(40)),
+            status=rng.choices(['available', 'pending', 'sold'], weights=[7, 2, 1])[0],
+            listing_type=rng.choice(['sale', 'rent']),
+            property_type=rng.choice(['house', 'apartment', 'condo', 'villa']),
+            is_featured=rng.random() < 0.1,
+            agent=rng.choice(agent_users),
+        )
+        apply_keyword_masks(prop)
+        prop.geohash = encode(prop.latitude, prop.longitude)
+        listings.append(prop)
+    listings = Property.objects.bulk_create(listings, batch_size=1000)
+
+    PropertyImage.objects.bulk_create([
+        PropertyImage(property=prop, image=f'property_images/bench-{prop.pk}-{order}.jpg',
+                      order=order, is_primary=order == 0)
+        for prop in listings for order in range(images)
+    ], batch_size=1000)
+
+    now = timezone.now()
+    PropertyBooking.objects.bulk_create([
+        PropertyBooking(
+            property_ref=rng.choice(listings), customer=customer,
+            booking_type=rng.choice(['booking', 'visit']),
+            customer_name=customer.get_full_name(), customer_email=customer.email, customer_phone='9800000000',
+            preferred_date=now + timedelta(days=rng.randint(-30, 30), hours=rng.randint(8, 18)),
+            payment_method=rng.choice(['stripe', 'esewa']), transaction_id=f'bench-{run}-{index}',
+            payment_amount=Decimal('1000.00'),
+            status=rng.choices(['pending', 'confirmed', 'rejected', 'cancelled'], weights=[4, 4, 1, 1])[0],
+            visit_completed=rng.random() < 0.2,
+        )
+        for index, customer in enumerate(rng.choice(customer_users) for _ in range(bookings))
+    ], batch_size=1000)
+    update_booking_state(*[prop.pk for prop in listings])
+
+    Favorite.objects.bulk_create([
+        Favorite(user=customer, property=prop)
+        for customer in customer_users
+        for prop in rng.sample(listings, min(5, len(listings)))
+    ], batch_size=1000, ignore_conflicts=True)
+
+    rooms = {}
+    for _ in range(chats):
+        prop = rng.choice(listings)
+        customer = rng.choice(customer_users)
+        rooms.setdefault((prop.pk, customer.pk), ChatRoom(property=prop, customer=customer, agent=prop.agent))
+    rooms = ChatRoom.objects.bulk_create(list(rooms.values()), batch_size=1000)
+    ChatMessage.objects.bulk_create([
+        ChatMessage(
+            room=room, sender=room.customer if index % 2 == 0 else room.agent,
+            content=' '.join(rng.choice(DESCRIPTION_WORDS) for _ in range(12)), read=rng.random() < 0.6,
+        )
+        for room in rooms for index in range(messages)
+    ], batch_size=1000)
+
+    SearchHistory.objects.bulk_create([
+        SearchHistory(user=rng.choice(customer_users), query=rng.choice(SEARCH_QUERIES))
+        for _ in range(searches)
+    ], batch_size=1000)
+
+    ChatRoom.objects.update(**latest_message_summary())
+    unread.rebuild()
+    lsh.rebuild_index()
+    if fulltext.is_supported():
+        fulltext.rebuild_index()
+
+    room = rooms[0] if rooms else None
+    sample_property = room.property if room else listings[0]
+    # similar_properties only reads stored lists; build the one it is asked for
+    refresh_neighbours(sample_property.pk)
+    return {
+        'customer': room.customer if room else customer_users[0],
+        'agent': room.agent if room else listings[0].agent,
+        'admin': admin,
+        'property': sample_property,
+    }
+
+
+def view_requests(sample):
+    """(name, user, url, query parameters) of every benchmarked request"""
+    prop = sample['property']
+    return [
+        ('property_list', sample['customer'], reverse('properties:property_list'), {}),
+        ('property_detail', sample['customer'], reverse('properties:property_detail', args=[prop.pk]), {}),
+        ('search_properties', sample['customer'], reverse('search:search'), {'q': 'furnished apartment'}),
+        ('search_suggestions', sample['customer'], reverse('search:suggestions'), {'q': 'apa'}),
+        ('similar_properties', sample['customer'], reverse('properties:similar_properties', args=[prop.pk]), {}),
+        ('dashboard_customer', sample['customer'], reverse('core:dashboard'), {}),
+        ('dashboard_agent', sample['agent'], reverse('core:dashboard'), {}),
+        ('admin_dashboard', sample['admin'], reverse('admin_panel:dashboard'), {}),
+        ('agent_chat_overview', sample['agent'], reverse('chat:agent_overview'), {}),
+        ('get_messages', sample['customer'], reverse('chat:get_messages', args=[prop.pk]), {}),
+    ]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class QueryTimer:
+    """connection.execute_wrapper() counting queries and summing their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+def measure(client, url, params, repeat):
+    """Query count, DB time and wall time of `repeat` requests; the first runs with cold caches"""
+    runs = []
+    for _ in range(repeat):
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            response = client.get(url, params)
+            wall_ms = (time.perf_counter() - started) * 1000
+        runs.append((response.status_code, timer.count, timer.seconds * 1000, wall_ms))
+
+    statuses, query_counts, db_times, wall_times = zip(*runs)
+    return {
+        'status': statuses[-1],
+        'cold_queries': query_counts[0],
+        'warm_queries': query_counts[-1],
+        'max_queries': max(query_counts),
+        'db_ms': round(statistics.median(db_times), 3),
+        'median_ms': round(statistics.median(wall_times), 3),
+        'p95_ms': round(percentile(wall_times, 0.95), 3),
+        'cold_ms': round(wall_times[0], 3),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic dataset, measure query count, DB time and wall time of the hot views '
+        'and fail when a view exceeds its budget. The dataset is rolled back afterwards unless '
+        '--keep-data is given; run it against a development database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Customers (default: 200)')
+        parser.add_argument('--agents', type=int, default=20, help='Agents (default: 20)')
+        parser.add_argument('--properties', type=int, default=1000, help='Properties (default: 1000)')
+        parser.add_argument('--images', type=int, default=2, help='Images per property (default: 2)')
+        parser.add_argument('--bookings', type=int, default=1000, help='Bookings and visit requests (default: 1000)')
+        parser.add_argument('--chats', type=int, default=200, help='Chat rooms (default: 200)')
+        parser.add_argument('--messages', type=int, default=10, help='Messages per chat room (default: 10)')
+        parser.add_argument('--searches', type=int, default=2000, help='Search history rows (default: 2000)')
+        parser.add_argument('--repeat', type=int, default=5, help='Requests per view (default: 5)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the dataset (default: 0)')
+        parser.add_argument('--budgets', help='JSON file of {view: {"max_queries": n, "max_ms": ms}}')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+        parser.add_argument('--keep-data', action='store_true', help='Commit the seeded dataset')
+
+    def handle(self, *args, **options):
+        if options['properties'] < 1 or options['users'] < 1 or options['agents'] < 1:
+            raise CommandError('At least one property, customer and agent are needed.')
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1.')
+        budgets = {name: {'max_queries': limit} for name, limit in QUERY_BUDGETS.items()}
+        if options['budgets']:
+            try:
+                with open(options['budgets']) as budget_file:
+                    budgets = json.load(budget_file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read budgets: {e}')
+
+        dataset = {key: options[key] for key in (
+            'users', 'agents', 'properties', 'images', 'bookings', 'chats', 'messages', 'searches',
+        )}
+        setup_test_environment()
+        try:
+            # Measure requests as deployed: queued tasks are left to the worker
+            with override_settings(BACKGROUND_TASKS_EAGER=False), transaction.atomic():
+                results = self._run(dataset, options, budgets)
+                if not options['keep_data']:
+                    transaction.set_rollback(True)
+        finally:
+            teardown_test_environment()
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'dataset': dataset,
+            'repeat': options['repeat'],
+            'views': results,
+            'passed': all(result['passed'] for result in results),
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._print_table(results)
+
+        failed = [result['view'] for result in results if not result['passed']]
+        if failed:
+            raise CommandError(f'Over budget: {", ".join(failed)}')
+
+    def _run(self, dataset, options, budgets):
+        started = time.perf_counter()
+        sample = seed_dataset(random.Random(options['seed']), **dataset)
+        if not options['json']:
+            self.stdout.write(f'Seeded dataset in {time.perf_counter() - started:.1f}s')
+
+        results = []
+        for name, user, url, params in view_requests(sample):
+            # Errors are reported as a failing status, not raised
+            client = Client(raise_request_exception=False)
+            client.force_login(user)
+            result = {'view': name, **measure(client, url, params, options['repeat'])}
+            budget = budgets.get(name, {})
+            result['budget'] = budget
+            result['passed'] = (
+                result['status'] == 200
+                and result['max_queries'] <= budget.get('max_queries', math.inf)
+                and result['p95_ms'] <= budget.get('max_ms', math.inf)
+            )
+            results.append(result)
+        return results
+
+    def _print_table(self, results):
+        self.stdout.write(
+            f"{'view':<22} {'status':>6} {'queries':>8} {'cold':>5} {'budget':>6} "
+            f"{'db ms':>8} {'median ms':>10} {'p95 ms':>8} {'cold ms':>8}"
+        )
+        for result in results:
+            line = (
+                f"{result['view']:<22} {result['status']:>6} {result['max_queries']:>8} "
+                f"{result['cold_queries']:>5} {str(result['budget'].get('max_queries', '-')):>6} "
+                f"{result['db_ms']:>8.2f} {result['median_ms']:>10.2f} {result['p95_ms']:>8.2f} "
+                f"{result['cold_ms']:>8.2f}"
+            )
+            self.stdout.write(line if result['passed'] else self.style.ERROR(line))
@@ -0,0 +1,145 @@
+import random
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+
+from .benchmark_views import seed_dataset, view_requests
+
+# Small version of the benchmark dataset: the views only need rows to run
+# their usual queries, and the plans do not depend on table sizes here
+DATASET = {
+    'users': 50, 'agents': 5, 'properties': 200, 'images': 1, 'bookings': 200,
+    'chats': 50, 'messages': 5, 'searches': 200,
+}
+
+# (view, table) whole-table reads that are intended
+EXPECTED_SCANS = {
+    # The periodic rebuild of the in-memory suggestion index
+    # (search/autocomplete.py) aggregates every search
+    ('search_suggestions', 'search_searchhistory'),
+}
+
+
+def view_queries(sample):
+    """
+    (view, SQL) of every distinct SELECT the benchmarked views issue, in
+    the order they run
+    """
+    seen = set()
+    for name, user, url, params in view_requests(sample):
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+        with CaptureQueriesContext(connection) as captured:
+            client.get(url, params)
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if sql.lstrip().upper().startswith(('SELECT', 'WITH')) and (name, sql) not in seen:
+                seen.add((name, sql))
+                yield name, sql
+
+
+def _postgres_unconditioned_index_scans(plan):
+    """Tables read by an index scan with no Index Cond (walking the whole index)"""
+    tables = []
+    node = None
+    for line in plan.splitlines():
+        match = re.search(r'Index (?:Only )?Scan (?:Backward )?using \w+ on (\w+)', line)
+        if match or '->' in line:
+            if node and not node[1]:
+                tables.append(node[0])
+            node = [match.group(1), False] if match else None
+        elif node and 'Index Cond:' in line:
+            node[1] = True
+    if node and not node[1]:
+        tables.append(node[0])
+    return tables
+
+
+def _explain(sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return '\n'.join(row[-1] for row in cursor.fetchall())
+        cursor.execute(f'EXPLAIN {sql}')
+        return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+def full_scans(sql):
+    """
+    (tables read in full, plan text) for a query on the default database.
+    Walking a whole index only counts as a full read when the query has no
+    LIMIT; with one it is how an ordered page is read.
+    """
+    sliced = re.search(r'\bLIMIT\b', sql, re.IGNORECASE) is not None
+    if connection.vendor == 'sqlite':
+        plan = _explain(sql)
+        scanned = re.findall(
+            r'\bSCAN (\w+)\b(?! USING COVERING INDEX)(?! USING INDEX)(?! VIRTUAL TABLE)', plan
+        )
+        if not sliced:
+            scanned += re.findall(r'\bSCAN (\w+) USING INDEX', plan)
+    elif connection.vendor == 'postgresql':
+        # With sequential scans disabled the planner only picks one when no
+        # index can answer the query, whatever the table size
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = _explain(sql)
+        scanned = re.findall(r'Seq Scan on (\w+)', plan)
+        if not sliced:
+            scanned += _postgres_unconditioned_index_scans(plan)
+    else:
+        raise CommandError(f'Query plans are only checked on SQLite and PostgreSQL, not {connection.vendor}')
+    return sorted(set(scanned)), plan
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the benchmarked views against a seeded dataset (rolled back afterwards) and check '
+        'that every query they issue uses an index (EXPLAIN on SQLite or PostgreSQL)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Print the query plan of every query',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'Query plans are only checked on SQLite and PostgreSQL, not {connection.vendor}')
+        setup_test_environment()
+        try:
+            # The views run against a seeded dataset that is rolled back afterwards
+            with override_settings(BACKGROUND_TASKS_EAGER=False), transaction.atomic():
+                failures = self._check(options)
+                transaction.set_rollback(True)
+        finally:
+            teardown_test_environment()
+
+        if failures:
+            raise CommandError(f'{failures} queries read a table without an index')
+        self.stdout.write('All queries use indexes')
+
+    def _check(self, options):
+        sample = seed_dataset(random.Random(0), **DATASET)
+        failures = 0
+        for view, sql in list(view_queries(sample)):
+            scanned, plan = full_scans(sql)
+            scanned = [table for table in scanned if (view, table) not in EXPECTED_SCANS]
+            if scanned:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'SCAN {view}: {", ".join(scanned)}'))
+                self.stdout.write(f'       {sql}')
+            elif options['verbose_plans']:
+                self.stdout.write(self.style.SUCCESS(f'OK   {view}: {sql}'))
+            if scanned or options['verbose_plans']:
+                for line in plan.splitlines():
+                    self.stdout.write(f'       {line}')
+        return failures
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks (recommendation updates, etc.)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue once and exit instead of polling',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Maximum number of tasks claimed per batch (default: 100)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the queue is empty (default: 1)',
+        )
+
+    def handle(self, *args, **options):
+        from core.tasks import run_pending
+
+        self.stdout.write('Running background tasks...')
+        while True:
+            processed = run_pending(limit=options['batch_size'])
+            if processed:
+                self.stdout.write(f'Processed {processed} tasks')
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
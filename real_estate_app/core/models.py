@@ -1,3 +1,35 @@
 from django.db import models
 
-# Create your models here.
+
+class BackgroundTask(models.Model):
+    """
+    Unit of work queued by a request and executed by `manage.py run_background_tasks`.
+
+    Tasks with the same name and key (e.g. one user's recommendation updates)
+    are handed to their handler together, so a burst of events costs one run.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+    )
+
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100, blank=True, default='')
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    claimed_by = models.CharField(max_length=64, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['claimed_by']),
+        ]
+
+    def __str__(self):
+        return f"{self.name}[{self.key}] ({self.status})"
@@ -0,0 +1,173 @@
+"""
+Keyset ("cursor") pagination.
+
+Offset pagination counts the whole result set and makes the database skip
+OFFSET rows on every page, so deep pages get slower. A CursorPaginator
+instead orders by a fixed tuple of fields ending in a unique one (e.g.
+('-created_at', '-id')) and asks for the rows after (or before) the last
+row shown:
+
+    WHERE (created_at < %s) OR (created_at = %s AND id < %s)
+    ORDER BY created_at DESC, id DESC LIMIT per_page + 1
+
+which an index on those fields answers without scanning skipped rows.
+Cursors are opaque URL-safe strings holding the boundary row's values and
+the direction. Ordering fields must not be nullable.
+
+estimated_count() replaces the exact COUNT for these pages: PostgreSQL's
+planner statistics for an unfiltered table, otherwise a count capped at
+`cap` rows. paginate_request() picks the mode for a list view: keyset
+pagination when the request has a `cursor` parameter (empty for the first
+page), the usual numbered pages otherwise.
+"""
+import base64
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorPage:
+    """One page of a CursorPaginator; iterates over its objects"""
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class CursorPaginator:
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+        model_fields = {field.name: field for field in queryset.model._meta.concrete_fields}
+        model_fields['pk'] = queryset.model._meta.pk
+        self.model_fields = [model_fields[field] for field in self.fields]
+
+    # Cursor encoding
+
+    def encode_cursor(self, obj, direction):
+        values = [field.value_to_string(obj) for field in self.model_fields]
+        payload = json.dumps({'d': direction, 'v': values}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            direction = payload['d']
+            values = [field.to_python(value) for field, value in zip(self.model_fields, payload['v'])]
+        except Exception as e:
+            raise InvalidCursor(str(e))
+        if direction not in ('next', 'prev') or len(values) != len(self.fields):
+            raise InvalidCursor('Malformed cursor')
+        return direction, values
+
+    # Queries
+
+    def _after(self, values, reverse):
+        """Q for rows strictly after the boundary values in ordering (or reversed) order"""
+        condition = Q()
+        for position, (order, field) in enumerate(zip(self.ordering, self.fields)):
+            descending = order.startswith('-') != reverse
+            step = Q(**{f'{field}__{"lt" if descending else "gt"}': values[position]})
+            for earlier, value in zip(self.fields[:position], values[:position]):
+                step &= Q(**{earlier: value})
+            condition |= step
+        return condition
+
+    def page(self, cursor=None):
+        """The page after a 'next' cursor or before a 'prev' cursor; the first page without one"""
+        direction, values = self.decode_cursor(cursor) if cursor else ('next', None)
+        backwards = direction == 'prev'
+        ordering = self.ordering
+        if backwards:
+            ordering = tuple(order[1:] if order.startswith('-') else f'-{order}' for order in ordering)
+
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(values, reverse=backwards))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        has_next = has_more if not backwards else True
+        has_previous = (values is not None) if not backwards else has_more
+        return CursorPage(
+            rows,
+            has_next=bool(rows) and has_next,
+            has_previous=bool(rows) and has_previous,
+            next_cursor=self.encode_cursor(rows[-1], 'next') if rows else None,
+            previous_cursor=self.encode_cursor(rows[0], 'prev') if rows else None,
+        )
+
+
+def estimated_count(queryset, cap=1000):
+    """
+    (count, exact) for a queryset: planner statistics for an unfiltered
+    PostgreSQL table, else an exact count up to `cap` (more is reported as
+    (cap, False))
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return int(row[0]), False
+
+    count = queryset.order_by()[:cap + 1].count()
+    if count > cap:
+        return cap, False
+    return count, True
+
+
+def paginate_request(request, queryset, per_page, ordering, count_cap=1000):
+    """
+    (page, total_count, cursor_page) for a list view. With ?cursor= the page
+    is a CursorPage over `ordering` (also returned as cursor_page) and the
+    total is estimated; otherwise it is a numbered Paginator page of the
+    queryset and cursor_page is None.
+    """
+    if 'cursor' in request.GET:
+        paginator = CursorPaginator(queryset, per_page, ordering)
+        try:
+            page = paginator.page(request.GET['cursor'] or None)
+        except InvalidCursor:
+            raise Http404('Invalid cursor')
+        total_count, _ = estimated_count(queryset, cap=count_cap)
+        return page, total_count, page
+
+    paginator = Paginator(queryset.order_by(*ordering), per_page)
+    page = paginator.get_page(request.GET.get('page'))
+    return page, paginator.count, None
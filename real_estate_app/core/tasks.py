@@ -0,0 +1,130 @@
+"""
+Small database-backed task queue.
+
+Request code calls `enqueue(name, key, payload)`, which is a single INSERT.
+`manage.py run_background_tasks` claims pending rows, groups them by
+(name, key) and calls the registered handler once per group with all of
+the group's payloads, oldest first:
+
+    from core.tasks import task
+
+    @task('search.update_recommendations')
+    def update_recommendations(key, payloads):
+        ...
+
+Handlers live in a `tasks` module of any installed app; those modules are
+imported when Django starts. A handler that raises is retried up to
+MAX_ATTEMPTS times, after which its rows are kept with status 'failed'.
+
+With BACKGROUND_TASKS_EAGER = True (e.g. in development without a worker)
+enqueue() runs the handler immediately instead.
+"""
+import os
+import socket
+import traceback
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+MAX_ATTEMPTS = 3
+# Running tasks not finished after this long belong to a dead worker
+STALE_AFTER = timedelta(minutes=10)
+
+_handlers = {}
+
+
+class UnknownTask(Exception):
+    """Raised when a task name has no registered handler"""
+
+
+def task(name):
+    """Register a handler(key, payloads) for the task name"""
+    def register(handler):
+        _handlers[name] = handler
+        return handler
+    return register
+
+
+def get_handler(name):
+    try:
+        return _handlers[name]
+    except KeyError:
+        raise UnknownTask(f'No handler registered for task {name!r}')
+
+
+def enqueue(name, key='', payload=None):
+    from .models import BackgroundTask
+
+    payload = payload or {}
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        get_handler(name)(str(key), [payload])
+        return None
+    return BackgroundTask.objects.create(name=name, key=str(key), payload=payload)
+
+
+def requeue_stale():
+    """Return tasks of workers that died mid-run to the queue"""
+    from .models import BackgroundTask
+
+    return BackgroundTask.objects.filter(
+        status='running', started_at__lt=timezone.now() - STALE_AFTER
+    ).update(status='pending', claimed_by='')
+
+
+def claim(limit=100):
+    """
+    Mark up to `limit` pending tasks as ours, plus every other pending task
+    that shares a (name, key) with them so they are coalesced now.
+    """
+    from .models import BackgroundTask
+
+    token = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+    groups = set(
+        BackgroundTask.objects.filter(status='pending')
+        .order_by('created_at')
+        .values_list('name', 'key')[:limit]
+    )
+    if not groups:
+        return []
+
+    for name, key in groups:
+        # Conditional UPDATE: rows another worker claimed first are skipped
+        BackgroundTask.objects.filter(status='pending', name=name, key=key).update(
+            status='running', claimed_by=token, started_at=timezone.now()
+        )
+    return list(BackgroundTask.objects.filter(claimed_by=token, status='running'))
+
+
+def run_pending(limit=100):
+    """Run one batch of queued tasks; returns the number of task rows processed"""
+    from .models import BackgroundTask
+
+    requeue_stale()
+    tasks = claim(limit)
+
+    groups = OrderedDict()
+    for queued in tasks:
+        groups.setdefault((queued.name, queued.key), []).append(queued)
+
+    for (name, key), group in groups.items():
+        ids = [queued.id for queued in group]
+        try:
+            with transaction.atomic():
+                get_handler(name)(key, [queued.payload for queued in group])
+        except Exception:
+            error = traceback.format_exc()
+            print(f"Background task {name}[{key}] failed: {error}")
+            for queued in group:
+                queued.attempts += 1
+                queued.status = 'failed' if queued.attempts >= MAX_ATTEMPTS else 'pending'
+                queued.last_error = error
+                queued.claimed_by = ''
+            BackgroundTask.objects.bulk_update(group, ['attempts', 'status', 'last_error', 'claimed_by'])
+        else:
+            BackgroundTask.objects.filter(id__in=ids).delete()
+
+    return len(tasks)
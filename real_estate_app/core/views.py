@@ -4,6 +4,7 @@ from django.db.models import Count, Sum
 from properties.models import Property
 from search.models import Recommendation
 from accounts.models import User
+from chat import unread
 
 def index(request):
     featured_properties = Property.objects.filter(status='available').order_by('-created_at')[:6]
@@ -39,10 +40,7 @@ def dashboard(request):
             property__agent=request.user
         ).select_related('sender', 'property').order_by('-timestamp')[:5]
         context['recent_messages'] = recent_messages
-        context['unread_messages_count'] = PropertyMessage.objects.filter(
-            property__agent=request.user,
-            read=False
-        ).count()
+        context['unread_messages_count'] = unread.property_total(request.user)
         context['total_messages'] = PropertyMessage.objects.filter(
             property__agent=request.user
         ).count()
@@ -88,6 +88,7 @@ class PropertyBookingForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop('user', None)
         self.current_property = kwargs.pop('current_property', None)
+        self.visit_plan = None
         initial_booking_type = kwargs.pop('initial_booking_type', None)
         super().__init__(*args, **kwargs)
         
@@ -145,16 +146,18 @@ class PropertyBookingForm(forms.ModelForm):
         # Check for conflicts with user's existing bookings on the same date
         # Allow same-date bookings only if properties are within 5km of each other
         if preferred_date and hasattr(self, 'user') and self.user and hasattr(self, 'current_property'):
-            from .utils import check_booking_distance_compatibility
+            from .utils import parse_property_ids, plan_same_day_visit
             
-            is_compatible, error_message, conflicting_bookings = check_booking_distance_compatibility(
+            # additional_properties is cleaned after this field, so read the raw value
+            self.visit_plan = plan_same_day_visit(
                 self.user, 
                 self.current_property, 
-                preferred_date
+                preferred_date,
+                parse_property_ids(self.data.get('additional_properties', ''))
             )
             
-            if not is_compatible:
-                raise forms.ValidationError(error_message)
+            if not self.visit_plan['is_compatible']:
+                raise forms.ValidationError(self.visit_plan['error_message'])
         
         return preferred_date
     
@@ -230,12 +233,13 @@ class PropertyBookingForm(forms.ModelForm):
     def get_additional_property_objects(self):
         """Get Property objects for additional properties"""
         from .models import Property
+        from .utils import parse_property_ids
         
         additional_properties = self.cleaned_data.get('additional_properties', '')
         if not additional_properties:
             return []
         
-        property_ids = [int(pid.strip()) for pid in additional_properties.split(',') if pid.strip().isdigit()]
+        property_ids = parse_property_ids(additional_properties)
         return Property.objects.filter(id__in=property_ids)
     
     def clean_additional_properties(self):
@@ -245,7 +249,8 @@ class PropertyBookingForm(forms.ModelForm):
         if not additional_properties or not hasattr(self, 'user') or not self.user:
             return additional_properties
         
-        property_ids = [int(pid.strip()) for pid in additional_properties.split(',') if pid.strip().isdigit()]
+        from .utils import parse_property_ids
+        property_ids = parse_property_ids(additional_properties)
         
         if property_ids:
             from .models import Property, PropertyBooking
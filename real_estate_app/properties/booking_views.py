@@ -21,6 +21,7 @@ from django.views.generic import ListView, DetailView
 
 from .models import Property, PropertyBooking, BookingFee
 from .booking_forms import PropertyBookingForm, BookingVerificationForm
+from .utils import parse_property_ids
 from accounts.models import User
 
 
@@ -112,6 +113,18 @@ def property_booking_view(request, property_id):
             # Calculate payment amount
             payment_amount = form.get_payment_amount()
             
+            # Store multi-property visits in the suggested (nearest-neighbour) order
+            additional_properties = form.cleaned_data.get('additional_properties', '')
+            route = form.visit_plan['route'] if form.visit_plan else []
+            if additional_properties and len(route) > 1:
+                selected = set(parse_property_ids(additional_properties))
+                additional_properties = ','.join(str(prop.id) for prop in route if prop.id in selected)
+                messages.info(
+                    request,
+                    f"Suggested visit order: {' → '.join(prop.title for prop in route)} "
+                    f"({form.visit_plan['route_km']:.1f} km)"
+                )
+            
             # Store booking data in session
             booking_data = {
                 'property_id': property_obj.id,
@@ -123,7 +136,7 @@ def property_booking_view(request, property_id):
                 'message': form.cleaned_data.get('message', ''),
                 'payment_method': form.cleaned_data['payment_method'],
                 'payment_amount': payment_amount,
-                'additional_properties': form.cleaned_data.get('additional_properties', ''),
+                'additional_properties': additional_properties,
             }
             
             request.session['booking_data'] = booking_data
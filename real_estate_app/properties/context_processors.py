@@ -1,13 +1,9 @@
-from .models import PropertyMessage
-
 def unread_message_count(request):
     """
     Context processor to add unread message count to all templates
+    (read from the agent's cached unread counters, see chat/unread.py)
     """
     if request.user.is_authenticated and hasattr(request.user, 'is_agent') and request.user.is_agent():
-        unread_count = PropertyMessage.objects.filter(
-            property__agent=request.user,
-            read=False
-        ).count()
-        return {'unread_message_count': unread_count}
+        from chat.unread import property_total
+        return {'unread_message_count': property_total(request.user)}
     return {'unread_message_count': 0}
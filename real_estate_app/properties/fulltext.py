@@ -0,0 +1,171 @@
+"""
+Full-text index over Property title, description and address.
+
+Replaces `icontains` scans with an inverted index kept in a side table:
+
+* SQLite: an FTS5 virtual table (porter stemming) ranked with bm25()
+* PostgreSQL: a weighted tsvector table with a GIN index ranked with ts_rank_cd()
+
+The table is created by migration 0018 and kept current by the Property
+post_save/post_delete receivers in models.py. `rebuild_index()` (or
+`manage.py rebuild_fulltext_index`) repopulates it from scratch.
+
+Callers use `match_condition()` / `rank_expression()` which return SQL that
+the database evaluates inside the Property query, so no id lists are pulled
+into Python. On other databases `is_supported()` is False and callers keep
+their icontains filters.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+SQLITE_TABLE = 'properties_property_fts'
+POSTGRES_TABLE = 'properties_property_tsv'
+
+# Column weights: a title hit counts more than an address or description hit
+SQLITE_WEIGHTS = (10.0, 1.0, 4.0)  # title, description, address
+
+
+def is_supported():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def tokenize(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def _match_query(terms, match_all=False):
+    """
+    Build the backend query string from free text or a list of keywords.
+    Every token is prefix-matched; tokens are OR'ed unless match_all is set.
+    """
+    if isinstance(terms, str):
+        terms = [terms]
+    tokens = []
+    for term in terms:
+        for token in tokenize(term):
+            if token not in tokens:
+                tokens.append(token)
+    if not tokens:
+        return None
+    if connection.vendor == 'postgresql':
+        return (' & ' if match_all else ' | ').join(f'{token}:*' for token in tokens)
+    return (' AND ' if match_all else ' OR ').join(f'"{token}"*' for token in tokens)
+
+
+def match_condition(terms, match_all=False):
+    """
+    Q object restricting a Property queryset to full-text matches, or None
+    when the terms contain no searchable tokens.
+    """
+    match = _match_query(terms, match_all)
+    if match is None:
+        return None
+    if connection.vendor == 'postgresql':
+        sql = (
+            f"SELECT property_id FROM {POSTGRES_TABLE} "
+            f"WHERE document @@ to_tsquery('english', %s)"
+        )
+    else:
+        sql = f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s"
+    return Q(id__in=RawSQL(sql, (match,)))
+
+
+def rank_expression(terms):
+    """
+    Relevance of each Property for the terms (higher is better, 0 when it
+    does not match), for use in annotate()/order_by().
+    """
+    match = _match_query(terms)
+    if match is None:
+        return None
+    if connection.vendor == 'postgresql':
+        sql = (
+            f"SELECT ts_rank_cd(document, to_tsquery('english', %s)) "
+            f"FROM {POSTGRES_TABLE} "
+            f"WHERE property_id = properties_property.id"
+        )
+    else:
+        weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+        # bm25() is negative, lower meaning more relevant
+        sql = (
+            f"SELECT -bm25({SQLITE_TABLE}, {weights}) FROM {SQLITE_TABLE} "
+            f"WHERE {SQLITE_TABLE} MATCH %s AND rowid = properties_property.id"
+        )
+    return RawSQL(f"COALESCE(({sql}), 0)", (match,), output_field=FloatField())
+
+
+def search(queryset, terms, match_all=False):
+    """
+    Filter a Property queryset to full-text matches and annotate `search_rank`.
+    Returns None when full-text search is not available on this database.
+    """
+    if not is_supported():
+        return None
+    condition = match_condition(terms, match_all)
+    if condition is None:
+        return queryset
+    return queryset.filter(condition).annotate(search_rank=rank_expression(terms))
+
+
+def index_property(prop):
+    """Insert or replace the index entry of one property"""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"INSERT INTO {POSTGRES_TABLE} (property_id, document) VALUES (%s, "
+                f"setweight(to_tsvector('english', %s), 'A') || "
+                f"setweight(to_tsvector('english', %s), 'B') || "
+                f"setweight(to_tsvector('english', %s), 'C')) "
+                f"ON CONFLICT (property_id) DO UPDATE SET document = EXCLUDED.document",
+                [prop.pk, prop.title, prop.address, prop.description],
+            )
+        else:
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [prop.pk])
+            cursor.execute(
+                f"INSERT INTO {SQLITE_TABLE} (rowid, title, description, address) "
+                f"VALUES (%s, %s, %s, %s)",
+                [prop.pk, prop.title, prop.description, prop.address],
+            )
+
+
+def remove_property(property_id):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"DELETE FROM {POSTGRES_TABLE} WHERE property_id = %s", [property_id])
+        else:
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [property_id])
+
+
+def rebuild_index():
+    """Repopulate the index from the properties table; returns the row count"""
+    if not is_supported():
+        return 0
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"DELETE FROM {POSTGRES_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {POSTGRES_TABLE} (property_id, document) "
+                f"SELECT id, "
+                f"setweight(to_tsvector('english', title), 'A') || "
+                f"setweight(to_tsvector('english', address), 'B') || "
+                f"setweight(to_tsvector('english', description), 'C') "
+                f"FROM properties_property"
+            )
+        else:
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {SQLITE_TABLE} (rowid, title, description, address) "
+                f"SELECT id, title, description, address FROM properties_property"
+            )
+        indexed = cursor.rowcount
+        if connection.vendor == 'sqlite':
+            # Merge the b-tree segments written by the bulk insert
+            cursor.execute(f"INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}) VALUES ('optimize')")
+    return indexed
@@ -0,0 +1,284 @@
+"""
+"Properties within R km of a point" lookups.
+
+Every property stores the geohash of its coordinates (Property.geohash,
+GEOHASH_PRECISION characters, set on save). A radius query:
+
+1. picks the longest geohash prefix whose cells are at least R km on each
+   side, so the circle lies inside the 3x3 block of cells around the point;
+2. selects those cells with indexed range conditions on the geohash column
+   (`geohash >= cell AND geohash < cell + '~'`), narrowed by a
+   latitude/longitude bounding box;
+3. computes the exact haversine distance of the remaining rows with NumPy
+   and keeps those within R.
+
+Only (id, latitude, longitude) of the prefiltered rows are read; the model
+instances of the matches are loaded afterwards in one query.
+
+Map viewports use the same column: bbox_prefilter covers a bounding box
+with at most MAX_BOX_CELLS geohash ranges, and zoomed-out views are
+clustered by grouping rows on a geohash prefix (count and centroid per
+cell) instead of returning every listing.
+"""
+import math
+
+import numpy as np
+from django.db.models import Avg, Count, Min, Q
+from django.db.models.functions import Substr
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+GEOHASH_PRECISION = 9
+# Geohash ranges OR-ed together by bbox_prefilter
+MAX_BOX_CELLS = 32
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of a point ('' when a coordinate is missing)"""
+    if latitude is None or longitude is None:
+        return ''
+    latitude, longitude = float(latitude), float(longitude)
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            bounds, coordinate = lon_range, longitude
+        else:
+            bounds, coordinate = lat_range, latitude
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(height, width) of a geohash cell in degrees"""
+    lat_bits = 5 * precision // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon); longitudes are None when the box spans a pole or the antimeridian"""
+    lat_delta = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = latitude - lat_delta, latitude + lat_delta
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if min_lat <= -90 or max_lat >= 90 or cos_lat <= 0:
+        return max(min_lat, -90.0), min(max_lat, 90.0), None, None
+    lon_delta = radius_km / (KM_PER_DEGREE * cos_lat)
+    min_lon, max_lon = longitude - lon_delta, longitude + lon_delta
+    if min_lon < -180 or max_lon > 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Geohash prefixes of the 3x3 cells around a point, at the longest
+    precision whose cells are at least `radius_km` high and wide; empty
+    when no precision is coarse enough (huge radius or polar latitudes)
+    """
+    min_lat, max_lat, min_lon, _ = bounding_box(latitude, longitude, radius_km)
+    if min_lon is None:
+        return []
+    worst_cos = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        if height * KM_PER_DEGREE >= radius_km and width * KM_PER_DEGREE * worst_cos >= radius_km:
+            break
+    else:
+        return []
+
+    cells = set()
+    for lat_step in (-1, 0, 1):
+        for lon_step in (-1, 0, 1):
+            cell_lat = min(max(latitude + lat_step * height, -90.0), 90.0)
+            cell_lon = (longitude + lon_step * width + 180.0) % 360.0 - 180.0
+            cells.add(encode(cell_lat, cell_lon, precision))
+    return sorted(cells)
+
+
+def prefilter(latitude, longitude, radius_km):
+    """Q selecting the rows that can lie within `radius_km` of the point"""
+    cells = covering_cells(latitude, longitude, radius_km)
+    condition = Q(latitude__isnull=False, longitude__isnull=False)
+    if cells:
+        in_cells = Q()
+        for cell in cells:
+            in_cells |= Q(geohash__gte=cell, geohash__lt=cell + '~')
+        condition &= in_cells
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+    condition &= Q(latitude__gte=min_lat, latitude__lte=max_lat)
+    if min_lon is not None:
+        condition &= Q(longitude__gte=min_lon, longitude__lte=max_lon)
+    return condition
+
+
+def bbox_cells(min_lat, min_lon, max_lat, max_lon):
+    """
+    Geohash prefixes covering a bounding box, at the longest precision that
+    needs at most MAX_BOX_CELLS of them (empty if even 1-character cells
+    are too many)
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.ceil((max_lat - min_lat) / height) + 1
+        columns = math.ceil((max_lon - min_lon) / width) + 1
+        if rows * columns <= MAX_BOX_CELLS:
+            break
+    else:
+        return []
+
+    # Stepping one cell size from the corner visits every overlapped cell
+    latitudes = [min(min_lat + i * height, max_lat) for i in range(rows)]
+    longitudes = [min(min_lon + i * width, max_lon) for i in range(columns)]
+    return sorted({encode(lat, lon, precision) for lat in latitudes for lon in longitudes})
+
+
+def bbox_prefilter(min_lat, min_lon, max_lat, max_lon):
+    """
+    Q selecting the rows inside a bounding box; min_lon > max_lon means the
+    box crosses the antimeridian
+    """
+    condition = Q(latitude__gte=min_lat, latitude__lte=max_lat)
+    if min_lon > max_lon:
+        return condition & (Q(longitude__gte=min_lon) | Q(longitude__lte=max_lon))
+
+    condition &= Q(longitude__gte=min_lon, longitude__lte=max_lon)
+    cells = bbox_cells(min_lat, min_lon, max_lat, max_lon)
+    if cells:
+        in_cells = Q()
+        for cell in cells:
+            in_cells |= Q(geohash__gte=cell, geohash__lt=cell + '~')
+        condition &= in_cells
+    return condition
+
+
+def cluster_precision(width_degrees):
+    """Geohash precision whose cells are about `width_degrees` wide (at least that)"""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        if cell_size(precision)[1] >= width_degrees:
+            return precision
+    return 1
+
+
+def cluster_queryset(queryset, precision):
+    """
+    Rows of `queryset` grouped by geohash prefix: dicts with the cell, the
+    number of listings, their centroid and the smallest property id
+    """
+    return (
+        queryset.exclude(geohash='')
+        .order_by()
+        .annotate(cell=Substr('geohash', 1, precision))
+        .values('cell')
+        .annotate(count=Count('id'), latitude=Avg('latitude'), longitude=Avg('longitude'), property_id=Min('id'))
+        .order_by('-count', 'cell')
+    )
+
+
+def cluster_points(points, precision):
+    """cluster_queryset for (id, latitude, longitude, geohash, ...) tuples already in memory"""
+    cells = {}
+    for property_id, latitude, longitude, geohash, *_ in points:
+        cell = cells.setdefault(geohash[:precision], [0, 0.0, 0.0, property_id])
+        cell[0] += 1
+        cell[1] += float(latitude)
+        cell[2] += float(longitude)
+        cell[3] = min(cell[3], property_id)
+    clusters = [
+        {'cell': cell, 'count': count, 'latitude': lat_sum / count,
+         'longitude': lon_sum / count, 'property_id': property_id}
+        for cell, (count, lat_sum, lon_sum, property_id) in cells.items()
+    ]
+    clusters.sort(key=lambda cluster: (-cluster['count'], cluster['cell']))
+    return clusters
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """Distances in km from one point to arrays of points"""
+    lat1 = math.radians(latitude)
+    lat2 = np.radians(np.asarray(latitudes, dtype=float))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(longitudes, dtype=float)) - math.radians(longitude)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distance_matrix(latitudes, longitudes):
+    """Pairwise haversine distances in km between points, as an N x N array"""
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def nearest_neighbour_route(matrix, start=0):
+    """Visit order (row indices) that always goes to the closest unvisited point next"""
+    count = len(matrix)
+    if not count:
+        return []
+    visited = np.zeros(count, dtype=bool)
+    route = [start]
+    visited[start] = True
+    for _ in range(count - 1):
+        distances = np.where(visited, np.inf, matrix[route[-1]])
+        following = int(np.argmin(distances))
+        route.append(following)
+        visited[following] = True
+    return route
+
+
+def points_within_radius(latitude, longitude, radius_km, queryset, fields=()):
+    """
+    (id, latitude, longitude, *fields, distance_km) tuples of the rows of
+    `queryset` within `radius_km` of the point, nearest first
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    rows = list(
+        queryset.filter(prefilter(latitude, longitude, radius_km))
+        .order_by()
+        .values_list('id', 'latitude', 'longitude', *fields)
+    )
+    if not rows:
+        return []
+    distances = haversine_km(latitude, longitude, [row[1] for row in rows], [row[2] for row in rows])
+    within = np.flatnonzero(distances <= radius_km)
+    within = within[np.argsort(distances[within], kind='stable')]
+    return [rows[i] + (float(distances[i]),) for i in within]
+
+
+def properties_within_radius(latitude, longitude, radius_km, queryset=None):
+    """
+    Properties of `queryset` (default: the whole catalogue) within
+    `radius_km` of the point, as a list of (property, distance_km) sorted
+    by distance.
+    """
+    from .models import Property
+
+    if latitude is None or longitude is None:
+        return []
+    if queryset is None:
+        queryset = Property.objects.all()
+
+    points = points_within_radius(latitude, longitude, radius_km, queryset)
+    objects = queryset.in_bulk([point[0] for point in points])
+    return [(objects[point[0]], point[-1]) for point in points if point[0] in objects]
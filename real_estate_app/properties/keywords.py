@@ -0,0 +1,154 @@
+"""
+Keyword groups used for property similarity and recommendations.
+
+Each group set is compiled once into a KeywordMatcher, an Aho-Corasick
+automaton that finds every group occurring in a text in a single pass
+(substring semantics, like `keyword in text`). Group memberships are stored
+as bitmasks on Property (title_keyword_mask, keyword_mask), computed when
+the property is saved, so comparing two properties is a couple of integer
+operations:
+
+    shared = mask_a & mask_b
+    similarity = jaccard(mask_a, mask_b)
+
+After editing a group set run `manage.py refresh_keyword_masks` so stored
+masks match the new bit layout.
+"""
+
+# Groups compared between property titles (similar_properties)
+SIMILARITY_GROUPS = {
+    # Residential-specific keywords
+    'luxury_residential': ['luxury', 'premium', 'elegant', 'upscale', 'high-end', 'deluxe', 'exclusive', 'sophisticated', 'executive', 'prestige'],
+    'cozy': ['cozy', 'comfortable', 'warm', 'inviting', 'charming', 'intimate', 'homely', 'snug', 'cute', 'lovely'],
+    'modern_residential': ['modern', 'contemporary', 'stylish', 'updated', 'renovated', 'new', 'sleek', 'chic', 'fresh', 'latest'],
+    'spacious_residential': ['spacious', 'large', 'big', 'roomy', 'vast', 'expansive', 'wide', 'generous', 'huge', 'massive'],
+    'beautiful': ['beautiful', 'stunning', 'gorgeous', 'lovely', 'attractive', 'magnificent', 'spectacular', 'amazing', 'wonderful', 'fantastic'],
+    'quiet': ['quiet', 'peaceful', 'serene', 'tranquil', 'calm', 'silent', 'secluded', 'private', 'noise-free'],
+    'family': ['family', 'kids', 'children', 'school', 'playground', 'safe', 'friendly', 'child-friendly', 'residential'],
+    'garden': ['garden', 'yard', 'outdoor', 'green', 'lawn', 'patio', 'terrace', 'balcony', 'landscaped', 'park'],
+    'furnished': ['furnished', 'equipped', 'ready', 'complete', 'move-in', 'fully-furnished', 'semi-furnished'],
+
+    # Property type keywords
+    'apartment': ['apartment', 'flat', 'unit', 'condo', 'condominium', 'bhk', '1bhk', '2bhk', '3bhk', '4bhk'],
+    'house': ['house', 'home', 'villa', 'bungalow', 'residence'],
+
+    # Specific view categories for residential
+    'lake_view': ['lake', 'lakeside', 'waterfront', 'lake view', 'lakefront', 'lakeview'],
+    'garden_view': ['garden view', 'garden facing', 'overlooks garden', 'garden-facing'],
+    'mountain_view': ['mountain', 'mountain view', 'hills', 'hillside', 'mountainside'],
+    'city_view': ['city view', 'cityscape', 'urban view', 'downtown view'],
+    'sea_view': ['sea', 'ocean', 'sea view', 'ocean view', 'beachfront', 'seaside'],
+    'river_view': ['river', 'river view', 'riverside', 'riverfront'],
+    'park_view': ['park view', 'park facing', 'overlooks park', 'park-facing'],
+
+    # Commercial/Office-specific keywords
+    'office_space': ['office', 'workspace', 'business center', 'corporate', 'professional'],
+    'commercial': ['commercial', 'business', 'shop', 'retail', 'store', 'showroom'],
+    'modern_office': ['modern office', 'contemporary workspace', 'tech-ready', 'it-enabled', 'smart office'],
+    'premium_office': ['premium office', 'grade a', 'class a', 'executive suite', 'corner office'],
+    'shared_space': ['coworking', 'shared office', 'flexible workspace', 'hot desk', 'co-working'],
+
+    # Common categories (applicable to both)
+    'convenient': ['convenient', 'accessible', 'central', 'nearby', 'close', 'walking', 'transport', 'location'],
+    'affordable': ['affordable', 'budget', 'cheap', 'economical', 'reasonable', 'value', 'low-cost'],
+    'security': ['secure', 'gated', 'protected', 'safe', 'guard', 'security'],
+    'parking': ['parking', 'garage', 'car', 'vehicle', 'covered'],
+    'investment': ['investment', 'rental', 'income', 'profitable', 'return']
+}
+
+# Groups matched between search queries and property title/description (recommendations)
+RECOMMENDATION_GROUPS = {
+    'luxury': ['luxury', 'premium', 'elegant', 'upscale', 'high-end', 'deluxe', 'exclusive', 'sophisticated'],
+    'cozy': ['cozy', 'comfortable', 'warm', 'inviting', 'charming', 'intimate', 'homely', 'snug'],
+    'modern': ['modern', 'contemporary', 'stylish', 'updated', 'renovated', 'new', 'sleek', 'chic'],
+    'spacious': ['spacious', 'large', 'big', 'roomy', 'vast', 'expansive', 'wide', 'generous'],
+    'beautiful': ['beautiful', 'stunning', 'gorgeous', 'lovely', 'attractive', 'magnificent', 'spectacular'],
+    'quiet': ['quiet', 'peaceful', 'serene', 'tranquil', 'calm', 'silent', 'secluded'],
+    'family': ['family', 'kids', 'children', 'school', 'playground', 'safe', 'friendly'],
+    'garden': ['garden', 'yard', 'outdoor', 'green', 'lawn', 'patio', 'terrace', 'balcony'],
+    'view': ['view', 'scenic', 'mountain', 'valley', 'city', 'panoramic', 'overlooking'],
+    'convenient': ['convenient', 'accessible', 'central', 'nearby', 'close', 'walking', 'transport']
+}
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton mapping a text to the bitmask of groups it mentions"""
+
+    def __init__(self, groups):
+        self.group_names = list(groups)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [0]
+
+        for bit, keywords in enumerate(groups.values()):
+            for keyword in keywords:
+                self._add(keyword.lower(), 1 << bit)
+        self._link()
+
+    def _add(self, keyword, mask):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(0)
+            state = next_state
+        self._output[state] |= mask
+
+    def _link(self):
+        """Breadth-first failure links; each state also emits its suffixes' groups"""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+    def mask(self, *texts):
+        """Bitmask of the groups with a keyword in any of the texts"""
+        goto, fail, output = self._goto, self._fail, self._output
+        found = 0
+        for text in texts:
+            state = 0
+            for char in (text or '').lower():
+                while state and char not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(char, 0)
+                found |= output[state]
+        return found
+
+    def groups(self, mask):
+        """Group names of a bitmask, in definition order"""
+        return [name for bit, name in enumerate(self.group_names) if mask >> bit & 1]
+
+
+def jaccard(mask_a, mask_b, empty=0.0):
+    """Jaccard similarity of two group bitmasks (`empty` when both are 0)"""
+    union = (mask_a | mask_b).bit_count()
+    if not union:
+        return empty
+    return (mask_a & mask_b).bit_count() / union
+
+
+similarity_matcher = KeywordMatcher(SIMILARITY_GROUPS)
+recommendation_matcher = KeywordMatcher(RECOMMENDATION_GROUPS)
+
+
+def title_keyword_mask(title):
+    return similarity_matcher.mask(title)
+
+
+def keyword_mask(title, description):
+    return recommendation_matcher.mask(title, description)
+
+
+def apply_keyword_masks(prop):
+    """Set both stored masks of a Property instance from its current text"""
+    prop.title_keyword_mask = title_keyword_mask(prop.title)
+    prop.keyword_mask = keyword_mask(prop.title, prop.description)
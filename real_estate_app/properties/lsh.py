@@ -0,0 +1,136 @@
+"""
+MinHash / LSH candidate generation for similar properties.
+
+Exhaustive ranking (similarity.rank_similar over every available listing)
+is exact but costs a full scan per list. Here each property's title and
+address are reduced to token sets (the title words and keyword groups that
+title_similarity compares, the address words of location_similarity),
+each set gets a MinHash signature of NUM_BANDS * BAND_ROWS values, and
+every band of BAND_ROWS values is hashed to a bucket id stored in
+SimilarityBucket. Two listings share a band bucket with probability
+1 - (1 - J**BAND_ROWS)**NUM_BANDS for token-set Jaccard J (about 0.5 at
+J=0.2, 0.99 at J=0.5), so looking up a listing's buckets returns the
+properties likely to score well, and exact scoring runs on those only.
+
+Buckets are updated by a receiver in models.py when a property's title or
+address changes, and rebuilt by `manage.py rebuild_similar_properties`.
+`manage.py benchmark_similar_candidates` compares the neighbour lists found
+this way with the exhaustive ones.
+"""
+import hashlib
+import random
+import zlib
+
+from django.db.models import Count
+
+NUM_BANDS = 16
+BAND_ROWS = 2
+# Bucket-mates scored per lookup, most shared buckets first
+MAX_CANDIDATES = 100
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+    for _ in range(NUM_BANDS * BAND_ROWS)
+]
+
+
+def title_tokens(listing):
+    tokens = {f'w:{word}' for word in listing.title_words}
+    tokens.update(f'g:{bit}' for bit in range(listing.title_keyword_mask.bit_length())
+                  if listing.title_keyword_mask >> bit & 1)
+    if listing.title_key:
+        tokens.add(f'=:{listing.title_key}')
+    return tokens
+
+
+def address_tokens(listing):
+    tokens = {f'w:{word}' for word in listing.location_words}
+    if listing.address_key:
+        tokens.add(f'=:{listing.address_key}')
+    return tokens
+
+
+def minhash(tokens):
+    """MinHash signature of a token set (empty list for an empty set)"""
+    if not tokens:
+        return []
+    hashed = [zlib.crc32(token.encode()) for token in tokens]
+    return [min((a * value + b) % _PRIME for value in hashed) for a, b in _PERMUTATIONS]
+
+
+def band_buckets(kind, signature):
+    """Signed 64-bit bucket id of every band of a signature"""
+    buckets = []
+    for band in range(len(signature) // BAND_ROWS):
+        rows = signature[band * BAND_ROWS:(band + 1) * BAND_ROWS]
+        digest = hashlib.blake2b(f'{kind}:{band}:{rows}'.encode(), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'big', signed=True))
+    return buckets
+
+
+def listing_buckets(listing):
+    """Title and address bucket ids of a similarity.Listing"""
+    return set(
+        band_buckets('title', minhash(title_tokens(listing)))
+        + band_buckets('address', minhash(address_tokens(listing)))
+    )
+
+
+# Database side
+
+def index_listing(listing):
+    from .models import SimilarityBucket
+
+    SimilarityBucket.objects.filter(property_id=listing.id).delete()
+    SimilarityBucket.objects.bulk_create([
+        SimilarityBucket(property_id=listing.id, bucket=bucket) for bucket in listing_buckets(listing)
+    ])
+
+
+def index_property(prop):
+    from .similarity import make_listing
+
+    index_listing(make_listing(
+        prop.pk, prop.title, prop.address, prop.bedrooms, prop.price,
+        prop.property_type, prop.title_keyword_mask,
+    ))
+
+
+def rebuild_index(batch_size=1000):
+    """Recompute the buckets of every property; returns the number of rows"""
+    from django.db import transaction
+    from .models import SimilarityBucket
+    from .similarity import load_listings
+
+    rows = [
+        SimilarityBucket(property_id=listing.id, bucket=bucket)
+        for listing in load_listings()
+        for bucket in listing_buckets(listing)
+    ]
+    with transaction.atomic():
+        SimilarityBucket.objects.all().delete()
+        SimilarityBucket.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def candidate_ids(listing, limit=MAX_CANDIDATES, **filters):
+    """
+    Ids of the properties sharing a bucket with `listing`, most shared
+    buckets first. `filters` apply to the property (e.g. status='available').
+    """
+    from .models import SimilarityBucket
+
+    buckets = listing_buckets(listing)
+    if not buckets:
+        return []
+    property_filters = {f'property__{field}': value for field, value in filters.items()}
+    rows = (
+        SimilarityBucket.objects.filter(bucket__in=buckets, **property_filters)
+        .exclude(property_id=listing.id)
+        .values('property_id')
+        .annotate(hits=Count('id'))
+        .order_by('-hits', '-property_id')[:limit]
+    )
+    return [row['property_id'] for row in rows]
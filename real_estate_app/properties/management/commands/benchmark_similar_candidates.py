@@ -0,0 +1,74 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Compare LSH candidate generation for similar properties against the exhaustive scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sample',
+            type=int,
+            default=200,
+            help='Properties whose neighbour lists are compared (default: 200)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Bucket-mates scored per list (default: lsh.MAX_CANDIDATES)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for the sample (default: 0)',
+        )
+
+    def handle(self, *args, **options):
+        from properties.lsh import MAX_CANDIDATES, candidate_ids
+        from properties.similarity import load_listings, rank_similar
+
+        limit = options['limit'] or MAX_CANDIDATES
+        sources = load_listings()
+        available = load_listings(status='available')
+        sample = random.Random(options['seed']).sample(sources, min(options['sample'], len(sources)))
+        if not sample:
+            self.stdout.write('No properties to compare')
+            return
+
+        recalls = []
+        candidate_counts = []
+        exact_lists = 0
+        exhaustive_time = lsh_time = 0.0
+        for source in sample:
+            started = time.perf_counter()
+            expected = [neighbour[0] for neighbour in rank_similar(source, available)]
+            exhaustive_time += time.perf_counter() - started
+
+            started = time.perf_counter()
+            ids = candidate_ids(source, limit=limit, status='available')
+            found = [neighbour[0] for neighbour in rank_similar(source, load_listings(id__in=ids))]
+            lsh_time += time.perf_counter() - started
+
+            candidate_counts.append(len(ids))
+            exact_lists += found == expected
+            if expected:
+                recalls.append(len(set(found) & set(expected)) / len(expected))
+
+        count = len(sample)
+        self.stdout.write(f'Properties: {len(sources)} ({len(available)} available), sampled {count}')
+        self.stdout.write(
+            f'Candidates scored per list: exhaustive {len(available)}, '
+            f'LSH mean {statistics.mean(candidate_counts):.1f} / median {statistics.median(candidate_counts):.0f}'
+        )
+        if recalls:
+            self.stdout.write(f'Neighbour recall vs exhaustive: {statistics.mean(recalls):.1%}')
+        self.stdout.write(f'Identical lists: {exact_lists}/{count} ({exact_lists / count:.1%})')
+        self.stdout.write(
+            f'Time per list: exhaustive {exhaustive_time / count * 1000:.2f} ms, '
+            f'LSH {lsh_time / count * 1000:.2f} ms (including the bucket query)'
+        )
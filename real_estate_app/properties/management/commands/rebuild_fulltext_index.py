@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of property titles, descriptions and addresses'
+
+    def handle(self, *args, **options):
+        from properties.fulltext import is_supported, rebuild_index
+
+        if not is_supported():
+            raise CommandError('Full-text search needs SQLite (FTS5) or PostgreSQL.')
+
+        self.stdout.write('Rebuilding property full-text index...')
+        with transaction.atomic():
+            indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} properties'))
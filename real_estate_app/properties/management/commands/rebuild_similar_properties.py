@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = 'Recompute the LSH buckets and the similar-properties table of every property (exhaustive ranking in a process pool)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Worker processes (default: one per CPU; 1 runs in-process)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=200,
+            help='Properties handed to a worker at a time (default: 200)',
+        )
+
+    def handle(self, *args, **options):
+        from properties.lsh import rebuild_index
+        from properties.models import SimilarProperty
+        from properties.similarity import compute_all, load_listings, neighbour_rows
+
+        started = time.perf_counter()
+        self.stdout.write(f'Stored {rebuild_index()} LSH buckets')
+        sources = load_listings()
+        candidates = load_listings(status='available')
+        self.stdout.write(
+            f'Ranking neighbours of {len(sources)} properties among {len(candidates)} available...'
+        )
+
+        rows = []
+        for source_id, neighbours in compute_all(
+            sources, candidates, workers=options['workers'], chunk_size=options['chunk_size']
+        ):
+            rows.extend(neighbour_rows(source_id, neighbours))
+
+        with transaction.atomic():
+            SimilarProperty.objects.all().delete()
+            SimilarProperty.objects.bulk_create(rows, batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {len(rows)} neighbours in {time.perf_counter() - started:.1f}s'
+        ))
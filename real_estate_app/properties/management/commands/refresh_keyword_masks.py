@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored keyword-group bitmasks of every property (run after editing properties/keywords.py)'
+
+    def handle(self, *args, **options):
+        from properties.keywords import keyword_mask, title_keyword_mask
+        from properties.models import Property
+
+        self.stdout.write('Recomputing property keyword masks...')
+        updated = 0
+        batch = []
+        for prop in Property.objects.only('id', 'title', 'description').iterator(chunk_size=1000):
+            prop.title_keyword_mask = title_keyword_mask(prop.title)
+            prop.keyword_mask = keyword_mask(prop.title, prop.description)
+            batch.append(prop)
+            if len(batch) >= 1000:
+                Property.objects.bulk_update(batch, ['title_keyword_mask', 'keyword_mask'])
+                updated += len(batch)
+                batch = []
+        if batch:
+            Property.objects.bulk_update(batch, ['title_keyword_mask', 'keyword_mask'])
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} properties'))
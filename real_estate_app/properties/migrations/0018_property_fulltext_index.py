@@ -0,0 +1,51 @@
+from django.db import migrations
+
+
+def create_fulltext_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS properties_property_fts "
+            "USING fts5(title, description, address, tokenize = 'porter unicode61')"
+        )
+        schema_editor.execute(
+            "INSERT INTO properties_property_fts (rowid, title, description, address) "
+            "SELECT id, title, description, address FROM properties_property"
+        )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE IF NOT EXISTS properties_property_tsv ("
+            "property_id bigint PRIMARY KEY REFERENCES properties_property (id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS properties_property_tsv_document "
+            "ON properties_property_tsv USING GIN (document)"
+        )
+        schema_editor.execute(
+            "INSERT INTO properties_property_tsv (property_id, document) "
+            "SELECT id, "
+            "setweight(to_tsvector('english', title), 'A') || "
+            "setweight(to_tsvector('english', address), 'B') || "
+            "setweight(to_tsvector('english', description), 'C') "
+            "FROM properties_property"
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS properties_property_fts")
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS properties_property_tsv")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0017_add_dual_confirmation_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+
+def compute_keyword_masks(apps, schema_editor):
+    from properties.keywords import keyword_mask, title_keyword_mask
+
+    Property = apps.get_model('properties', 'Property')
+    batch = []
+    for prop in Property.objects.only('id', 'title', 'description').iterator(chunk_size=1000):
+        prop.title_keyword_mask = title_keyword_mask(prop.title)
+        prop.keyword_mask = keyword_mask(prop.title, prop.description)
+        batch.append(prop)
+        if len(batch) >= 1000:
+            Property.objects.bulk_update(batch, ['title_keyword_mask', 'keyword_mask'])
+            batch = []
+    if batch:
+        Property.objects.bulk_update(batch, ['title_keyword_mask', 'keyword_mask'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0018_property_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='title_keyword_mask',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='property',
+            name='keyword_mask',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(compute_keyword_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0019_property_keyword_masks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarProperty',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('primary', models.BooleanField(default=True)),
+                ('match_percentage', models.PositiveSmallIntegerField()),
+                ('reasons', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_entries', to='properties.property')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='properties.property')),
+            ],
+            options={
+                'ordering': ['property', 'rank'],
+                'indexes': [models.Index(fields=['property', 'rank'], name='properties__propert_dd5f90_idx')],
+                'constraints': [models.UniqueConstraint(fields=('property', 'similar'), name='unique_similar_property')],
+            },
+        ),
+    ]
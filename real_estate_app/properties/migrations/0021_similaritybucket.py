@@ -0,0 +1,43 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_buckets(apps, schema_editor):
+    from properties.lsh import listing_buckets
+    from properties.similarity import LISTING_FIELDS, make_listing
+
+    Property = apps.get_model('properties', 'Property')
+    SimilarityBucket = apps.get_model('properties', 'SimilarityBucket')
+    batch = []
+    for row in Property.objects.values_list(*LISTING_FIELDS).iterator(chunk_size=1000):
+        listing = make_listing(*row)
+        batch.extend(
+            SimilarityBucket(property_id=listing.id, bucket=bucket) for bucket in listing_buckets(listing)
+        )
+        if len(batch) >= 1000:
+            SimilarityBucket.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        SimilarityBucket.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0020_similarproperty'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField()),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity_buckets', to='properties.property')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket', 'property'], name='properties__bucket_25e082_idx')],
+            },
+        ),
+        migrations.RunPython(build_buckets, migrations.RunPython.noop),
+    ]
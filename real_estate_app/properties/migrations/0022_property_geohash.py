@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+def compute_geohashes(apps, schema_editor):
+    from properties.geo import encode
+
+    Property = apps.get_model('properties', 'Property')
+    batch = []
+    located = Property.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    for prop in located.only('id', 'latitude', 'longitude').iterator(chunk_size=1000):
+        prop.geohash = encode(prop.latitude, prop.longitude)
+        batch.append(prop)
+        if len(batch) >= 1000:
+            Property.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        Property.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0021_similaritybucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.RunPython(compute_geohashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def compute_booking_state(apps, schema_editor):
+    Property = apps.get_model('properties', 'Property')
+    PropertyBooking = apps.get_model('properties', 'PropertyBooking')
+    states = (
+        PropertyBooking.objects.order_by()
+        .values('property_ref_id')
+        .annotate(
+            confirmed_bookings=Count('id', filter=Q(booking_type='booking', status='confirmed')),
+            active_visits=Count('id', filter=Q(booking_type='visit', status__in=['pending', 'confirmed'])),
+        )
+    )
+    for state in states.iterator():
+        Property.objects.filter(pk=state['property_ref_id']).update(
+            is_booked=state['confirmed_bookings'] > 0,
+            active_visit_count=state['active_visits'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0022_property_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='is_booked',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='property',
+            name='active_visit_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(compute_booking_state, migrations.RunPython.noop),
+    ]
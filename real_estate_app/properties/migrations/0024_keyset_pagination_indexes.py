@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0023_property_booking_state'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['created_at', 'id'], name='properties__created_25bd25_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['price', 'id'], name='properties__price_b10c54_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='propertybooking',
+            index=models.Index(fields=['created_at', 'id'], name='properties__created_3d9057_idx'),
+        ),
+    ]
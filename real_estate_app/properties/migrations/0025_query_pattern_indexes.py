@@ -0,0 +1,51 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0024_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['status', 'created_at'], name='properties__status_8e4eb2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['agent', 'created_at'], name='properties__agent_i_e27dd9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['property_type', 'listing_type', 'price'], name='properties__propert_ceefbd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(
+                condition=models.Q(('status', 'available')),
+                fields=['created_at', 'id'],
+                name='property_available_created_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(
+                condition=models.Q(('status', 'available')),
+                fields=['price', 'id'],
+                name='property_available_price_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='propertybooking',
+            index=models.Index(fields=['customer', 'status', 'booking_type'], name='properties__custome_0dc00b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='propertybooking',
+            index=models.Index(fields=['property_ref', 'booking_type', 'status'], name='properties__propert_adf0dd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='propertybooking',
+            index=models.Index(fields=['customer', 'preferred_date'], name='properties__custome_aef3c8_idx'),
+        ),
+    ]
@@ -1,6 +1,6 @@
 from django.db import models
 from django.conf import settings
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
 
 class Property(models.Model):
@@ -26,6 +26,8 @@ class Property(models.Model):
     address = models.CharField(max_length=500)
     latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True, help_text="Latitude coordinate")
     longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True, help_text="Longitude coordinate")
+    # Geohash of latitude/longitude (see properties/geo.py), maintained on save
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False, db_index=True)
     price = models.DecimalField(max_digits=12, decimal_places=2)
     bedrooms = models.PositiveSmallIntegerField()
     bathrooms = models.DecimalField(max_digits=3, decimal_places=1)
@@ -35,6 +37,12 @@ class Property(models.Model):
     listing_type = models.CharField(max_length=10, choices=LISTING_TYPE_CHOICES, default='sale')
     property_type = models.CharField(max_length=20, choices=PROPERTY_TYPE_CHOICES, default='house')
     is_featured = models.BooleanField(default=False)
+    # Keyword-group bitmasks (see properties/keywords.py), maintained on save
+    title_keyword_mask = models.PositiveBigIntegerField(default=0, editable=False)
+    keyword_mask = models.PositiveBigIntegerField(default=0, editable=False)
+    # Booking state for list pages, maintained by the PropertyBooking receivers
+    is_booked = models.BooleanField(default=False, editable=False)
+    active_visit_count = models.PositiveIntegerField(default=0, editable=False)
     agent = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='properties')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -42,12 +50,38 @@ class Property(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Properties'
+        indexes = [
+            # Keyset pagination (core.pagination) of the listing sort orders
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['price', 'id']),
+            # Listing filters and per-agent listings
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['agent', 'created_at']),
+            models.Index(fields=['property_type', 'listing_type', 'price']),
+            # Available listings only (search results, recommendations)
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(status='available'),
+                name='property_available_created_idx',
+            ),
+            models.Index(
+                fields=['price', 'id'],
+                condition=models.Q(status='available'),
+                name='property_available_price_idx',
+            ),
+        ]
     
     def __str__(self):
         return self.title
     
     def get_thumbnail(self):
         """Get the primary image as thumbnail, fallback to first image"""
+        if 'images' in getattr(self, '_prefetched_objects_cache', {}):
+            # Pick from the prefetched images instead of querying per call
+            images = list(self.images.all())
+            thumbnail = next((image for image in images if image.is_primary), images[0] if images else None)
+            return thumbnail.image.url if thumbnail else None
+        
         # Try to get the primary image first
         primary_image = self.images.filter(is_primary=True).first()
         if primary_image:
@@ -98,6 +132,100 @@ class Favorite(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.property.title}"
 
+class SimilarProperty(models.Model):
+    """Precomputed neighbour of a property for the "similar properties" panel (see similarity.py)"""
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='similar_entries')
+    similar = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    primary = models.BooleanField(default=True)
+    match_percentage = models.PositiveSmallIntegerField()
+    reasons = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['property', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'similar'], name='unique_similar_property'),
+        ]
+        indexes = [
+            models.Index(fields=['property', 'rank']),
+        ]
+    
+    def __str__(self):
+        return f"{self.property_id} ~ {self.similar_id} ({self.score:.2f})"
+
+class SimilarityBucket(models.Model):
+    """LSH band bucket of a property's title or address (see lsh.py)"""
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='similarity_buckets')
+    bucket = models.BigIntegerField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['bucket', 'property']),
+        ]
+    
+    def __str__(self):
+        return f"{self.property_id} @ {self.bucket}"
+
+@receiver(pre_save, sender=Property)
+def update_keyword_masks(sender, instance, **kwargs):
+    from .keywords import apply_keyword_masks
+    apply_keyword_masks(instance)
+
+@receiver(pre_save, sender=Property)
+def update_geohash(sender, instance, **kwargs):
+    from .geo import encode
+    instance.geohash = encode(instance.latitude, instance.longitude)
+
+@receiver(pre_save, sender=Property)
+def remember_saved_state(sender, instance, **kwargs):
+    from .similarity import SIMILARITY_FIELDS
+    instance._similarity_state = None
+    instance._previous_agent_id = None
+    if instance.pk:
+        state = Property.objects.filter(pk=instance.pk).values(
+            *SIMILARITY_FIELDS, 'is_booked', 'active_visit_count', 'agent'
+        ).first()
+        if state:
+            # Booking state is owned by update_booking_state; never save a stale copy
+            instance.is_booked = state.pop('is_booked')
+            instance.active_visit_count = state.pop('active_visit_count')
+            instance._previous_agent_id = state.pop('agent')
+        instance._similarity_state = state
+
+@receiver(post_save, sender=Property)
+def update_similarity_buckets(sender, instance, created, **kwargs):
+    # Connected before queue_similar_properties_refresh, which may run eagerly
+    from .lsh import index_property
+    
+    previous = getattr(instance, '_similarity_state', None)
+    if created or previous is None or any(
+        previous[field] != getattr(instance, field) for field in ('title', 'address')
+    ):
+        index_property(instance)
+
+@receiver(post_save, sender=Property)
+def queue_similar_properties_refresh(sender, instance, created, **kwargs):
+    from core.tasks import enqueue
+    from .similarity import REFRESH_SIMILAR, SIMILARITY_FIELDS
+    
+    previous = getattr(instance, '_similarity_state', None)
+    if created or previous is None or any(
+        previous[field] != getattr(instance, field) for field in SIMILARITY_FIELDS
+    ):
+        enqueue(REFRESH_SIMILAR, instance.pk, {'changed': True})
+
+@receiver(pre_delete, sender=Property)
+def queue_similar_properties_cleanup(sender, instance, **kwargs):
+    # The rows pointing at this property cascade away; refill those lists
+    from core.tasks import enqueue
+    from .similarity import REFRESH_SIMILAR
+    
+    sources = SimilarProperty.objects.filter(similar=instance).values_list('property_id', flat=True)
+    for source_id in sources:
+        enqueue(REFRESH_SIMILAR, source_id, {'changed': False})
+
 @receiver(post_save, sender=Property)
 def remove_from_favorites_if_sold(sender, instance, **kwargs):
     if instance.status == 'sold':
@@ -107,6 +235,16 @@ def remove_from_favorites_if_sold(sender, instance, **kwargs):
 def remove_from_favorites_if_deleted(sender, instance, **kwargs):
     Favorite.objects.filter(property=instance).delete()
 
+@receiver(post_save, sender=Property)
+def update_fulltext_index(sender, instance, **kwargs):
+    from .fulltext import index_property
+    index_property(instance)
+
+@receiver(post_delete, sender=Property)
+def remove_from_fulltext_index(sender, instance, **kwargs):
+    from .fulltext import remove_property
+    remove_property(instance.pk)
+
 
 
 #Testing
@@ -228,6 +366,14 @@ class PropertyBooking(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Property Booking'
         verbose_name_plural = 'Property Bookings'
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            # A customer's bookings of one kind, a property's bookings of one
+            # kind (booking state, relationships) and same-day visit checks
+            models.Index(fields=['customer', 'status', 'booking_type']),
+            models.Index(fields=['property_ref', 'booking_type', 'status']),
+            models.Index(fields=['customer', 'preferred_date']),
+        ]
     
     def __str__(self):
         return f"{self.customer_name} - {self.property_ref.title} ({self.get_booking_type_display()})"
@@ -448,6 +594,64 @@ class PropertyBooking(models.Model):
                 return "Visit pending completion"
 
 
+def update_booking_state(*property_ids):
+    """
+    Recompute Property.is_booked (a confirmed booking exists) and
+    Property.active_visit_count (pending or confirmed visit requests)
+    """
+    from django.db.models import Count, Q
+    
+    property_ids = [pid for pid in property_ids if pid]
+    if not property_ids:
+        return
+    states = {
+        row['property_ref_id']: row
+        for row in PropertyBooking.objects.filter(property_ref_id__in=property_ids)
+        .order_by()
+        .values('property_ref_id')
+        .annotate(
+            confirmed_bookings=Count('id', filter=Q(booking_type='booking', status='confirmed')),
+            active_visits=Count('id', filter=Q(booking_type='visit', status__in=['pending', 'confirmed'])),
+        )
+    }
+    for property_id in property_ids:
+        state = states.get(property_id, {})
+        # update() so the Property save signals (search indexes etc.) don't run
+        Property.objects.filter(pk=property_id).update(
+            is_booked=bool(state.get('confirmed_bookings')),
+            active_visit_count=state.get('active_visits', 0),
+        )
+
+@receiver(pre_save, sender=PropertyBooking)
+def remember_booking_property(sender, instance, **kwargs):
+    instance._previous_property_id = None
+    if instance.pk:
+        instance._previous_property_id = (
+            PropertyBooking.objects.filter(pk=instance.pk).values_list('property_ref_id', flat=True).first()
+        )
+
+@receiver(post_save, sender=PropertyBooking)
+def update_booking_state_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_property_id', None)
+    update_booking_state(instance.property_ref_id, previous if previous != instance.property_ref_id else None)
+
+@receiver(post_delete, sender=PropertyBooking)
+def update_booking_state_on_delete(sender, instance, **kwargs):
+    update_booking_state(instance.property_ref_id)
+
+@receiver(post_save, sender=PropertyBooking)
+@receiver(post_delete, sender=PropertyBooking)
+def invalidate_customer_relationships(sender, instance, **kwargs):
+    from .relationships import invalidate_user
+    invalidate_user(instance.customer_id)
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def invalidate_favorite_relationships(sender, instance, **kwargs):
+    from .relationships import invalidate_user
+    invalidate_user(instance.user_id)
+
+
 class BookingFee(models.Model):
     """Model to store booking fee configuration"""
     
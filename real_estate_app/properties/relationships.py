@@ -0,0 +1,136 @@
+"""
+Per-user flags for the properties a page renders: favourite, booking,
+visit request, completed visit, visit awaiting confirmation.
+
+All flags for a set of property ids come from one query (conditional
+aggregation over the user's bookings, grouped by property, plus an EXISTS
+on favourites). Results are cached per (user, property) for
+PROPERTY_RELATIONSHIP_CACHE_TTL seconds. Every entry embeds the user's
+version number, which the PropertyBooking and Favorite receivers in
+models.py bump, so a change invalidates all cached flags of that user only.
+The version lives in the default cache, which must be shared by all worker
+processes (CACHE_REDIS_URL in settings) for a change to reach every worker.
+"""
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Exists, Max, OuterRef, Q
+
+KEY_PREFIX = 'properties:relationships'
+VERSION_PREFIX = 'properties:relationships:version'
+
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+Relationship = namedtuple('Relationship', [
+    'is_favorite',
+    # Pending or confirmed booking (not visit)
+    'has_booking',
+    # Pending or confirmed visit request
+    'has_visit_request',
+    # ... whose visit is not completed yet
+    'has_open_visit_request',
+    # Latest confirmed visit with visit_completed set
+    'completed_visit_id',
+    # Latest confirmed visit not completed yet (dual confirmation pending)
+    'pending_confirmation_visit_id',
+])
+
+NO_RELATIONSHIP = Relationship(False, False, False, False, None, None)
+
+
+def get_ttl():
+    return getattr(settings, 'PROPERTY_RELATIONSHIP_CACHE_TTL', 600)
+
+
+def _get_version(user_id):
+    key = f'{VERSION_PREFIX}:{user_id}'
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter never repeats an old value
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_user(user_id):
+    """Expire every cached flag of a user"""
+    key = f'{VERSION_PREFIX}:{user_id}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def _query(user, property_ids):
+    from .models import Favorite, Property
+
+    mine = Q(bookings__customer=user)
+    visit = mine & Q(bookings__booking_type='visit')
+    rows = (
+        Property.objects.filter(pk__in=property_ids)
+        .order_by()
+        .values('pk')
+        .annotate(
+            is_favorite=Exists(Favorite.objects.filter(user=user, property=OuterRef('pk'))),
+            bookings_count=Count('bookings', filter=mine & Q(
+                bookings__booking_type='booking', bookings__status__in=ACTIVE_STATUSES,
+            )),
+            visits_count=Count('bookings', filter=visit & Q(bookings__status__in=ACTIVE_STATUSES)),
+            open_visits_count=Count('bookings', filter=visit & Q(
+                bookings__status__in=ACTIVE_STATUSES, bookings__visit_completed=False,
+            )),
+            completed_visit_id=Max('bookings__id', filter=visit & Q(
+                bookings__status='confirmed', bookings__visit_completed=True,
+            )),
+            pending_confirmation_visit_id=Max('bookings__id', filter=visit & Q(
+                bookings__status='confirmed', bookings__visit_completed=False,
+            )),
+        )
+    )
+    return {
+        row['pk']: Relationship(
+            bool(row['is_favorite']),
+            row['bookings_count'] > 0,
+            row['visits_count'] > 0,
+            row['open_visits_count'] > 0,
+            row['completed_visit_id'],
+            row['pending_confirmation_visit_id'],
+        )
+        for row in rows
+    }
+
+
+def get_relationships(user, property_ids):
+    """{property_id: Relationship} for the given ids (NO_RELATIONSHIP for anonymous users)"""
+    property_ids = list(dict.fromkeys(property_ids))
+    if not user.is_authenticated:
+        return {property_id: NO_RELATIONSHIP for property_id in property_ids}
+    if not property_ids:
+        return {}
+
+    version = _get_version(user.pk)
+    keys = {f'{KEY_PREFIX}:{user.pk}:{version}:{property_id}': property_id for property_id in property_ids}
+    cached = cache.get_many(list(keys))
+    relationships = {keys[key]: Relationship(*value) for key, value in cached.items()}
+
+    missing = [property_id for property_id in property_ids if property_id not in relationships]
+    if missing:
+        fetched = _query(user, missing)
+        for property_id in missing:
+            relationships[property_id] = fetched.get(property_id, NO_RELATIONSHIP)
+        cache.set_many(
+            {key: tuple(relationships[property_id]) for key, property_id in keys.items() if property_id in missing},
+            get_ttl(),
+        )
+    return relationships
+
+
+def get_relationship(user, property_id):
+    return get_relationships(user, [property_id])[property_id]
+
+
+def ids_with(relationships, flag):
+    """Property ids whose Relationship has `flag` set, e.g. ids_with(rels, 'is_favorite')"""
+    return [property_id for property_id, relationship in relationships.items() if getattr(relationship, flag)]
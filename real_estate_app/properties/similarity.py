@@ -0,0 +1,413 @@
+"""
+Similar-property neighbour lists.
+
+The scoring rules are the ones similar_properties used to apply per request
+(title keyword groups and words, address words, bedroom/price bonuses, the
+apartment BHK exclusion and the lenient fallback when fewer than three
+properties qualify). They now run offline: the top SIMILAR_COUNT neighbours
+of every property are stored in SimilarProperty together with reason codes,
+and the view only reads them.
+
+Lists are kept current by the receivers in models.py, which queue a
+`properties.refresh_similar` background task when a property's title,
+address, bedrooms, price, type or status changes. The task recomputes that
+property's list and the lists the change can enter or leave. Incremental
+refreshes only score the listings that share an LSH bucket (lsh.py) with
+the property, so they are approximate; a full, exact rebuild is
+`manage.py rebuild_similar_properties`, which spreads the work over a
+process pool.
+
+The scoring functions work on plain Listing tuples and do not touch the
+database, so worker processes need no Django setup.
+"""
+from collections import namedtuple
+
+from .keywords import jaccard, similarity_matcher
+
+SIMILAR_COUNT = 6
+REFRESH_SIMILAR = 'properties.refresh_similar'
+# Seconds between refreshes queued by the view for a property with no list
+MISSING_REFRESH_INTERVAL = 300
+
+# Fields whose change can alter any neighbour list
+SIMILARITY_FIELDS = ('title', 'address', 'bedrooms', 'price', 'property_type', 'status')
+
+TITLE_EXCLUDE_WORDS = {'for', 'sale', 'rent', 'at', 'in', 'the', 'and', 'or', 'with', 'a', 'an', 'is', 'are', 'be', 'by', 'on', 'to', 'from', 'of', 'this', 'that', 'it', 'as'}
+DISPLAY_EXCLUDE_WORDS = {'for', 'sale', 'rent', 'at', 'in', 'the', 'and', 'or', 'with', 'a', 'an', 'apartment', 'house', 'condo', 'villa', 'office', 'space', 'bhk', '1bhk', '2bhk', '3bhk', '4bhk'}
+LOCATION_EXCLUDE_WORDS = {'street', 'st', 'avenue', 'ave', 'road', 'rd', 'lane', 'ln', 'drive', 'dr', 'boulevard', 'blvd', 'plaza', 'place', 'apt', 'apartment', 'suite', 'unit', 'floor', 'building', 'block', 'sector', 'phase', '#', 'no', 'number'}
+
+FEATURE_LABELS = {
+    'luxury_residential': 'luxury features',
+    'modern_residential': 'modern design',
+    'modern_office': 'modern office features',
+    'premium_office': 'premium office features',
+    'spacious_residential': 'spacious layout',
+    'cozy': 'cozy atmosphere',
+    'family': 'family-friendly',
+    'garden': 'garden/outdoor space',
+    'office_space': 'office workspace',
+    'commercial': 'commercial features',
+}
+
+# Fields loaded for scoring; Listing adds the derived word sets
+LISTING_FIELDS = ('id', 'title', 'address', 'bedrooms', 'price', 'property_type', 'title_keyword_mask')
+
+Listing = namedtuple('Listing', LISTING_FIELDS + (
+    'title_key', 'address_key', 'title_words', 'match_words', 'display_words', 'location_words',
+))
+
+
+def _clean_words(text, strip, min_length, exclude):
+    words = set()
+    for word in text.split():
+        clean_word = word.lower().strip(strip)
+        if len(clean_word) > min_length and clean_word not in exclude:
+            words.add(clean_word)
+    return words
+
+
+def make_listing(id, title, address, bedrooms, price, property_type, title_keyword_mask):
+    """Listing from a values_list(*LISTING_FIELDS) row, with its word sets precomputed"""
+    location_words = []
+    for word in (address or '').split():
+        clean_word = word.lower().strip('.,!?()[]{}";:/#-')
+        if (len(clean_word) > 2 and clean_word not in LOCATION_EXCLUDE_WORDS
+                and not clean_word.isdigit() and clean_word not in location_words):
+            location_words.append(clean_word)
+
+    return Listing(
+        id, title, address, bedrooms, float(price), property_type, title_keyword_mask,
+        title.lower().strip(),
+        (address or '').lower().strip(),
+        _clean_words(title, '.,!?()[]{}";:', 3, TITLE_EXCLUDE_WORDS),
+        # Words that make a candidate eligible at all
+        set(word.lower().strip('.,!?()[]{}";:') for word in title.split()
+            if len(word) > 2 and word.lower() not in ['for', 'sale', 'rent']),
+        # Words shown as "Shared terms"
+        [word for word in dict.fromkeys(
+            word.lower().strip('.,!?()[]{}";:') for word in title.split()
+            if len(word) > 3 and word.lower() not in DISPLAY_EXCLUDE_WORDS
+        ) if len(word) > 3],
+        location_words,
+    )
+
+
+def title_similarity(a, b):
+    """Similarity of two titles based on keyword groups and direct word matching"""
+    # Quick exact match check
+    if a.title_key == b.title_key:
+        return 1.0
+
+    keyword_similarity = jaccard(a.title_keyword_mask, b.title_keyword_mask)
+
+    word_similarity = 0.0
+    if a.title_words or b.title_words:
+        # Jaccard similarity for words
+        word_intersection = len(a.title_words & b.title_words)
+        word_union = len(a.title_words | b.title_words)
+        word_similarity = word_intersection / word_union if word_union > 0 else 0.0
+
+        # Give extra weight to exact word matches when there are many shared words
+        if word_intersection >= 2:
+            word_similarity = min(word_similarity * 1.2, 1.0)
+
+    # 60% keyword groups (semantic), 40% direct words (lexical)
+    final_similarity = (keyword_similarity * 0.6) + (word_similarity * 0.4)
+
+    # If there are no keyword matches but good word overlap, give it a reasonable score
+    if keyword_similarity == 0 and word_similarity > 0.4:
+        final_similarity = word_similarity * 0.6
+
+    # Boost similarity if there are good keyword matches AND word matches
+    if keyword_similarity > 0.3 and word_similarity > 0.2:
+        final_similarity = min(final_similarity * 1.1, 1.0)
+
+    return min(max(final_similarity, 0.0), 1.0)
+
+
+def location_similarity(a, b):
+    """Similarity between two addresses"""
+    if not a.address or not b.address:
+        return 0.0
+    if a.address_key == b.address_key:
+        return 1.0
+
+    words_a = set(a.location_words)
+    words_b = set(b.location_words)
+    if not words_a or not words_b:
+        return 0.0
+
+    union = len(words_a | words_b)
+    return len(words_a & words_b) / union if union > 0 else 0.0
+
+
+def _price_ratio(a, b):
+    high = max(a.price, b.price)
+    return min(a.price, b.price) / high if high else 1.0
+
+
+def _different_bhk(a, b):
+    """Apartments with a different number of bedrooms are never similar"""
+    return (
+        a.bedrooms != b.bedrooms
+        and a.bedrooms > 0 and b.bedrooms > 0
+        and a.property_type == 'apartment' and b.property_type == 'apartment'
+    )
+
+
+def score_candidate(source, candidate):
+    """
+    Returns (score, primary, title_sim, location_sim). `primary` is True when
+    the candidate qualifies outright; otherwise it can only be used as a
+    fallback (score is then None if it does not qualify for that either).
+    """
+    title_sim = title_similarity(source, candidate)
+    location_sim = location_similarity(source, candidate)
+    if _different_bhk(source, candidate):
+        return None, False, title_sim, location_sim
+
+    # Use the HIGHER of the two similarities as the main score
+    score = max(title_sim, location_sim)
+    if candidate.bedrooms == source.bedrooms:
+        score += 0.01
+    if _price_ratio(source, candidate) >= 0.8:
+        score += 0.005
+
+    primary = (
+        title_sim > 0.1
+        or location_sim > 0.15
+        or bool(source.match_words & candidate.match_words)
+        or bool(source.title_keyword_mask & candidate.title_keyword_mask)
+        or (candidate.property_type == source.property_type and title_sim > 0.05)
+        or (candidate.bedrooms == source.bedrooms and title_sim > 0.05)
+    )
+    if primary:
+        return score, True, title_sim, location_sim
+
+    if (title_sim > 0.05 or location_sim > 0.1
+            or candidate.property_type == source.property_type
+            or candidate.bedrooms == source.bedrooms):
+        return max(title_sim, location_sim, 0.25), False, title_sim, location_sim
+    return None, False, title_sim, location_sim
+
+
+def reason_codes(source, candidate, title_sim, location_sim):
+    """Why the candidate is similar, as [code, value] pairs (see describe_reasons)"""
+    codes = []
+    if location_sim > title_sim and location_sim > 0.15:
+        shared = [word for word in source.location_words if word in candidate.location_words]
+        codes.append(['area', shared[:2]] if shared else ['location', None])
+    else:
+        features = [
+            group for group in similarity_matcher.groups(source.title_keyword_mask & candidate.title_keyword_mask)
+            if group not in ('apartment', 'house')
+        ]
+        if features:
+            codes.append(['features', features[:2]])
+        shared_words = [word for word in source.display_words if word in candidate.display_words]
+        if shared_words:
+            codes.append(['terms', shared_words[:3]])
+        if not codes:
+            codes.append(['title', None])
+
+    if candidate.bedrooms == source.bedrooms:
+        codes.append(['bedrooms', candidate.bedrooms])
+    if _price_ratio(source, candidate) >= 0.8:
+        codes.append(['price', None])
+    return codes[:3]
+
+
+def describe_reasons(codes):
+    """Display strings of stored reason codes"""
+    reasons = []
+    for code, value in codes:
+        if code == 'area':
+            reasons.append(f"Same area: {', '.join(word.capitalize() for word in value)}")
+        elif code == 'location':
+            reasons.append("Similar location/neighborhood")
+        elif code == 'features':
+            labels = [FEATURE_LABELS.get(group, group.replace('_', ' ')) for group in value]
+            reasons.append(f"Similar features: {', '.join(labels)}")
+        elif code == 'terms':
+            reasons.append(f"Shared terms: {', '.join(word.capitalize() for word in value)}")
+        elif code == 'title':
+            reasons.append("Similar title content")
+        elif code == 'bedrooms':
+            reasons.append(f"Same size: {value} bedroom" if value == 1 else f"Same size: {value} bedrooms")
+        elif code == 'price':
+            reasons.append("Similar price range")
+    return reasons
+
+
+def match_percentage(title_sim, location_sim):
+    return min(max(int(max(title_sim, location_sim) * 100), 30), 100)
+
+
+def rank_similar(source, candidates, count=SIMILAR_COUNT):
+    """
+    Top `count` neighbours of `source` among `candidates` (available
+    listings, newest first). Returns a list of
+    (candidate_id, score, primary, match_percentage, reason_codes), best first.
+    """
+    primary = []
+    fallback = []
+    for candidate in candidates:
+        if candidate.id == source.id:
+            continue
+        score, is_primary, title_sim, location_sim = score_candidate(source, candidate)
+        if score is None:
+            continue
+        entry = (score, candidate, is_primary, title_sim, location_sim)
+        (primary if is_primary else fallback).append(entry)
+
+    # Stable sorts keep the newest-first order among equal scores
+    primary.sort(key=lambda entry: entry[0], reverse=True)
+    chosen = primary[:count]
+    if len(chosen) < 3:
+        fallback.sort(key=lambda entry: entry[0], reverse=True)
+        chosen.extend(fallback[:count - len(chosen)])
+
+    return [
+        (candidate.id, score, is_primary, match_percentage(title_sim, location_sim),
+         reason_codes(source, candidate, title_sim, location_sim))
+        for score, candidate, is_primary, title_sim, location_sim in chosen
+    ]
+
+
+# Database side
+
+def load_listings(**filters):
+    from .models import Property
+
+    rows = Property.objects.filter(**filters).order_by('-created_at', '-id').values_list(*LISTING_FIELDS)
+    return [make_listing(*row) for row in rows.iterator(chunk_size=2000)]
+
+
+def neighbour_rows(source_id, neighbours):
+    """Unsaved SimilarProperty rows for a rank_similar result"""
+    from .models import SimilarProperty
+
+    return [
+        SimilarProperty(
+            property_id=source_id, similar_id=candidate_id, rank=rank, score=score,
+            primary=primary, match_percentage=percentage, reasons=codes,
+        )
+        for rank, (candidate_id, score, primary, percentage, codes) in enumerate(neighbours)
+    ]
+
+
+def store_neighbours(source_id, neighbours):
+    from .models import SimilarProperty
+
+    SimilarProperty.objects.filter(property_id=source_id).delete()
+    SimilarProperty.objects.bulk_create(neighbour_rows(source_id, neighbours))
+
+
+def lsh_neighbours(source):
+    """
+    rank_similar over the LSH bucket-mates of `source`, or None when they
+    yield fewer than SIMILAR_COUNT primary matches (the caller then falls
+    back to the exhaustive scan)
+    """
+    from .lsh import candidate_ids
+
+    ids = candidate_ids(source, status='available')
+    if len(ids) < SIMILAR_COUNT:
+        return None
+    neighbours = rank_similar(source, load_listings(id__in=ids))
+    if sum(1 for neighbour in neighbours if neighbour[2]) < SIMILAR_COUNT:
+        return None
+    return neighbours
+
+
+def refresh_neighbours(property_id, candidates=None):
+    """
+    Recompute and store one property's list; returns the stored neighbours.
+    Without `candidates` the LSH bucket-mates are scored, falling back to
+    every available listing.
+    """
+    source = load_listings(id=property_id)
+    if not source:
+        return []
+    neighbours = None
+    if candidates is None:
+        neighbours = lsh_neighbours(source[0])
+        if neighbours is None:
+            candidates = load_listings(status='available')
+    if neighbours is None:
+        neighbours = rank_similar(source[0], candidates)
+    store_neighbours(property_id, neighbours)
+    return neighbours
+
+
+def refresh_after_change(property_id):
+    """
+    Bring lists up to date after `property_id` changed: its own list, lists
+    that contain it, and lists of its LSH bucket-mates that it now outranks
+    an entry of. Lists it would enter without sharing a bucket are only
+    picked up by the next full rebuild.
+    """
+    from .lsh import candidate_ids
+    from .models import Property, SimilarProperty
+
+    refresh_neighbours(property_id)
+
+    affected = set(
+        SimilarProperty.objects.filter(similar_id=property_id).values_list('property_id', flat=True)
+    )
+    changed = load_listings(id=property_id)
+    if changed and Property.objects.filter(pk=property_id, status='available').exists():
+        changed = changed[0]
+        mates = [
+            source_id for source_id in candidate_ids(changed, limit=None)
+            if source_id not in affected
+        ]
+        # Lists rank primary matches before fallbacks, so compare (primary, score)
+        # against each list's last entry; ties count since newer listings win them
+        lowest = {}
+        entries = {}
+        rows = SimilarProperty.objects.filter(property_id__in=mates).values_list('property_id', 'primary', 'score')
+        for source_id, primary, score in rows:
+            key = (primary, score)
+            lowest[source_id] = min(key, lowest.get(source_id, key))
+            entries[source_id] = entries.get(source_id, 0) + 1
+        for source in load_listings(id__in=mates):
+            score, primary, _, _ = score_candidate(source, changed)
+            if score is None:
+                continue
+            if entries.get(source.id, 0) < SIMILAR_COUNT or (primary, score) >= lowest[source.id]:
+                affected.add(source.id)
+
+    for source_id in affected:
+        refresh_neighbours(source_id)
+    return len(affected)
+
+
+# Process pool rebuild
+
+_worker_candidates = None
+
+
+def _init_worker(candidates):
+    global _worker_candidates
+    _worker_candidates = candidates
+
+
+def _rank_chunk(sources):
+    return [(source.id, rank_similar(source, _worker_candidates)) for source in sources]
+
+
+def compute_all(sources, candidates, workers=None, chunk_size=200):
+    """Yield (source_id, neighbours) for every source, computed in a process pool"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunks = [sources[i:i + chunk_size] for i in range(0, len(sources), chunk_size)]
+    if workers == 1:
+        _init_worker(candidates)
+        for chunk in chunks:
+            yield from _rank_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(candidates,)) as pool:
+        for results in pool.map(_rank_chunk, chunks):
+            yield from results
@@ -0,0 +1,12 @@
+from core.tasks import task
+from .similarity import REFRESH_SIMILAR, refresh_after_change, refresh_neighbours
+
+
+@task(REFRESH_SIMILAR)
+def refresh_similar_properties(key, events):
+    """Recompute neighbour lists after a property changed (key = property id)"""
+    property_id = int(key)
+    if any(event.get('changed') for event in events):
+        refresh_after_change(property_id)
+    else:
+        refresh_neighbours(property_id)
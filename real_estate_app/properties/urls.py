@@ -18,6 +18,7 @@ urlpatterns = [
     path('update-image-order/', views.update_image_order, name='update_image_order'),
     path('update-status/<int:pk>/', views.update_property_status, name='update_status'),
     path('similar/<int:pk>/', views.similar_properties, name='similar_properties'),
+    path('map/', views.map_properties, name='map_properties'),
 
     #Testing
     path('property/<int:property_id>/send-message/', views.send_message, name='send_message'),
@@ -37,18 +37,22 @@ def get_properties_within_distance(center_property, max_distance_km: float = 5.0
     Returns:
         List of tuples: (property, distance_km, is_already_booked)
     """
+    from .geo import properties_within_radius
     from .models import Property, PropertyBooking
     
     if not center_property.latitude or not center_property.longitude:
         return []
     
-    # Get all properties by the same agent
+    # Available properties by the same agent, found through the geohash index
     agent_properties = Property.objects.filter(
         agent=center_property.agent,
         status='available'
     ).exclude(
         id=center_property.id
     )
+    nearby = properties_within_radius(
+        center_property.latitude, center_property.longitude, max_distance_km, queryset=agent_properties
+    )
     
     # Get user's existing bookings for this agent if user is provided
     user_booked_property_ids = set()
@@ -61,101 +65,143 @@ def get_properties_within_distance(center_property, max_distance_km: float = 5.0
             ).values_list('property_ref_id', flat=True)
         )
     
-    nearby_properties = []
-    
-    for property_obj in agent_properties:
-        if property_obj.latitude and property_obj.longitude:
-            distance = calculate_distance(
-                float(center_property.latitude),
-                float(center_property.longitude),
-                float(property_obj.latitude),
-                float(property_obj.longitude)
-            )
-            
-            if distance <= max_distance_km:
-                is_already_booked = property_obj.id in user_booked_property_ids
-                nearby_properties.append((property_obj, round(distance, 2), is_already_booked))
-    
-    # Sort by distance
-    nearby_properties.sort(key=lambda x: x[1])
-    
-    return nearby_properties
+    # Already sorted by distance
+    return [
+        (property_obj, round(distance, 2), property_obj.id in user_booked_property_ids)
+        for property_obj, distance in nearby
+    ]
+
+# Farthest apart two properties visited on the same day may be
+MAX_SAME_DAY_DISTANCE_KM = 5.0
+
+def parse_property_ids(value) -> list:
+    """Property ids from a comma-separated string such as additional_properties"""
+    return [int(pid.strip()) for pid in (value or '').split(',') if pid.strip().isdigit()]
 
-def check_booking_distance_compatibility(user, new_property, preferred_date) -> Tuple[bool, Optional[str], Optional[list]]:
+def _has_coordinates(property_obj) -> bool:
+    return property_obj.latitude is not None and property_obj.longitude is not None
+
+def plan_same_day_visit(user, new_property, preferred_date, additional_property_ids=()) -> dict:
     """
-    Check if a new booking is compatible with existing bookings based on distance.
-    
-    Args:
-        user: The user making the booking
-        new_property: The property being booked
-        preferred_date: The preferred date for the booking
-    
-    Returns:
-        Tuple of (is_compatible, error_message, conflicting_bookings)
+    Check a new visit (new_property plus any additional_properties) against
+    the user's other bookings on the same day, and suggest the order in which
+    to visit its properties.
+    
+    Fetches the user's relevant bookings with their properties in one query
+    and computes all distances in one NumPy distance matrix.
+    
+    Returns a dict with:
+        is_compatible, error_message, conflicting_bookings: as returned by
+            check_booking_distance_compatibility
+        route: the visit's properties in nearest-neighbour order, starting
+            at new_property (properties without coordinates last)
+        route_km: length of that route in kilometers
     """
-    from .models import PropertyBooking
+    import datetime
+    from django.conf import settings
+    from django.db.models import Q
+    from django.utils import timezone
+    from .geo import distance_matrix, nearest_neighbour_route
+    from .models import Property, PropertyBooking
     
-    # First check if user has already booked this exact property
-    existing_same_property = PropertyBooking.objects.filter(
-        customer=user,
-        property_ref=new_property,
-        status__in=['pending', 'confirmed']
-    ).first()
+    plan = {
+        'is_compatible': True,
+        'error_message': None,
+        'conflicting_bookings': [],
+        'route': [new_property],
+        'route_km': 0.0,
+    }
+    
+    # Same-property and same-day bookings in a single query (the day as a
+    # range so the preferred_date index applies)
+    day_start = datetime.datetime.combine(preferred_date.date(), datetime.time.min)
+    if settings.USE_TZ:
+        day_start = timezone.make_aware(day_start)
+    day_end = day_start + datetime.timedelta(days=1)
+    bookings = list(
+        PropertyBooking.objects.filter(
+            Q(property_ref=new_property) | Q(preferred_date__gte=day_start, preferred_date__lt=day_end),
+            customer=user,
+            status__in=['pending', 'confirmed'],
+        ).select_related('property_ref')
+    )
     
+    # First check if user has already booked this exact property
+    existing_same_property = next((booking for booking in bookings if booking.property_ref_id == new_property.id), None)
     if existing_same_property:
-        return False, f"You have already booked this property on {existing_same_property.preferred_date.strftime('%Y-%m-%d at %H:%M')}. You cannot book the same property multiple times.", [existing_same_property]
-    
-    # Get existing bookings on the same date
-    existing_bookings = PropertyBooking.objects.filter(
-        customer=user,
-        status__in=['pending', 'confirmed'],
-        preferred_date__date=preferred_date.date()
-    ).exclude(property_ref=new_property)
-    
-    if not existing_bookings.exists():
-        return True, None, []
-    
-    if not new_property.latitude or not new_property.longitude:
-        return False, "Cannot book properties without location coordinates on the same day.", list(existing_bookings)
-    
-    conflicting_bookings = []
-    
-    for booking in existing_bookings:
-        existing_property = booking.property_ref
-        
-        if not existing_property.latitude or not existing_property.longitude:
-            conflicting_bookings.append(booking)
-            continue
-        
-        distance = calculate_distance(
-            float(new_property.latitude),
-            float(new_property.longitude),
-            float(existing_property.latitude),
-            float(existing_property.longitude)
+        plan.update(
+            is_compatible=False,
+            error_message=f"You have already booked this property on {existing_same_property.preferred_date.strftime('%Y-%m-%d at %H:%M')}. You cannot book the same property multiple times.",
+            conflicting_bookings=[existing_same_property],
         )
-        
-        if distance > 5.0:  # More than 5km apart
-            conflicting_bookings.append(booking)
+        return plan
+    
+    # Additional properties keep their selected order until the route is known
+    additional_ids = [pid for pid in dict.fromkeys(additional_property_ids) if pid != new_property.id]
+    additional = Property.objects.in_bulk(additional_ids) if additional_ids else {}
+    stops = [new_property] + [additional[pid] for pid in additional_ids if pid in additional]
+    located_stops = [stop for stop in stops if _has_coordinates(stop)]
+    
+    if not bookings and len(located_stops) < 2:
+        plan['route'] = stops
+        return plan
+    
+    if bookings and not _has_coordinates(new_property):
+        plan.update(
+            is_compatible=False,
+            error_message="Cannot book properties without location coordinates on the same day.",
+            conflicting_bookings=bookings,
+        )
+        return plan
+    
+    located_bookings = [booking for booking in bookings if _has_coordinates(booking.property_ref)]
+    points = located_stops + [booking.property_ref for booking in located_bookings]
+    matrix = distance_matrix([float(point.latitude) for point in points], [float(point.longitude) for point in points])
+    
+    # A booking conflicts when its property is too far from any stop of the new visit
+    stop_count = len(located_stops)
+    farthest = {
+        booking.id: float(matrix[:stop_count, stop_count + index].max())
+        for index, booking in enumerate(located_bookings)
+    }
+    conflicting_bookings = [
+        booking for booking in bookings
+        if booking.id not in farthest or farthest[booking.id] > MAX_SAME_DAY_DISTANCE_KM
+    ]
     
     if conflicting_bookings:
-        error_msg = "You cannot book properties that are more than 5km apart on the same day. "
+        error_msg = f"You cannot book properties that are more than {MAX_SAME_DAY_DISTANCE_KM:g}km apart on the same day. "
         error_msg += f"The following booking(s) conflict: "
         
         conflict_details = []
         for booking in conflicting_bookings:
             existing_property = booking.property_ref
-            if existing_property.latitude and existing_property.longitude and new_property.latitude and new_property.longitude:
-                distance = calculate_distance(
-                    float(new_property.latitude),
-                    float(new_property.longitude),
-                    float(existing_property.latitude),
-                    float(existing_property.longitude)
-                )
-                conflict_details.append(f"'{existing_property.title}' ({distance:.2f}km away)")
+            if booking.id in farthest:
+                conflict_details.append(f"'{existing_property.title}' ({farthest[booking.id]:.2f}km away)")
             else:
                 conflict_details.append(f"'{existing_property.title}' (location unknown)")
         
         error_msg += ", ".join(conflict_details)
-        return False, error_msg, conflicting_bookings
+        plan.update(is_compatible=False, error_message=error_msg, conflicting_bookings=conflicting_bookings)
     
-    return True, None, []
+    # Suggested order for the new visit's own properties
+    order = nearest_neighbour_route(matrix[:stop_count, :stop_count], start=0)
+    plan['route'] = [located_stops[index] for index in order] + [stop for stop in stops if not _has_coordinates(stop)]
+    plan['route_km'] = round(float(sum(matrix[a, b] for a, b in zip(order, order[1:]))), 2)
+    return plan
+
+def check_booking_distance_compatibility(user, new_property, preferred_date, additional_property_ids=()) -> Tuple[bool, Optional[str], Optional[list]]:
+    """
+    Check if a new booking is compatible with existing bookings based on distance.
+    
+    Args:
+        user: The user making the booking
+        new_property: The property being booked
+        preferred_date: The preferred date for the booking
+        additional_property_ids: Other properties visited with new_property
+    
+    Returns:
+        Tuple of (is_compatible, error_message, conflicting_bookings)
+    """
+    plan = plan_same_day_visit(user, new_property, preferred_date, additional_property_ids)
+    return plan['is_compatible'], plan['error_message'], plan['conflicting_bookings']
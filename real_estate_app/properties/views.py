@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 import json
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.decorators import login_required
@@ -12,12 +12,19 @@ from django.views.generic import (
     DeleteView,
 )
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.views.decorators.http import require_POST
+from django.db import transaction
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Q
-from .models import Property, PropertyImage, Favorite, PropertyMessage
+from .models import Property, PropertyImage, Favorite, PropertyMessage, SimilarProperty
 from .forms import PropertyForm, PropertyImageForm
+from . import fulltext, geo, relationships
+from .similarity import MISSING_REFRESH_INTERVAL, REFRESH_SIMILAR, describe_reasons
 from search.models import SearchHistory
+from core.pagination import CursorPaginator, InvalidCursor, estimated_count
+from core.tasks import enqueue
 
 
 @login_required
@@ -39,6 +46,12 @@ class PropertyListView(LoginRequiredMixin, ListView):
     template_name = "properties/property_list.html"
     context_object_name = "properties"
     paginate_by = 9
+    SORT_ORDERINGS = {
+        "price_low": ("price", "id"),
+        "price_high": ("-price", "-id"),
+        "newest": ("-created_at", "-id"),
+        "oldest": ("created_at", "id"),
+    }
 
     def get_queryset(self):
         # Show ALL properties, including booked ones, but not sold ones
@@ -49,11 +62,15 @@ class PropertyListView(LoginRequiredMixin, ListView):
         # Search functionality
         search = self.request.GET.get("search")
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search)
-                | Q(address__icontains=search)
-                | Q(description__icontains=search)
-            )
+            ranked = fulltext.search(queryset, search, match_all=True)
+            if ranked is not None:
+                queryset = ranked
+            else:
+                queryset = queryset.filter(
+                    Q(title__icontains=search)
+                    | Q(address__icontains=search)
+                    | Q(description__icontains=search)
+                )
 
         # Property type filter
         property_type = self.request.GET.get("property_type")
@@ -83,43 +100,47 @@ class PropertyListView(LoginRequiredMixin, ListView):
         if bathrooms:
             queryset = queryset.filter(bathrooms__gte=bathrooms)
 
-        # Sorting
+        # Sorting (id breaks ties so pages are stable, and is the last
+        # key of the keyset used by ?cursor= pagination)
         sort = self.request.GET.get("sort")
-        if sort == "price_low":
-            queryset = queryset.order_by("price")
-        elif sort == "price_high":
-            queryset = queryset.order_by("-price")
-        elif sort == "newest":
-            queryset = queryset.order_by("-created_at")
-        elif sort == "oldest":
-            queryset = queryset.order_by("created_at")
+        if sort in self.SORT_ORDERINGS:
+            self.ordering_fields = self.SORT_ORDERINGS[sort]
+        elif search and "search_rank" in queryset.query.annotations:
+            # Relevance ranks are not stored, so ranked results use page numbers
+            self.ordering_fields = None
+            queryset = queryset.order_by("-search_rank", "-created_at", "-id")
         else:
-            queryset = queryset.order_by("-created_at")
+            self.ordering_fields = self.SORT_ORDERINGS["newest"]
+        if self.ordering_fields:
+            queryset = queryset.order_by(*self.ordering_fields)
 
         return queryset
 
+    def paginate_queryset(self, queryset, page_size):
+        # ?cursor= switches to keyset pagination (not for relevance-ranked searches)
+        self.cursor_page = None
+        if "cursor" not in self.request.GET or not self.ordering_fields:
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size, self.ordering_fields)
+        try:
+            self.cursor_page = paginator.page(self.request.GET["cursor"] or None)
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+        page = self.cursor_page
+        return (None, page, page.object_list, page.has_other_pages())
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        favorite_property_ids = []
-        booked_property_ids = []
-
-        # Get properties that have been BOOKED (not visited) by any user (to gray them out)
-        from .models import PropertyBooking
 
-        all_booked_property_ids = list(
-            PropertyBooking.objects.filter(
-                booking_type="booking",  # Only actual bookings, not visits
-                status="confirmed",  # Only confirmed bookings
-            ).values_list("property_ref__id", flat=True)
-        )
+        # Booking state (is_booked, active_visit_count) is stored on Property,
+        # so only the current page's properties are looked at
+        page_properties = list(context["object_list"])
+        page_property_ids = [prop.id for prop in page_properties]
 
-        # Get properties that have VISIT REQUESTS (to show "Being Visited" indicator)
-        all_visited_property_ids = list(
-            PropertyBooking.objects.filter(
-                booking_type="visit",  # Only visit requests
-                status__in=["pending", "confirmed"],  # Pending or confirmed visits
-            ).values_list("property_ref__id", flat=True)
-        )
+        # Properties BOOKED by any user (to gray them out) and properties with
+        # VISIT REQUESTS (to show "Being Visited" indicator)
+        all_booked_property_ids = [prop.id for prop in page_properties if prop.is_booked]
+        all_visited_property_ids = [prop.id for prop in page_properties if prop.active_visit_count]
 
         # Initialize default values
         favorite_property_ids = []
@@ -128,46 +149,15 @@ class PropertyListView(LoginRequiredMixin, ListView):
         completed_visit_property_ids = []
 
         if self.request.user.is_authenticated and self.request.user.is_customer():
-            favorite_property_ids = list(
-                Favorite.objects.filter(user=self.request.user).values_list(
-                    "property__id", flat=True
-                )
-            )
-
-            # Get properties that the current user has already booked (not visited)
-            booked_property_ids = list(
-                PropertyBooking.objects.filter(
-                    customer=self.request.user,
-                    booking_type="booking",  # Only actual bookings, not visits
-                    status__in=[
-                        "pending",
-                        "confirmed",
-                    ],  # Don't show button if booking is pending or confirmed
-                ).values_list("property_ref__id", flat=True)
-            )
-
-            # Get properties that the current user has already requested visits for (pending/incomplete visits only)
-            visited_property_ids = list(
-                PropertyBooking.objects.filter(
-                    customer=self.request.user,
-                    booking_type="visit",  # Only visit requests
-                    status__in=[
-                        "pending",
-                        "confirmed",
-                    ],  # Don't show button if visit is pending or confirmed
-                    visit_completed=False,  # Only incomplete visits
-                ).values_list("property_ref__id", flat=True)
-            )
-            
-            # Get properties where user has completed a visit (should show book option)
-            completed_visit_property_ids = list(
-                PropertyBooking.objects.filter(
-                    customer=self.request.user,
-                    booking_type="visit",
-                    status="confirmed",
-                    visit_completed=True,  # Only completed visits
-                ).values_list("property_ref__id", flat=True)
-            )
+            # The current user's flags for this page, from one cached query
+            page_relationships = relationships.get_relationships(self.request.user, page_property_ids)
+            favorite_property_ids = relationships.ids_with(page_relationships, "is_favorite")
+            # Already booked (not visited): don't show button
+            booked_property_ids = relationships.ids_with(page_relationships, "has_booking")
+            # Pending/incomplete visit requests
+            visited_property_ids = relationships.ids_with(page_relationships, "has_open_visit_request")
+            # Completed visits (should show book option)
+            completed_visit_property_ids = relationships.ids_with(page_relationships, "completed_visit_id")
 
         context["favorite_property_ids"] = favorite_property_ids
         context["booked_property_ids"] = booked_property_ids
@@ -180,8 +170,19 @@ class PropertyListView(LoginRequiredMixin, ListView):
             all_visited_property_ids  # For "Being Visited" indicator
         )
 
-        # Add total count for debugging
-        context["total_properties"] = self.get_queryset().count()
+        # Total count (the paginator has already counted the queryset; cursor
+        # pages estimate it instead)
+        paginator = context.get("paginator")
+        context["cursor_page"] = self.cursor_page
+        context["total_is_estimate"] = False
+        if paginator:
+            context["total_properties"] = paginator.count
+        elif self.cursor_page is not None:
+            total, exact = estimated_count(self.object_list)
+            context["total_properties"] = total
+            context["total_is_estimate"] = not exact
+        else:
+            context["total_properties"] = len(page_properties)
 
         return context
 
@@ -194,52 +195,28 @@ class PropertyDetailView(LoginRequiredMixin, DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         if self.request.user.is_authenticated:
-            context["is_favorite"] = Favorite.objects.filter(
-                user=self.request.user, property=self.object
-            ).exists()
+            # The current user's flags for this property, from one cached query
+            relationship = relationships.get_relationship(self.request.user, self.object.pk)
+            context["is_favorite"] = relationship.is_favorite
 
             # Check if user has already booked this property (not visited)
             if self.request.user.is_customer():
                 from .models import PropertyBooking
 
-                context["has_booking"] = PropertyBooking.objects.filter(
-                    customer=self.request.user,
-                    property_ref=self.object,
-                    booking_type="booking",  # Only actual bookings, not visits
-                    status__in=[
-                        "pending",
-                        "confirmed",
-                    ],  # Don't show button if booking is pending or confirmed
-                ).exists()
-
-                # Check if user has already requested a visit for this property
-                context["has_visit_request"] = PropertyBooking.objects.filter(
-                    customer=self.request.user,
-                    property_ref=self.object,
-                    booking_type="visit",  # Only visit requests
-                    status__in=[
-                        "pending",
-                        "confirmed",
-                    ],  # Don't show button if visit is pending or confirmed
-                ).exists()
-
-                # Check for completed visits and after-visit booking eligibility
-                completed_visit = PropertyBooking.objects.filter(
-                    customer=self.request.user,
-                    property_ref=self.object,
-                    booking_type="visit",
-                    status="confirmed",
-                    visit_completed=True
-                ).first()
-                
-                # Check for visits pending confirmation (dual confirmation system)
-                pending_confirmation_visit = PropertyBooking.objects.filter(
-                    customer=self.request.user,
-                    property_ref=self.object,
-                    booking_type="visit",
-                    status="confirmed",
-                    visit_completed=False  # Visit not fully completed yet
-                ).first()
+                # Don't show buttons if a booking / visit is pending or confirmed
+                context["has_booking"] = relationship.has_booking
+                context["has_visit_request"] = relationship.has_visit_request
+
+                # Completed visit (after-visit booking eligibility) and visit
+                # pending confirmation (dual confirmation system)
+                visits = PropertyBooking.objects.in_bulk(
+                    [visit_id for visit_id in (
+                        relationship.completed_visit_id,
+                        relationship.pending_confirmation_visit_id,
+                    ) if visit_id]
+                )
+                completed_visit = visits.get(relationship.completed_visit_id)
+                pending_confirmation_visit = visits.get(relationship.pending_confirmation_visit_id)
                 
                 context["has_completed_visit"] = completed_visit is not None
                 context["completed_visit"] = completed_visit
@@ -247,12 +224,8 @@ class PropertyDetailView(LoginRequiredMixin, DetailView):
                 context["pending_confirmation_visit"] = pending_confirmation_visit
                 context["has_pending_confirmation"] = pending_confirmation_visit is not None
 
-                # Check if ANY user has booked this property (not visited) - to disable booking
-                context["is_booked_by_anyone"] = PropertyBooking.objects.filter(
-                    property_ref=self.object,
-                    booking_type="booking",  # Only actual bookings, not visits
-                    status="confirmed",  # Only confirmed bookings
-                ).exists()
+                # Whether ANY user has booked this property (not visited) - to disable booking
+                context["is_booked_by_anyone"] = self.object.is_booked
 
                 # Get all blocked visit dates for this property (dates already taken by other users)
                 blocked_dates = list(
@@ -274,11 +247,7 @@ class PropertyDetailView(LoginRequiredMixin, DetailView):
                 )
 
                 # Count of people visiting this property
-                context["visit_count"] = PropertyBooking.objects.filter(
-                    property_ref=self.object,
-                    booking_type="visit",
-                    status__in=["pending", "confirmed"],
-                ).count()
+                context["visit_count"] = self.object.active_visit_count
 
                 SearchHistory.objects.create(
                     user=self.request.user,
@@ -575,396 +544,28 @@ def similar_properties(request, pk):
     try:
         property_obj = get_object_or_404(Property, pk=pk)
 
-        # Define keyword groups for semantic similarity - separated by property category
-        keyword_groups = {
-            # Residential-specific keywords
-            'luxury_residential': ['luxury', 'premium', 'elegant', 'upscale', 'high-end', 'deluxe', 'exclusive', 'sophisticated', 'executive', 'prestige'],
-            'cozy': ['cozy', 'comfortable', 'warm', 'inviting', 'charming', 'intimate', 'homely', 'snug', 'cute', 'lovely'],
-            'modern_residential': ['modern', 'contemporary', 'stylish', 'updated', 'renovated', 'new', 'sleek', 'chic', 'fresh', 'latest'],
-            'spacious_residential': ['spacious', 'large', 'big', 'roomy', 'vast', 'expansive', 'wide', 'generous', 'huge', 'massive'],
-            'beautiful': ['beautiful', 'stunning', 'gorgeous', 'lovely', 'attractive', 'magnificent', 'spectacular', 'amazing', 'wonderful', 'fantastic'],
-            'quiet': ['quiet', 'peaceful', 'serene', 'tranquil', 'calm', 'silent', 'secluded', 'private', 'noise-free'],
-            'family': ['family', 'kids', 'children', 'school', 'playground', 'safe', 'friendly', 'child-friendly', 'residential'],
-            'garden': ['garden', 'yard', 'outdoor', 'green', 'lawn', 'patio', 'terrace', 'balcony', 'landscaped', 'park'],
-            'furnished': ['furnished', 'equipped', 'ready', 'complete', 'move-in', 'fully-furnished', 'semi-furnished'],
-            
-            # Property type keywords
-            'apartment': ['apartment', 'flat', 'unit', 'condo', 'condominium', 'bhk', '1bhk', '2bhk', '3bhk', '4bhk'],
-            'house': ['house', 'home', 'villa', 'bungalow', 'residence'],
-            
-            # Specific view categories for residential
-            'lake_view': ['lake', 'lakeside', 'waterfront', 'lake view', 'lakefront', 'lakeview'],
-            'garden_view': ['garden view', 'garden facing', 'overlooks garden', 'garden-facing'],
-            'mountain_view': ['mountain', 'mountain view', 'hills', 'hillside', 'mountainside'],
-            'city_view': ['city view', 'cityscape', 'urban view', 'downtown view'],
-            'sea_view': ['sea', 'ocean', 'sea view', 'ocean view', 'beachfront', 'seaside'],
-            'river_view': ['river', 'river view', 'riverside', 'riverfront'],
-            'park_view': ['park view', 'park facing', 'overlooks park', 'park-facing'],
-            
-            # Commercial/Office-specific keywords
-            'office_space': ['office', 'workspace', 'business center', 'corporate', 'professional'],
-            'commercial': ['commercial', 'business', 'shop', 'retail', 'store', 'showroom'],
-            'modern_office': ['modern office', 'contemporary workspace', 'tech-ready', 'it-enabled', 'smart office'],
-            'premium_office': ['premium office', 'grade a', 'class a', 'executive suite', 'corner office'],
-            'shared_space': ['coworking', 'shared office', 'flexible workspace', 'hot desk', 'co-working'],
-            
-            # Common categories (applicable to both)
-            'convenient': ['convenient', 'accessible', 'central', 'nearby', 'close', 'walking', 'transport', 'location'],
-            'affordable': ['affordable', 'budget', 'cheap', 'economical', 'reasonable', 'value', 'low-cost'],
-            'security': ['secure', 'gated', 'protected', 'safe', 'guard', 'security'],
-            'parking': ['parking', 'garage', 'car', 'vehicle', 'covered'],
-            'investment': ['investment', 'rental', 'income', 'profitable', 'return']
-        }
-        
-        def extract_keywords(title):
-            """Extract keywords from property title"""
-            title_lower = title.lower()
-            found_keywords = set()
-            
-            # Check for multi-word phrases first (more specific)
-            for group_name, keywords in keyword_groups.items():
-                for keyword in keywords:
-                    if len(keyword.split()) > 1:  # Multi-word phrases
-                        if keyword in title_lower:
-                            found_keywords.add(group_name)
-                            break
-            
-            # Then check for single words (only if no multi-word match in same group)
-            for group_name, keywords in keyword_groups.items():
-                if group_name not in found_keywords:  # Only if not already matched
-                    for keyword in keywords:
-                        if len(keyword.split()) == 1:  # Single words
-                            if keyword in title_lower:
-                                found_keywords.add(group_name)
-                                break
-            
-            return found_keywords
-        
-        def calculate_title_similarity(title1, title2):
-            """Calculate similarity score between two titles based on keywords and direct word matching"""
-            # Normalize titles for comparison
-            title1_lower = title1.lower().strip()
-            title2_lower = title2.lower().strip()
-            
-            # Quick exact match check
-            if title1_lower == title2_lower:
-                return 1.0
-            
-            # Extract keywords from both titles
-            keywords1 = extract_keywords(title1)
-            keywords2 = extract_keywords(title2)
-            
-            # Calculate keyword group similarity
-            keyword_similarity = 0.0
-            if keywords1 or keywords2:
-                intersection = len(keywords1.intersection(keywords2))
-                union = len(keywords1.union(keywords2))
-                keyword_similarity = intersection / union if union > 0 else 0.0
-            
-            # Calculate direct word similarity (excluding common words)
-            exclude_words = {'for', 'sale', 'rent', 'at', 'in', 'the', 'and', 'or', 'with', 'a', 'an', 'is', 'are', 'be', 'by', 'on', 'to', 'from', 'of', 'this', 'that', 'it', 'as'}
-            
-            def extract_meaningful_words(title):
-                words = set()
-                for word in title.split():
-                    clean_word = word.lower().strip('.,!?()[]{}";:')
-                    # Only include words that are longer than 3 characters and not common words
-                    if len(clean_word) > 3 and clean_word not in exclude_words:
-                        words.add(clean_word)
-                return words
-            
-            title1_words = extract_meaningful_words(title1)
-            title2_words = extract_meaningful_words(title2)
-            
-            word_similarity = 0.0
-            if title1_words or title2_words:
-                # Calculate Jaccard similarity for words
-                word_intersection = len(title1_words.intersection(title2_words))
-                word_union = len(title1_words.union(title2_words))
-                word_similarity = word_intersection / word_union if word_union > 0 else 0.0
-                
-                # Give extra weight to exact word matches when there are many shared words
-                if word_intersection >= 2:
-                    word_similarity = min(word_similarity * 1.2, 1.0)  # Boost but cap at 1.0
-            
-            # Combine both similarities with more balanced weighting
-            # 60% keyword groups (semantic), 40% direct words (lexical) - more balanced approach
-            final_similarity = (keyword_similarity * 0.6) + (word_similarity * 0.4)
-            
-            # If there are no keyword matches but good word overlap, give it a reasonable score
-            if keyword_similarity == 0 and word_similarity > 0.4:
-                final_similarity = word_similarity * 0.6  # Less penalty if no semantic match
-            
-            # Boost similarity if there are good keyword matches AND word matches
-            if keyword_similarity > 0.3 and word_similarity > 0.2:
-                final_similarity = min(final_similarity * 1.1, 1.0)  # Small boost for strong matches
-            
-            # Ensure the result is between 0 and 1
-            return min(max(final_similarity, 0.0), 1.0)
-        
-        def calculate_location_similarity(address1, address2):
-            """Calculate similarity between two addresses"""
-            if not address1 or not address2:
-                return 0.0
-                
-            # Normalize addresses
-            addr1_lower = address1.lower().strip()
-            addr2_lower = address2.lower().strip()
-            
-            # Quick exact match check
-            if addr1_lower == addr2_lower:
-                return 1.0
-            
-            # Extract meaningful location words (excluding common address words)
-            location_exclude_words = {'street', 'st', 'avenue', 'ave', 'road', 'rd', 'lane', 'ln', 'drive', 'dr', 'boulevard', 'blvd', 'plaza', 'place', 'apt', 'apartment', 'suite', 'unit', 'floor', 'building', 'block', 'sector', 'phase', '#', 'no', 'number'}
-            
-            def extract_location_words(address):
-                words = set()
-                for word in address.split():
-                    clean_word = word.lower().strip('.,!?()[]{}";:/#-')
-                    # Include location words that are longer than 2 characters and not common address terms
-                    if len(clean_word) > 2 and clean_word not in location_exclude_words and not clean_word.isdigit():
-                        words.add(clean_word)
-                return words
-            
-            addr1_words = extract_location_words(address1)
-            addr2_words = extract_location_words(address2)
-            
-            if not addr1_words or not addr2_words:
-                return 0.0
-            
-            # Calculate Jaccard similarity for location words
-            intersection = len(addr1_words.intersection(addr2_words))
-            union = len(addr1_words.union(addr2_words))
-            
-            return intersection / union if union > 0 else 0.0
-        
-        # Get all available properties regardless of type (focus only on title similarity)
-        all_properties = Property.objects.filter(
-            status="available"
-        ).exclude(id=property_obj.id).select_related("agent").prefetch_related("images")
-        
-        # Use all available properties as compatible properties (no type filtering)
-        compatible_properties = list(all_properties)
-        
-        # Score properties based on EITHER title similarity OR location similarity (not combined)
-        property_scores = []
-        
-        for prop in compatible_properties:
-            # Calculate title similarity
-            title_similarity = calculate_title_similarity(property_obj.title, prop.title)
-            
-            # Calculate location similarity
-            location_similarity = calculate_location_similarity(property_obj.address, prop.address)
-            
-            # Use the HIGHER of the two similarities as the main score
-            # This way properties with either good title match OR good location match will rank well
-            score = max(title_similarity, location_similarity)
-            
-            # Very minimal bonus points for additional matching criteria (optional)
-            
-            # 1. Exact bedroom match bonus (tiny bonus - 0.01)
-            if prop.bedrooms == property_obj.bedrooms:
-                score += 0.01
-            
-            # 2. Similar price range bonus (tiny bonus - 0.005)
-            price_ratio = min(float(prop.price), float(property_obj.price)) / max(float(prop.price), float(property_obj.price))
-            if price_ratio >= 0.8:  # Within 20% price range
-                score += 0.005
-            
-            # Only include properties that have meaningful similarity (more lenient approach)
-            # Extract meaningful words for comparison (more inclusive filtering)
-            current_words = set(word.lower().strip('.,!?()[]{}";:') for word in property_obj.title.split() 
-                               if len(word) > 2 and word.lower() not in ['for', 'sale', 'rent'])
-            prop_words = set(word.lower().strip('.,!?()[]{}";:') for word in prop.title.split() 
-                            if len(word) > 2 and word.lower() not in ['for', 'sale', 'rent'])
-            shared_meaningful_words = current_words.intersection(prop_words)
-            
-            # Extract keywords for additional checking
-            current_keywords = extract_keywords(property_obj.title)
-            prop_keywords = extract_keywords(prop.title)
-            shared_keywords = current_keywords.intersection(prop_keywords)
-            
-            # Include if meets any of these criteria (more lenient - easier to match)
-            # But exclude properties with different BHK counts (bedroom mismatch) for apartments only
-            different_bhk = (
-                prop.bedrooms != property_obj.bedrooms and 
-                (property_obj.bedrooms > 0 and prop.bedrooms > 0) and  # Both have bedroom info
-                (property_obj.property_type == "apartment" and prop.property_type == "apartment")  # Both are apartments
-            )
-            
-            should_include = (
-                title_similarity > 0.1 or  # 10%+ title similarity (more lenient)
-                location_similarity > 0.15 or  # 15%+ location similarity (more lenient)
-                (len(shared_meaningful_words) >= 1) or  # At least one shared word
-                (len(shared_keywords) >= 1) or  # Any keyword match
-                (prop.property_type == property_obj.property_type and title_similarity > 0.05) or  # Same type with minimal similarity
-                (prop.bedrooms == property_obj.bedrooms and title_similarity > 0.05)  # Same bedrooms with minimal similarity
-            ) and not different_bhk  # Exclude if different BHK count for apartments
-            
-            if should_include:
-                property_scores.append((prop, score))
-        
-        # Sort by score (descending) and get top properties
-        property_scores.sort(key=lambda x: x[1], reverse=True)
-        
-        # Get top 6 similar properties
-        similar = [prop for prop, score in property_scores[:6]]
-        
-        # If we don't have enough matches with good similarity, reduce the threshold
-        if len(similar) < 3:
-            # Add any remaining properties with even lower thresholds
-            remaining_properties = []
-            for p in compatible_properties:
-                if p not in similar:
-                    # Calculate similarities for fallback
-                    fallback_title_sim = calculate_title_similarity(property_obj.title, p.title)
-                    fallback_location_sim = calculate_location_similarity(property_obj.address, p.address)
-                    
-                    # More lenient criteria for fallback
-                    # But still exclude different BHK counts for apartments only
-                    different_bhk_fallback = (
-                        p.bedrooms != property_obj.bedrooms and 
-                        (property_obj.bedrooms > 0 and p.bedrooms > 0) and  # Both have bedroom info
-                        (property_obj.property_type == "apartment" and p.property_type == "apartment")  # Both are apartments
-                    )
-                    
-                    if ((fallback_title_sim > 0.05 or  # 5%+ title similarity (very lenient)
-                        fallback_location_sim > 0.1 or  # 10%+ location similarity (very lenient)
-                        (p.property_type == property_obj.property_type) or  # Same type
-                        (p.bedrooms == property_obj.bedrooms)) and  # Same bedrooms
-                        not different_bhk_fallback):  # Exclude if different BHK count for apartments
-                        remaining_properties.append((p, max(fallback_title_sim, fallback_location_sim, 0.25)))  # Minimum 25% score
-            
-            # Sort remaining by score and add the best ones
-            remaining_properties.sort(key=lambda x: x[1], reverse=True)
-            similar.extend([p for p, score in remaining_properties[:max(0, 6-len(similar))]])
+        # Neighbours are precomputed (properties/similarity.py). A property
+        # with no stored list yet gets a refresh queued (at most once per
+        # MISSING_REFRESH_INTERVAL): without a worker it runs right away,
+        # otherwise the list is empty until the worker has run
+        neighbours = (
+            SimilarProperty.objects.filter(property=property_obj, similar__status="available")
+            .select_related("similar__agent")
+            .prefetch_related("similar__images")
+            .order_by("rank")
+        )
+        entries = list(neighbours)
+        if not entries and cache.add(
+            f"similar_refresh_queued:{property_obj.pk}", True, MISSING_REFRESH_INTERVAL
+        ):
+            enqueue(REFRESH_SIMILAR, property_obj.pk, {"changed": False})
+            if getattr(settings, "BACKGROUND_TASKS_EAGER", False):
+                entries = list(neighbours.all())
 
         data = []
-        for prop in similar:
-            # Calculate individual similarities for display
-            title_similarity = calculate_title_similarity(property_obj.title, prop.title)
-            location_similarity = calculate_location_similarity(property_obj.address, prop.address)
-            
-            # Use the HIGHER similarity score (not combined) for match percentage
-            best_similarity = max(title_similarity, location_similarity)
-            
-            # Ensure match percentage never exceeds 100% and has a reasonable minimum
-            match_percentage = min(max(int(best_similarity * 100), 30), 100)
-            
-            # Enhanced similarity reasons - show EITHER title match OR location match (whichever is stronger)
-            similarity_reasons = []
-            
-            # Determine which type of similarity is stronger
-            is_location_match = location_similarity > title_similarity
-            
-            if is_location_match and location_similarity > 0.15:  # Location-based match (more lenient threshold)
-                # Extract meaningful location words to show what's similar
-                location_exclude_words = {'street', 'st', 'avenue', 'ave', 'road', 'rd', 'lane', 'ln', 'drive', 'dr', 'boulevard', 'blvd', 'plaza', 'place', 'apt', 'apartment', 'suite', 'unit', 'floor', 'building', 'block', 'sector', 'phase', '#', 'no', 'number'}
-                
-                def extract_location_display_words(address):
-                    words = []
-                    for word in address.split():
-                        clean_word = word.lower().strip('.,!?()[]{}";:/#-')
-                        if len(clean_word) > 2 and clean_word not in location_exclude_words and not clean_word.isdigit():
-                            words.append(clean_word.capitalize())
-                    return words
-                
-                current_location_words = set(extract_location_display_words(property_obj.address))
-                prop_location_words = set(extract_location_display_words(prop.address))
-                shared_location_words = current_location_words.intersection(prop_location_words)
-                
-                if shared_location_words:
-                    location_words = list(shared_location_words)[:2]  # Show max 2 words
-                    similarity_reasons.append(f"Same area: {', '.join(location_words)}")
-                else:
-                    similarity_reasons.append("Similar location/neighborhood")
-                    
-            else:  # Title-based match (or equal, default to title)
-                # Check for shared keywords (semantic groups)
-                current_keywords = extract_keywords(property_obj.title)
-                prop_keywords = extract_keywords(prop.title)
-                shared_keywords = current_keywords.intersection(prop_keywords)
-                
-                if shared_keywords:
-                    # Convert keyword groups to readable format
-                    keyword_display = []
-                    for keyword in list(shared_keywords)[:2]:
-                        # Skip property type keywords (apartment, house) from being displayed as features
-                        if keyword in ['apartment', 'house']:
-                            continue
-                        elif keyword == 'luxury_residential':
-                            keyword_display.append('luxury features')
-                        elif keyword == 'modern_residential':
-                            keyword_display.append('modern design')
-                        elif keyword == 'modern_office':
-                            keyword_display.append('modern office features')
-                        elif keyword == 'premium_office':
-                            keyword_display.append('premium office features')
-                        elif keyword == 'spacious_residential':
-                            keyword_display.append('spacious layout')
-                        elif keyword == 'cozy':
-                            keyword_display.append('cozy atmosphere')
-                        elif keyword == 'family':
-                            keyword_display.append('family-friendly')
-                        elif keyword == 'garden':
-                            keyword_display.append('garden/outdoor space')
-                        elif keyword == 'office_space':
-                            keyword_display.append('office workspace')
-                        elif keyword == 'commercial':
-                            keyword_display.append('commercial features')
-                        elif keyword == 'lake_view':
-                            keyword_display.append('lake view')
-                        elif keyword == 'garden_view':
-                            keyword_display.append('garden view')
-                        elif keyword == 'mountain_view':
-                            keyword_display.append('mountain view')
-                        elif keyword == 'city_view':
-                            keyword_display.append('city view')
-                        elif keyword == 'sea_view':
-                            keyword_display.append('sea view')
-                        elif keyword == 'river_view':
-                            keyword_display.append('river view')
-                        elif keyword == 'park_view':
-                            keyword_display.append('park view')
-                        elif 'view' in keyword:
-                            keyword_display.append(keyword.replace('_', ' '))
-                        else:
-                            keyword_display.append(keyword.replace('_', ' '))
-                    
-                    if keyword_display:
-                        similarity_reasons.append(f"Similar features: {', '.join(keyword_display)}")
-                
-                # Check for shared words in title (exact word matches)
-                exclude_words = {'for', 'sale', 'rent', 'at', 'in', 'the', 'and', 'or', 'with', 'a', 'an', 'apartment', 'house', 'condo', 'villa', 'office', 'space', 'bhk', '1bhk', '2bhk', '3bhk', '4bhk'}
-                current_words = set(word.lower().strip('.,!?()[]{}";:') for word in property_obj.title.split() 
-                                   if len(word) > 3 and word.lower() not in exclude_words)
-                prop_words = set(word.lower().strip('.,!?()[]{}";:') for word in prop.title.split() 
-                                if len(word) > 3 and word.lower() not in exclude_words)
-                shared_words = current_words.intersection(prop_words)
-                
-                if shared_words:
-                    # Show meaningful shared words
-                    meaningful_words = [word.capitalize() for word in shared_words if len(word) > 3][:3]
-                    if meaningful_words:
-                        similarity_reasons.append(f"Shared terms: {', '.join(meaningful_words)}")
-                
-                # If no title reasons found, add generic title reason
-                if not similarity_reasons:
-                    similarity_reasons.append("Similar title content")
-            
-            # Add secondary reasons only if relevant
-            if prop.bedrooms == property_obj.bedrooms:
-                bedroom_text = f"{prop.bedrooms} bedroom" if prop.bedrooms == 1 else f"{prop.bedrooms} bedrooms"
-                similarity_reasons.append(f"Same size: {bedroom_text}")
-            
-            # Add price range similarity only if very close
-            price_ratio = min(float(prop.price), float(property_obj.price)) / max(float(prop.price), float(property_obj.price))
-            if price_ratio >= 0.8:  # Within 20% price range
-                similarity_reasons.append("Similar price range")
-            
-            # Limit to top 2-3 most relevant reasons for better display
-            similarity_reasons = similarity_reasons[:3]
+        for entry in entries:
+            prop = entry.similar
+            thumbnail = prop.get_thumbnail()
             
             data.append({
                 "id": prop.id,
@@ -973,11 +574,11 @@ def similar_properties(request, pk):
                 "price": float(prop.price),
                 "bedrooms": prop.bedrooms,
                 "bathrooms": float(prop.bathrooms),
-                "thumbnail": prop.get_thumbnail(),
+                "thumbnail": thumbnail,
                 "agent": prop.agent.get_full_name() or prop.agent.username,
-                "has_image": prop.images.exists(),
-                "similarity_reasons": similarity_reasons,
-                "similarity_score": match_percentage  # Properly capped percentage
+                "has_image": thumbnail is not None,
+                "similarity_reasons": describe_reasons(entry.reasons),
+                "similarity_score": entry.match_percentage  # Properly capped percentage
             })
 
         return JsonResponse({"properties": data})
@@ -986,6 +587,120 @@ def similar_properties(request, pk):
         return JsonResponse({"error": str(e)}, status=500)
 
 
+# Map endpoint: listings are returned individually up to this many, and
+# clustered by geohash cell beyond it or below MAP_CLUSTER_MAX_ZOOM
+MAP_MAX_MARKERS = 500
+MAP_CLUSTER_MAX_ZOOM = 15
+# Highest zoom level accepted (web map tiles stop well before this)
+MAP_MAX_ZOOM = 25
+# Clusters are about this many pixels wide on a 256px-tile web map
+MAP_CLUSTER_PIXELS = 64
+
+
+def _map_marker(prop, distance=None):
+    marker = {
+        "id": prop.id,
+        "title": prop.title,
+        "address": prop.address,
+        "price": float(prop.price),
+        "display_price": prop.get_display_price(),
+        "lat": float(prop.latitude),
+        "lng": float(prop.longitude),
+        "bedrooms": prop.bedrooms,
+        "property_type": prop.property_type,
+        "listing_type": prop.listing_type,
+        "status": prop.status,
+        "thumbnail": prop.get_thumbnail(),
+        "url": reverse("properties:property_detail", args=[prop.pk]),
+    }
+    if distance is not None:
+        marker["distance_km"] = round(distance, 2)
+    return marker
+
+
+def _map_cluster(cluster):
+    data = {
+        "geohash": cluster["cell"],
+        "count": cluster["count"],
+        "lat": float(cluster["latitude"]),
+        "lng": float(cluster["longitude"]),
+    }
+    if cluster["count"] == 1:
+        data["id"] = cluster["property_id"]
+    return data
+
+
+@login_required
+def map_properties(request):
+    """
+    Listings for the map, as JSON. The area is either a viewport
+    (?bbox=min_lng,min_lat,max_lng,max_lat) or a circle (?lat=&lng=&radius=
+    in km); ?zoom= is the map zoom level, 0 to MAP_MAX_ZOOM. property_type,
+    listing_type, min_price and max_price filter like the property list.
+    """
+    try:
+        zoom = request.GET.get("zoom")
+        zoom = int(zoom) if zoom not in (None, "") else None
+        if zoom is not None and not 0 <= zoom <= MAP_MAX_ZOOM:
+            raise ValueError("zoom out of range")
+        if request.GET.get("bbox"):
+            min_lng, min_lat, max_lng, max_lat = (float(value) for value in request.GET["bbox"].split(","))
+            center = radius = None
+            if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+                raise ValueError("bbox out of range")
+        else:
+            center = (float(request.GET["lat"]), float(request.GET["lng"]))
+            radius = float(request.GET["radius"])
+            if not (-90 <= center[0] <= 90 and -180 <= center[1] <= 180 and 0 < radius <= 20000):
+                raise ValueError("lat/lng/radius out of range")
+    except (KeyError, ValueError):
+        return JsonResponse({
+            "success": False,
+            "error": f"Pass bbox=min_lng,min_lat,max_lng,max_lat or lat, lng and radius (km), and zoom from 0 to {MAP_MAX_ZOOM}",
+        }, status=400)
+
+    queryset = Property.objects.filter(status__in=["available", "pending"])
+    for field in ("property_type", "listing_type"):
+        if request.GET.get(field):
+            queryset = queryset.filter(**{field: request.GET[field]})
+    try:
+        if request.GET.get("min_price"):
+            queryset = queryset.filter(price__gte=float(request.GET["min_price"]))
+        if request.GET.get("max_price"):
+            queryset = queryset.filter(price__lte=float(request.GET["max_price"]))
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Invalid price filter"}, status=400)
+
+    # Width of a cluster cell, from the zoom level or else the area shown
+    if zoom is not None:
+        cell_width = 360.0 / (2 ** zoom) * MAP_CLUSTER_PIXELS / 256
+    elif radius is None:
+        cell_width = ((max_lng - min_lng) % 360 or 360) / 8
+    else:
+        cell_width = radius * 2 / geo.KM_PER_DEGREE / 8
+    precision = geo.cluster_precision(cell_width)
+    zoomed_out = zoom is not None and zoom < MAP_CLUSTER_MAX_ZOOM
+
+    if radius is None:
+        queryset = queryset.filter(geo.bbox_prefilter(min_lat, min_lng, max_lat, max_lng))
+        total = queryset.count()
+        if zoomed_out or total > MAP_MAX_MARKERS:
+            clusters = [_map_cluster(cluster) for cluster in geo.cluster_queryset(queryset, precision)]
+            return JsonResponse({"success": True, "mode": "clusters", "total": total, "clusters": clusters})
+        properties = queryset.prefetch_related("images").order_by("id")
+        markers = [_map_marker(prop) for prop in properties]
+    else:
+        points = geo.points_within_radius(center[0], center[1], radius, queryset, fields=("geohash",))
+        total = len(points)
+        if zoomed_out or total > MAP_MAX_MARKERS:
+            clusters = [_map_cluster(cluster) for cluster in geo.cluster_points(points, precision)]
+            return JsonResponse({"success": True, "mode": "clusters", "total": total, "clusters": clusters})
+        properties = queryset.prefetch_related("images").in_bulk([point[0] for point in points])
+        markers = [_map_marker(properties[point[0]], point[-1]) for point in points if point[0] in properties]
+
+    return JsonResponse({"success": True, "mode": "markers", "total": total, "properties": markers})
+
+
 # Testing
 @require_POST
 @login_required
@@ -1006,9 +721,11 @@ def send_message(request, property_id):
 
     # Allow both customers and other users to send messages to agents
     try:
-        PropertyMessage.objects.create(
-            property=property, sender=request.user, content=content
-        )
+        # The agent's unread counter is updated in the same transaction
+        with transaction.atomic():
+            PropertyMessage.objects.create(
+                property=property, sender=request.user, content=content
+            )
 
         # If this is an AJAX request, return JSON
         if request.headers.get(
@@ -1108,8 +825,10 @@ def mark_message_read(request, message_id):
         message = get_object_or_404(
             PropertyMessage, id=message_id, property__agent=request.user
         )
-        message.read = True
-        message.save()
+        if not message.read:
+            with transaction.atomic():
+                message.read = True
+                message.save()
 
         return JsonResponse({"success": True, "message": "Message marked as read"})
     except Exception as e:
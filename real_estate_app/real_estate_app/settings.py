@@ -87,24 +87,59 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'real_estate_app.wsgi.application'
+# Chat WebSockets and the live notification stream are only served by an ASGI
+# server running this application (e.g. `daphne real_estate_app.asgi:application`).
+# Under `runserver`, which is WSGI, every page falls back to polling
 ASGI_APPLICATION = 'real_estate_app.asgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-# CHANNEL_LAYERS = {
-#     'default': {
-#         'BACKEND': 'channels.layers.InMemoryChannelLayer',
-#     },
-# }
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        'CONFIG': {
-            "hosts": [('127.0.0.1', 6379)],
+# Channel layer for the chat WebSockets: 'redis', or 'memory' for a single
+# process without Redis (local development and testing)
+CHANNEL_LAYER_BACKEND = config('CHANNEL_LAYER_BACKEND', default='redis')
+
+if CHANNEL_LAYER_BACKEND == 'memory':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
         },
-    },
-}
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                "hosts": [(config('CHANNEL_REDIS_HOST', default='127.0.0.1'), config('CHANNEL_REDIS_PORT', default=6379, cast=int))],
+            },
+        },
+    }
+
+# Pub/sub behind the live notification stream (chat/pubsub.py): the
+# in-process broker serves a single ASGI worker; use
+# 'chat.pubsub.ChannelLayerBroker' to reach the streams of every worker
+NOTIFICATION_BROKER = config('NOTIFICATION_BROKER', default='chat.pubsub.InProcessBroker')
+
+# Cache shared by every worker process. The search result generations,
+# per-user property flags and unread counts are invalidated through it, so
+# set CACHE_REDIS_URL (e.g. redis://127.0.0.1:6379/1) whenever more than one
+# process serves requests; the local memory default only suits a single
+# process such as runserver
+CACHE_REDIS_URL = config('CACHE_REDIS_URL', default='')
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
 
 DATABASES = {
     'default': {
@@ -219,4 +254,35 @@ STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='sk_test_demo_key')
 ESEWA_MERCHANT_ID = config('ESEWA_MERCHANT_ID', default='EPAYTEST')
 ESEWA_SECRET_KEY = config('ESEWA_SECRET_KEY', default='8gBm/:&EnhH.1/q')
 ESEWA_SUCCESS_URL = config('ESEWA_SUCCESS_URL', default='http://localhost:8000/properties/booking/esewa-success/')
-ESEWA_FAILURE_URL = config('ESEWA_FAILURE_URL', default='http://localhost:8000/properties/booking/esewa-failure/')
\ No newline at end of file
+ESEWA_FAILURE_URL = config('ESEWA_FAILURE_URL', default='http://localhost:8000/properties/booking/esewa-failure/')
+
+# Semantic search
+# Load the sentence-transformer model in a background thread at startup instead
+# of on the first semantic query (search falls back to structured results while it loads)
+SEARCH_MODEL_WARMUP = config('SEARCH_MODEL_WARMUP', default=False, cast=bool)
+
+# Shared embedding service started with `manage.py run_embedding_service`;
+# leave the socket empty to encode queries inside each web worker
+SEARCH_EMBEDDING_SERVICE = {
+    'ADDRESS': config('SEARCH_EMBEDDING_SOCKET', default=''),
+}
+
+# Seconds a ranked search result list is reused for an identical normalized query
+SEARCH_RESULT_CACHE_TTL = config('SEARCH_RESULT_CACHE_TTL', default=300, cast=int)
+
+# Seconds a user's per-property flags (favourite, booked, visit requested...)
+# are cached; booking and favourite changes invalidate them immediately
+PROPERTY_RELATIONSHIP_CACHE_TTL = config('PROPERTY_RELATIONSHIP_CACHE_TTL', default=600, cast=int)
+
+# Seconds a user's unread message counters are cached; new and read
+# messages invalidate them immediately
+UNREAD_COUNTS_CACHE_TTL = config('UNREAD_COUNTS_CACHE_TTL', default=300, cast=int)
+
+# Seconds before each process rebuilds its in-memory search suggestion index
+# (changes saved by other processes show up after at most this long)
+SEARCH_AUTOCOMPLETE_REBUILD_SECONDS = config('SEARCH_AUTOCOMPLETE_REBUILD_SECONDS', default=600, cast=int)
+
+# Background tasks (recommendation updates, similar-property lists) run inside
+# the request when True, which is the default with DEBUG so `runserver` needs
+# no worker. Set it to False only where `manage.py run_background_tasks` runs
+BACKGROUND_TASKS_EAGER = config('BACKGROUND_TASKS_EAGER', default=DEBUG, cast=bool)
@@ -0,0 +1,414 @@
+"""
+Approximate nearest-neighbour indexes over stored property embeddings.
+
+Two interchangeable implementations share the VectorIndex interface:
+
+* ExactIndex - flat brute-force scan, used as the recall reference.
+* IVFIndex   - inverted-file index: vectors are clustered with spherical
+  k-means and stored contiguously per cluster, so a query only scores the
+  `nprobe` clusters whose centroids are closest to it.
+
+Both keep per-row property attributes (status, type, bedrooms, bathrooms,
+price) next to the vectors so the structured filters from
+SmartSearchEngine.build_smart_query are applied while candidates are
+retrieved instead of after. Indexes are saved as plain .npy files and loaded
+with mmap so worker processes share the pages through the OS cache.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import numpy as np
+    ANN_AVAILABLE = True
+except ImportError:
+    np = None
+    ANN_AVAILABLE = False
+
+STATUS_CODES = {'available': 0, 'sold': 1, 'pending': 2}
+PROPERTY_TYPE_CODES = {'house': 0, 'apartment': 1, 'condo': 2, 'villa': 3}
+UNKNOWN_CODE = 127
+
+ATTRIBUTE_FIELDS = ('status', 'property_type', 'bedrooms', 'bathrooms', 'price')
+
+
+def encode_attributes(rows):
+    """
+    Convert (status, property_type, bedrooms, bathrooms, price) tuples into
+    the column arrays stored next to the vectors.
+    """
+    rows = list(rows)
+    return {
+        'status': np.array([STATUS_CODES.get(r[0], UNKNOWN_CODE) for r in rows], dtype=np.int8),
+        'property_type': np.array([PROPERTY_TYPE_CODES.get(r[1], UNKNOWN_CODE) for r in rows], dtype=np.int8),
+        'bedrooms': np.array([r[2] or 0 for r in rows], dtype=np.int16),
+        'bathrooms': np.array([float(r[3] or 0) for r in rows], dtype=np.float32),
+        'price': np.array([float(r[4] or 0) for r in rows], dtype=np.float64),
+    }
+
+
+def filter_mask(attributes, filters, rows=slice(None)):
+    """
+    Boolean mask of rows matching the pushed-down filters.
+
+    Supported filter keys: status, property_types, min_bedrooms,
+    min_bathrooms, min_price, max_price. Missing keys do not filter.
+    """
+    size = len(attributes['status'][rows])
+    mask = np.ones(size, dtype=bool)
+    if not filters:
+        return mask
+
+    if filters.get('status'):
+        mask &= attributes['status'][rows] == STATUS_CODES.get(filters['status'], UNKNOWN_CODE)
+    if filters.get('property_types'):
+        codes = [PROPERTY_TYPE_CODES.get(t, UNKNOWN_CODE) for t in filters['property_types']]
+        mask &= np.isin(attributes['property_type'][rows], codes)
+    if filters.get('min_bedrooms'):
+        mask &= attributes['bedrooms'][rows] >= filters['min_bedrooms']
+    if filters.get('min_bathrooms'):
+        mask &= attributes['bathrooms'][rows] >= filters['min_bathrooms']
+    if filters.get('min_price') is not None:
+        mask &= attributes['price'][rows] >= filters['min_price']
+    if filters.get('max_price') is not None:
+        mask &= attributes['price'][rows] <= filters['max_price']
+    return mask
+
+
+def top_k(ids, scores, k):
+    """Return the k best (ids, scores) sorted by descending score"""
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[best], scores[best]
+    order = np.argsort(-scores, kind='stable')
+    return ids[order], scores[order]
+
+
+class VectorIndex:
+    """Common interface for property vector indexes"""
+
+    kind = None
+
+    def __init__(self):
+        self.ids = None
+        self.vectors = None
+        self.attributes = None
+        self.built_at = None
+        self.model_version = None
+
+    def build(self, ids, vectors, attributes, model_version=None):
+        raise NotImplementedError
+
+    def search(self, query_vector, k=50, filters=None):
+        """Return (ids, scores) of the k most similar rows passing the filters"""
+        raise NotImplementedError
+
+    def __len__(self):
+        return 0 if self.ids is None else len(self.ids)
+
+    # Persistence -------------------------------------------------------
+
+    def _arrays(self):
+        arrays = {'ids': self.ids, 'vectors': self.vectors}
+        for field in ATTRIBUTE_FIELDS:
+            arrays[f'attr_{field}'] = self.attributes[field]
+        return arrays
+
+    def _meta(self):
+        return {
+            'kind': self.kind,
+            'built_at': self.built_at,
+            'model_version': self.model_version,
+            'size': len(self),
+        }
+
+    def save(self, path):
+        """Write the index to `path` atomically (temp directory + rename)"""
+        path = str(path)
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        for name, array in self._arrays().items():
+            np.save(os.path.join(tmp_path, f'{name}.npy'), np.ascontiguousarray(array))
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump(self._meta(), f)
+
+        old_path = f"{path}.old-{os.getpid()}"
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load an index saved with save(); vectors are memory-mapped by default"""
+        path = str(path)
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+
+        index_class = INDEX_BACKENDS[meta['kind']]
+        index = index_class.__new__(index_class)
+        VectorIndex.__init__(index)
+        mmap_mode = 'r' if mmap else None
+
+        def load_array(name):
+            return np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+
+        index.ids = load_array('ids')
+        index.vectors = load_array('vectors')
+        index.attributes = {field: load_array(f'attr_{field}') for field in ATTRIBUTE_FIELDS}
+        index.built_at = meta.get('built_at')
+        index.model_version = meta.get('model_version')
+        index._load_extra(load_array, meta)
+        return index
+
+    def _load_extra(self, load_array, meta):
+        pass
+
+
+class ExactIndex(VectorIndex):
+    """Flat index: scores every row that passes the filters"""
+
+    kind = 'exact'
+
+    def build(self, ids, vectors, attributes, model_version=None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.attributes = attributes
+        self.model_version = model_version
+        self.built_at = time.time()
+        return self
+
+    def search(self, query_vector, k=50, filters=None):
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if not filters:
+            return top_k(self.ids, self.vectors @ query_vector, k)
+        rows = np.flatnonzero(filter_mask(self.attributes, filters))
+        scores = self.vectors[rows] @ query_vector
+        return top_k(self.ids[rows], scores, k)
+
+
+class IVFIndex(VectorIndex):
+    """Inverted-file index with spherical k-means partitions"""
+
+    kind = 'ivf'
+
+    def __init__(self, nlist=None, nprobe=16, train_size=50000, iterations=15, seed=0):
+        super().__init__()
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.list_offsets = None
+
+    def _train(self, vectors, nlist):
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(vectors), max(self.train_size, nlist * 32))
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.iterations):
+            assignments = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            # Re-seed empty clusters from random sample vectors
+            empty = np.bincount(assignments, minlength=nlist) == 0
+            if empty.any():
+                sums[empty] = sample[rng.integers(sample_size, size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+        return centroids.astype(np.float32)
+
+    @staticmethod
+    def _assign(vectors, centroids):
+        """Nearest centroid per row, chunked to bound the score matrix size"""
+        chunk_size = max(1, (1 << 24) // max(len(centroids), 1))
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk_size):
+            chunk = vectors[start:start + chunk_size]
+            assignments[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+        return assignments
+
+    def build(self, ids, vectors, attributes, model_version=None):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.model_version = model_version
+        self.built_at = time.time()
+
+        if not len(ids):
+            self.ids, self.vectors, self.attributes = ids, vectors, attributes
+            self.centroids = np.empty((0, 0), dtype=np.float32)
+            self.list_offsets = np.zeros(1, dtype=np.int64)
+            return self
+
+        nlist = self.nlist or int(max(1, min(4 * np.sqrt(len(ids)), 1024)))
+        nlist = min(nlist, len(ids))
+        self.centroids = self._train(vectors, nlist)
+
+        # Store rows grouped by cluster so every inverted list is a contiguous slice
+        assignments = self._assign(vectors, self.centroids)
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=nlist)
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        self.ids = ids[order]
+        self.vectors = vectors[order]
+        self.attributes = {field: np.asarray(values)[order] for field, values in attributes.items()}
+        return self
+
+    def search(self, query_vector, k=50, filters=None, nprobe=None):
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_scores = self.centroids @ query_vector
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+        candidate_ids = []
+        candidate_scores = []
+        for cluster in probes:
+            start, end = self.list_offsets[cluster], self.list_offsets[cluster + 1]
+            if start == end:
+                continue
+            rows = slice(start, end)
+            mask = filter_mask(self.attributes, filters, rows)
+            if not mask.any():
+                continue
+            block = self.vectors[rows]
+            if not mask.all():
+                block = block[mask]
+            candidate_ids.append(self.ids[rows][mask])
+            candidate_scores.append(block @ query_vector)
+
+        if not candidate_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return top_k(np.concatenate(candidate_ids), np.concatenate(candidate_scores), k)
+
+    def _arrays(self):
+        arrays = super()._arrays()
+        arrays['centroids'] = self.centroids
+        arrays['list_offsets'] = self.list_offsets
+        return arrays
+
+    def _meta(self):
+        meta = super()._meta()
+        meta['nprobe'] = self.nprobe
+        return meta
+
+    def _load_extra(self, load_array, meta):
+        self.centroids = np.asarray(load_array('centroids'))
+        self.list_offsets = np.asarray(load_array('list_offsets'))
+        self.nprobe = get_index_settings().get('NPROBE', meta.get('nprobe', 16))
+
+
+INDEX_BACKENDS = {
+    ExactIndex.kind: ExactIndex,
+    IVFIndex.kind: IVFIndex,
+}
+
+
+def get_index_settings():
+    """
+    SEARCH_ANN_INDEX = {
+        'BACKEND': 'ivf',          # or 'exact'
+        'PATH': BASE_DIR / 'search_index',
+        'NPROBE': 16,
+        'CANDIDATES': 200,
+    }
+    """
+    defaults = {
+        'BACKEND': 'ivf',
+        'PATH': os.path.join(settings.BASE_DIR, 'search_index'),
+        'NPROBE': 16,
+        'CANDIDATES': 200,
+    }
+    defaults.update(getattr(settings, 'SEARCH_ANN_INDEX', {}))
+    return defaults
+
+
+def create_index():
+    """Instantiate an empty index of the configured backend"""
+    config = get_index_settings()
+    if config['BACKEND'] == IVFIndex.kind:
+        return IVFIndex(nprobe=config['NPROBE'])
+    return INDEX_BACKENDS[config['BACKEND']]()
+
+
+def build_property_index():
+    """Build and save an index from every stored embedding of the current model version"""
+    from properties.models import Property
+    from .embeddings import get_model_version
+    from .models import PropertyEmbedding
+
+    model_version = get_model_version()
+    rows = list(
+        PropertyEmbedding.objects.filter(model_version=model_version)
+        .order_by('property_id')
+        .values_list('property_id', 'vector')
+    )
+    ids = [property_id for property_id, _ in rows]
+    dimensions = len(rows[0][1]) // 4 if rows else 0
+    vectors = np.empty((len(rows), dimensions), dtype=np.float32)
+    for i, (_, vector) in enumerate(rows):
+        vectors[i] = np.frombuffer(vector, dtype=np.float32)
+
+    attribute_rows = dict(
+        (row[0], row[1:]) for row in Property.objects.filter(id__in=ids).values_list('id', *ATTRIBUTE_FIELDS)
+    )
+    attributes = encode_attributes(attribute_rows[property_id] for property_id in ids)
+
+    index = create_index().build(ids, vectors, attributes, model_version=model_version)
+    index.save(get_index_settings()['PATH'])
+    _loaded_index.clear()
+    return index
+
+
+class _LoadedIndex:
+    """Per-process cache of the on-disk index, reloaded when the files change"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._mtime = None
+
+    def clear(self):
+        with self._lock:
+            self._index = None
+            self._mtime = None
+
+    def get(self):
+        if not ANN_AVAILABLE:
+            return None
+        meta_path = os.path.join(str(get_index_settings()['PATH']), 'meta.json')
+        try:
+            mtime = os.path.getmtime(meta_path)
+        except OSError:
+            return None
+
+        with self._lock:
+            if self._index is None or self._mtime != mtime:
+                try:
+                    self._index = VectorIndex.load(get_index_settings()['PATH'])
+                    self._mtime = mtime
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Could not load search index: {str(e)}")
+                    self._index = None
+            return self._index
+
+
+_loaded_index = _LoadedIndex()
+
+
+def get_property_index():
+    """Return the loaded property index, or None when no index has been built"""
+    return _loaded_index.get()
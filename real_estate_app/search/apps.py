@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class SearchConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'search'
+
+    def ready(self):
+        # Optional warm-up hook: load the semantic model in the background at
+        # startup instead of on the first semantic query
+        if getattr(settings, 'SEARCH_MODEL_WARMUP', False):
+            from .semantic import model_provider
+            model_provider.warm_up(background=True)
@@ -0,0 +1,265 @@
+"""
+In-memory prefix index behind search_suggestions.
+
+Each process keeps a trie over popular normalized search queries and over
+"title - address" of available properties. A suggestion is reachable from
+the start of any of its words ("gar" finds "quiet garden apartment"), and
+every trie node caches its TOP_SIZE heaviest suggestions, so a lookup is a
+walk of len(prefix) dict hops with no database access.
+
+Weights are the number of times a query was searched; properties have
+PROPERTY_WEIGHT. New SearchHistory rows and Property changes are applied
+incrementally by the receivers in models.py. Those only reach the process
+that saved the row, so every process also rebuilds its index from the
+database in a background thread once it is older than
+SEARCH_AUTOCOMPLETE_REBUILD_SECONDS.
+"""
+import bisect
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+
+# Suggestions cached per trie node (lookups return at most this many)
+TOP_SIZE = 16
+# Trie depth; longer prefixes are matched by filtering the deepest node
+MAX_DEPTH = 24
+# Weight of a property suggestion, in "searches"
+PROPERTY_WEIGHT = 2
+# Most popular distinct queries loaded when (re)building
+MAX_QUERIES = 20000
+
+
+def get_rebuild_interval():
+    return getattr(settings, 'SEARCH_AUTOCOMPLETE_REBUILD_SECONDS', 600)
+
+
+def normalize(text):
+    return ' '.join(re.findall(r'\S+', (text or '').lower()))
+
+
+def word_keys_full(text):
+    """A normalized text from the start of each of its words"""
+    return [text[match.start():] for match in re.finditer(r'(?<!\S)\S', text)]
+
+
+def word_keys(text):
+    """Trie keys of a normalized text (word_keys_full cut to MAX_DEPTH)"""
+    keys = []
+    for key in word_keys_full(text):
+        key = key[:MAX_DEPTH]
+        if key not in keys:
+            keys.append(key)
+    return keys
+
+
+class _Node:
+    __slots__ = ('children', 'top')
+
+    def __init__(self):
+        self.children = {}
+        # (-weight, text) sorted ascending, i.e. heaviest first
+        self.top = []
+
+
+class PrefixIndex:
+    """Trie of weighted suggestions with a cached top list on every node"""
+
+    def __init__(self):
+        self.root = _Node()
+        self.weights = {}
+        self.keys = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.weights)
+
+    def _path(self, key):
+        node = self.root
+        yield node
+        for char in key:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _Node()
+            node = child
+            yield node
+
+    @staticmethod
+    def _discard(node, text, weight):
+        entry = (-weight, text)
+        position = bisect.bisect_left(node.top, entry)
+        if position < len(node.top) and node.top[position] == entry:
+            del node.top[position]
+
+    @staticmethod
+    def _offer(node, text, weight):
+        entry = (-weight, text)
+        if len(node.top) >= TOP_SIZE and entry >= node.top[-1]:
+            return
+        bisect.insort(node.top, entry)
+        del node.top[TOP_SIZE:]
+
+    def add(self, text, weight, keys=None):
+        """Add `weight` to a suggestion, creating it if needed"""
+        with self._lock:
+            old_weight = self.weights.get(text, 0)
+            new_weight = old_weight + weight
+            keys = self.keys.setdefault(text, keys or word_keys(text))
+            self.weights[text] = new_weight
+            # Weights only grow here, so updating the cached lists along each
+            # path keeps every node's top list exact
+            visited = set()
+            for key in keys:
+                for node in self._path(key):
+                    if id(node) in visited:
+                        continue
+                    visited.add(id(node))
+                    if old_weight:
+                        self._discard(node, text, old_weight)
+                    self._offer(node, text, new_weight)
+
+    def remove(self, text):
+        """
+        Drop a suggestion. Nodes that listed it keep one entry fewer (their
+        next-best suggestion is not promoted) until the index is rebuilt.
+        """
+        with self._lock:
+            weight = self.weights.pop(text, None)
+            if weight is None:
+                return
+            for key in self.keys.pop(text):
+                for node in self._path(key):
+                    self._discard(node, text, weight)
+
+    def lookup(self, prefix, limit=8):
+        node = self.root
+        for char in prefix[:MAX_DEPTH]:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        texts = [text for _, text in node.top]
+        if len(prefix) > MAX_DEPTH:
+            texts = [
+                text for text in texts
+                if any(key.startswith(prefix) for key in word_keys_full(normalize(text)))
+            ]
+        return texts[:limit]
+
+
+def property_suggestion(title, address):
+    return f"{title} - {address}"
+
+
+class SuggestionIndex(PrefixIndex):
+    """PrefixIndex loaded with search history and available properties"""
+
+    def __init__(self):
+        super().__init__()
+        self.built_at = time.monotonic()
+        self.property_texts = {}
+        self.property_text_counts = Counter()
+
+    def add_query(self, query, count=1):
+        text = normalize(query)
+        if len(text) >= 2:
+            self.add(text, count)
+
+    def add_property(self, property_id, title, address):
+        text = property_suggestion(title, address)
+        self.property_texts[property_id] = text
+        self.property_text_counts[text] += 1
+        self.add(text, PROPERTY_WEIGHT, word_keys(normalize(text)))
+
+    def remove_property(self, property_id):
+        text = self.property_texts.pop(property_id, None)
+        if text is None:
+            return
+        # Listings can share a title and address; keep the suggestion for the others
+        self.property_text_counts[text] -= 1
+        if self.property_text_counts[text] <= 0:
+            del self.property_text_counts[text]
+            self.remove(text)
+
+    @classmethod
+    def build(cls):
+        from properties.models import Property
+        from .models import SearchHistory
+
+        index = cls()
+        query_counts = {}
+        popular = (
+            SearchHistory.objects.values('query')
+            .annotate(searches=Count('id'))
+            .order_by('-searches')[:MAX_QUERIES]
+        )
+        for row in popular:
+            text = normalize(row['query'])
+            query_counts[text] = query_counts.get(text, 0) + row['searches']
+        for text, count in query_counts.items():
+            index.add_query(text, count)
+
+        available = Property.objects.filter(status='available').values_list('id', 'title', 'address')
+        for property_id, title, address in available.iterator():
+            index.add_property(property_id, title, address)
+        return index
+
+
+_index = None
+_rebuilding = threading.Lock()
+
+
+def _rebuild():
+    global _index
+    try:
+        _index = SuggestionIndex.build()
+    except Exception as e:
+        print(f"Error rebuilding search suggestions: {str(e)}")
+        # Keep serving the old index and retry after another interval
+        _index.built_at = time.monotonic()
+    finally:
+        connection.close()
+        _rebuilding.release()
+
+
+def get_suggestion_index():
+    """
+    The index of this process. Built synchronously on first use; afterwards a
+    stale index keeps serving while a background thread builds its successor.
+    """
+    global _index
+    if _index is None:
+        with _rebuilding:
+            if _index is None:
+                _index = SuggestionIndex.build()
+    elif time.monotonic() - _index.built_at > get_rebuild_interval():
+        if _rebuilding.acquire(blocking=False):
+            threading.Thread(target=_rebuild, name='autocomplete-rebuild', daemon=True).start()
+    return _index
+
+
+def suggest(prefix, limit=8):
+    return get_suggestion_index().lookup(normalize(prefix), limit)
+
+
+# Incremental updates: only applied once this process has built its index
+
+def record_query(query):
+    if _index is not None:
+        _index.add_query(query)
+
+
+def update_property(prop):
+    if _index is None:
+        return
+    _index.remove_property(prop.pk)
+    if prop.status == 'available':
+        _index.add_property(prop.pk, prop.title, prop.address)
+
+
+def remove_property(property_id):
+    if _index is not None:
+        _index.remove_property(property_id)
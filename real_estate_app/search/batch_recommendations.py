@@ -0,0 +1,327 @@
+"""
+Offline recommendation engine run over every customer at once.
+
+Each available property becomes a row of a feature matrix P:
+
+    property type | listing type | price bucket | bedrooms | keyword groups | [embedding]
+
+Every block is L2-normalized and scaled by BLOCK_WEIGHTS before the whole
+row is normalized, so no single block dominates the cosine score. A user's
+profile is the weighted sum of the rows of their favorites and of the
+properties they opened from search, plus features extracted from their
+recent search queries. Scores are U @ P.T.
+
+Customers are processed USER_CHUNK at a time and properties PROPERTY_CHUNK
+at a time, keeping a running top-K per user, so the score buffer never
+exceeds USER_CHUNK x PROPERTY_CHUNK floats whatever the number of users and
+properties (100k x 100k included). Results are upserted into Recommendation.
+
+Run with `manage.py compute_recommendations` (e.g. nightly from cron).
+"""
+import datetime
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from properties.keywords import RECOMMENDATION_GROUPS, recommendation_matcher
+from properties.models import Favorite, Property
+from .models import Recommendation, SearchHistory
+
+PROPERTY_TYPES = [value for value, _ in Property.PROPERTY_TYPE_CHOICES]
+LISTING_TYPES = [value for value, _ in Property.LISTING_TYPE_CHOICES]
+# Same buckets as analyze_user_preferences
+PRICE_BUCKETS = ('budget', 'mid-range', 'luxury')
+BUDGET_MAX = 3000000
+MID_RANGE_MAX = 8000000
+# 1, 2, 3, 4, 5+ bedrooms
+BEDROOM_BUCKETS = 5
+
+BLOCK_WEIGHTS = {
+    'property_type': 1.0,
+    'listing_type': 0.5,
+    'price': 1.0,
+    'bedrooms': 0.75,
+    'keywords': 1.0,
+    'embedding': 1.5,
+}
+
+FAVORITE_WEIGHT = 1.0
+VIEWED_WEIGHT = 0.5
+QUERY_WEIGHT = 0.5
+SEARCH_LOOKBACK_DAYS = 180
+
+USER_CHUNK = 1000
+PROPERTY_CHUNK = 5000
+
+
+class FeatureSpace:
+    """Column layout of the property/user feature vectors"""
+
+    def __init__(self, embedding_dimensions=0):
+        sizes = [
+            ('property_type', len(PROPERTY_TYPES)),
+            ('listing_type', len(LISTING_TYPES)),
+            ('price', len(PRICE_BUCKETS)),
+            ('bedrooms', BEDROOM_BUCKETS),
+            ('keywords', len(RECOMMENDATION_GROUPS)),
+        ]
+        if embedding_dimensions:
+            sizes.append(('embedding', embedding_dimensions))
+
+        self.blocks = {}
+        offset = 0
+        for name, size in sizes:
+            self.blocks[name] = slice(offset, offset + size)
+            offset += size
+        self.size = offset
+
+    def normalize_blocks(self, matrix):
+        """Scale every block of every row to length BLOCK_WEIGHTS[block], in place"""
+        for name, columns in self.blocks.items():
+            block = matrix[:, columns]  # a view, so the matrix is updated in place
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            np.divide(block, norms, out=block, where=norms > 0)
+            block *= BLOCK_WEIGHTS[name]
+        return matrix
+
+
+def price_bucket(price):
+    if price < BUDGET_MAX:
+        return 0
+    if price < MID_RANGE_MAX:
+        return 1
+    return 2
+
+
+def bedroom_bucket(bedrooms):
+    return min(max(int(bedrooms), 1), BEDROOM_BUCKETS) - 1
+
+
+def mask_bits(mask):
+    """Positions of the set bits of a keyword-group mask"""
+    return [bit for bit in range(mask.bit_length()) if mask >> bit & 1]
+
+
+def unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def build_property_matrix(use_embeddings=False):
+    """
+    Feature matrix of available properties.
+    Returns (space, property_ids, matrix) with unit-length float32 rows.
+    """
+    rows = list(
+        Property.objects.filter(status='available').order_by('id').values_list(
+            'id', 'property_type', 'listing_type', 'price', 'bedrooms', 'keyword_mask'
+        ).iterator(chunk_size=5000)
+    )
+    property_ids = np.array([row[0] for row in rows], dtype=np.int64)
+
+    embedding_ids, embeddings = [], None
+    if use_embeddings and len(rows):
+        from .embeddings import load_embedding_matrix
+        embedding_ids, embeddings = load_embedding_matrix(property_ids.tolist())
+
+    space = FeatureSpace(embeddings.shape[1] if embedding_ids else 0)
+    matrix = np.zeros((len(rows), space.size), dtype=np.float32)
+    blocks = space.blocks
+    type_columns = {value: blocks['property_type'].start + i for i, value in enumerate(PROPERTY_TYPES)}
+    listing_columns = {value: blocks['listing_type'].start + i for i, value in enumerate(LISTING_TYPES)}
+
+    for i, (_, property_type, listing_type, price, bedrooms, mask) in enumerate(rows):
+        if property_type in type_columns:
+            matrix[i, type_columns[property_type]] = 1.0
+        if listing_type in listing_columns:
+            matrix[i, listing_columns[listing_type]] = 1.0
+        matrix[i, blocks['price'].start + price_bucket(price)] = 1.0
+        matrix[i, blocks['bedrooms'].start + bedroom_bucket(bedrooms)] = 1.0
+        for group in mask_bits(mask):
+            matrix[i, blocks['keywords'].start + group] = 1.0
+
+    if embedding_ids:
+        positions = np.searchsorted(property_ids, np.asarray(embedding_ids, dtype=np.int64))
+        matrix[positions, blocks['embedding']] = embeddings
+
+    space.normalize_blocks(matrix)
+    return space, property_ids, unit_rows(matrix)
+
+
+class QueryFeatures:
+    """Feature vectors of search queries, memoized since queries repeat a lot"""
+
+    def __init__(self, space):
+        from .views import SmartSearchEngine
+
+        self.space = space
+        self.engine = SmartSearchEngine()
+        self._cache = {}
+
+    def __call__(self, query):
+        key = ' '.join(query.lower().split())
+        vector = self._cache.get(key)
+        if vector is None:
+            vector = self._cache[key] = self._features(key)
+        return vector
+
+    def _features(self, query):
+        blocks = self.space.blocks
+        vector = np.zeros((1, self.space.size), dtype=np.float32)
+        intent = self.engine.extract_search_intent(query)
+
+        for prop_type in intent['property_types']:
+            if prop_type in PROPERTY_TYPES:
+                vector[0, blocks['property_type'].start + PROPERTY_TYPES.index(prop_type)] = 1.0
+        if intent['price_range'] == 'low':
+            vector[0, blocks['price'].start + 0] = 1.0
+            vector[0, blocks['price'].start + 1] = 0.5
+        elif intent['price_range'] == 'high':
+            vector[0, blocks['price'].start + 2] = 1.0
+        if intent['bedrooms']:
+            vector[0, blocks['bedrooms'].start + bedroom_bucket(intent['bedrooms'])] = 1.0
+        for group in mask_bits(recommendation_matcher.mask(query)):
+            vector[0, blocks['keywords'].start + group] = 1.0
+
+        return self.space.normalize_blocks(vector)[0]
+
+
+def build_user_profiles(user_ids, property_ids, matrix, query_features):
+    """
+    Profiles of one chunk of users (ids sorted ascending).
+    Returns (profiled_user_ids, profiles, favorite_positions) where
+    favorite_positions[i] lists the matrix rows user i already favorited.
+    """
+    lo, hi = user_ids[0], user_ids[-1]
+    row_of_user = {user_id: i for i, user_id in enumerate(user_ids)}
+    profiles = np.zeros((len(user_ids), matrix.shape[1]), dtype=np.float32)
+    favorite_positions = [[] for _ in user_ids]
+
+    def property_row(property_id):
+        position = np.searchsorted(property_ids, property_id)
+        if position < len(property_ids) and property_ids[position] == property_id:
+            return position
+        return None
+
+    # Id ranges instead of IN lists keep the queries small for any chunk size
+    favorites = Favorite.objects.filter(user_id__gte=lo, user_id__lte=hi).values_list('user_id', 'property_id')
+    for user_id, property_id in favorites.iterator():
+        row = row_of_user.get(user_id)
+        position = property_row(property_id)
+        if row is None or position is None:
+            continue
+        profiles[row] += FAVORITE_WEIGHT * matrix[position]
+        favorite_positions[row].append(position)
+
+    cutoff = timezone.now() - datetime.timedelta(days=SEARCH_LOOKBACK_DAYS)
+    searches = SearchHistory.objects.filter(
+        user_id__gte=lo, user_id__lte=hi, timestamp__gte=cutoff
+    ).values_list('user_id', 'query', 'property_id')
+    for user_id, query, property_id in searches.iterator():
+        row = row_of_user.get(user_id)
+        if row is None:
+            continue
+        if query:
+            profiles[row] += QUERY_WEIGHT * query_features(query)
+        if property_id is not None:
+            position = property_row(property_id)
+            if position is not None:
+                profiles[row] += VIEWED_WEIGHT * matrix[position]
+
+    has_profile = np.linalg.norm(profiles, axis=1) > 0
+    keep = np.flatnonzero(has_profile)
+    return (
+        [user_ids[i] for i in keep],
+        unit_rows(profiles[keep]),
+        [favorite_positions[i] for i in keep],
+    )
+
+
+def top_k_scores(profiles, matrix, k, excluded=None, property_chunk=PROPERTY_CHUNK):
+    """
+    Top-k property rows for every profile without materializing the full
+    users x properties score matrix. Returns (positions, scores), best first.
+    """
+    users = profiles.shape[0]
+    k = min(k, matrix.shape[0])
+    best_positions = np.empty((users, 0), dtype=np.int64)
+    best_scores = np.empty((users, 0), dtype=np.float32)
+    user_index = np.arange(users)[:, None]
+
+    for start in range(0, matrix.shape[0], property_chunk):
+        scores = profiles @ matrix[start:start + property_chunk].T
+        if excluded:
+            for row, positions in enumerate(excluded):
+                in_chunk = [p - start for p in positions if start <= p < start + scores.shape[1]]
+                scores[row, in_chunk] = -np.inf
+
+        take = min(k, scores.shape[1])
+        # Partition on the scores themselves (no negated copy); the best are at the end
+        chunk_top = np.argpartition(scores, scores.shape[1] - take, axis=1)[:, -take:]
+        candidate_positions = np.hstack([best_positions, chunk_top + start])
+        candidate_scores = np.hstack([best_scores, scores[user_index, chunk_top]])
+
+        keep = min(k, candidate_scores.shape[1])
+        top = np.argpartition(-candidate_scores, keep - 1, axis=1)[:, :keep]
+        best_positions = candidate_positions[user_index, top]
+        best_scores = candidate_scores[user_index, top]
+
+    order = np.argsort(-best_scores, axis=1)
+    return best_positions[user_index, order], best_scores[user_index, order]
+
+
+def customer_id_chunks(chunk_size, user_ids=None):
+    queryset = get_user_model().objects.filter(user_type='customer').order_by('id')
+    if user_ids:
+        queryset = queryset.filter(id__in=user_ids)
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id).values_list('id', flat=True)[:chunk_size])
+        if not chunk:
+            return
+        last_id = chunk[-1]
+        yield chunk
+
+
+def compute_recommendations(top_k=20, min_score=0.3, use_embeddings=False,
+                            user_chunk=USER_CHUNK, property_chunk=PROPERTY_CHUNK,
+                            user_ids=None, progress=None):
+    """
+    Score every customer against every available property and upsert the
+    top_k recommendations scoring at least min_score. Returns a stats dict.
+    """
+    space, property_ids, matrix = build_property_matrix(use_embeddings)
+    stats = {'properties': len(property_ids), 'users': 0, 'profiled_users': 0, 'recommendations': 0}
+    if not len(property_ids):
+        return stats
+
+    query_features = QueryFeatures(space)
+    for chunk in customer_id_chunks(user_chunk, user_ids):
+        stats['users'] += len(chunk)
+        profiled_ids, profiles, favorites = build_user_profiles(chunk, property_ids, matrix, query_features)
+        if not profiled_ids:
+            continue
+
+        positions, scores = top_k_scores(profiles, matrix, top_k, favorites, property_chunk)
+        recommendations = [
+            Recommendation(user_id=user_id, property_id=int(property_ids[position]), score=float(score))
+            for user_id, user_positions, user_scores in zip(profiled_ids, positions, scores)
+            for position, score in zip(user_positions, user_scores)
+            if score >= min_score
+        ]
+        Recommendation.objects.bulk_create(
+            recommendations,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['user', 'property'],
+            update_fields=['score'],
+        )
+
+        stats['profiled_users'] += len(profiled_ids)
+        stats['recommendations'] += len(recommendations)
+        if progress:
+            progress(stats)
+
+    return stats
@@ -0,0 +1,272 @@
+"""
+Local out-of-process embedding service.
+
+One `manage.py run_embedding_service` process holds the sentence-transformer
+model and listens on a Unix socket. Web workers send query strings to it
+instead of loading torch themselves; the service collects requests from all
+connections for up to MAX_WAIT_MS (or until MAX_BATCH texts are queued) and
+encodes them in a single model call.
+
+Configure with:
+
+    SEARCH_EMBEDDING_SERVICE = {
+        'ADDRESS': '/run/real_estate/embeddings.sock',
+        'TIMEOUT': 2.0,        # seconds a worker waits before falling back
+        'MAX_BATCH': 64,
+        'MAX_WAIT_MS': 5,
+    }
+
+When ADDRESS is empty the service is disabled and encoding happens in-process.
+"""
+import hashlib
+import os
+import queue
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from django.conf import settings
+
+
+class EmbeddingServiceError(Exception):
+    """Raised when the embedding service cannot be reached or fails to encode"""
+
+
+def get_service_settings():
+    config = {
+        'ADDRESS': '',
+        'AUTHKEY': None,
+        'TIMEOUT': 2.0,
+        'MAX_BATCH': 64,
+        'MAX_WAIT_MS': 5,
+    }
+    config.update(getattr(settings, 'SEARCH_EMBEDDING_SERVICE', None) or {})
+    if not config['AUTHKEY']:
+        config['AUTHKEY'] = hashlib.sha256(settings.SECRET_KEY.encode('utf-8')).digest()
+    elif isinstance(config['AUTHKEY'], str):
+        config['AUTHKEY'] = config['AUTHKEY'].encode('utf-8')
+    return config
+
+
+def service_enabled():
+    return bool(get_service_settings()['ADDRESS'])
+
+
+class _PendingRequest:
+    def __init__(self, texts):
+        self.texts = texts
+        self.vectors = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class EmbeddingService:
+    """Socket server that micro-batches encode requests from many clients"""
+
+    def __init__(self, encode, address, authkey, max_batch=64, max_wait_ms=5):
+        self.encode = encode
+        self.address = address
+        self.authkey = authkey
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = queue.Queue()
+        self.stats = {'requests': 0, 'batches': 0, 'texts': 0}
+        self._stopping = threading.Event()
+        self._listener = None
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        self._listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        threading.Thread(target=self._batch_loop, name='embedding-batcher', daemon=True).start()
+        try:
+            while not self._stopping.is_set():
+                try:
+                    connection = self._listener.accept()
+                except OSError:
+                    if self._stopping.is_set():
+                        break
+                    continue
+                threading.Thread(
+                    target=self._handle_connection, args=(connection,), daemon=True
+                ).start()
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stopping.set()
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def _handle_connection(self, connection):
+        with connection:
+            while True:
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    return
+
+                command, payload = message
+                if command == 'ping':
+                    connection.send(('ok', None))
+                    continue
+                if command != 'encode':
+                    connection.send(('error', f'Unknown command: {command}'))
+                    continue
+
+                request = _PendingRequest(list(payload))
+                self.requests.put(request)
+                request.done.wait()
+                if request.error:
+                    connection.send(('error', request.error))
+                else:
+                    connection.send(('ok', request.vectors))
+
+    def _collect_batch(self):
+        """Block for the first request, then gather more until the batch is full or the wait expires"""
+        batch = [self.requests.get()]
+        size = len(batch[0].texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _batch_loop(self):
+        while not self._stopping.is_set():
+            batch = self._collect_batch()
+            texts = [text for request in batch for text in request.texts]
+            try:
+                vectors = self.encode(texts)
+            except Exception as e:
+                for request in batch:
+                    request.error = str(e)
+                    request.done.set()
+                continue
+
+            self.stats['requests'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['texts'] += len(texts)
+
+            offset = 0
+            for request in batch:
+                count = len(request.texts)
+                request.vectors = vectors[offset:offset + count]
+                offset += count
+                request.done.set()
+
+
+class EmbeddingServiceClient:
+    """Per-thread persistent connection to the embedding service"""
+
+    # Seconds a successful/failed call is trusted before pinging again
+    HEALTH_TTL = 10
+
+    def __init__(self, address, authkey, timeout=2.0):
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self._local = threading.local()
+        self._healthy_until = 0.0
+        self._retry_after = 0.0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            try:
+                connection = Client(self.address, family='AF_UNIX', authkey=self.authkey)
+            except (OSError, EOFError, AuthenticationError) as e:
+                raise EmbeddingServiceError(f'Embedding service unavailable: {str(e)}')
+            self._local.connection = connection
+        return connection
+
+    def _reset(self):
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is not None:
+            try:
+                connection.close()
+            except OSError:
+                pass
+
+    def _call(self, command, payload=None):
+        connection = self._connection()
+        try:
+            connection.send((command, payload))
+            if not connection.poll(self.timeout):
+                raise EmbeddingServiceError('Embedding service timed out')
+            status, result = connection.recv()
+        except EmbeddingServiceError:
+            # A late reply would be read by the next call, so drop the connection
+            self._reset()
+            raise
+        except (OSError, EOFError) as e:
+            self._reset()
+            raise EmbeddingServiceError(f'Embedding service connection lost: {str(e)}')
+
+        if status != 'ok':
+            raise EmbeddingServiceError(result)
+        return result
+
+    def _mark(self, healthy):
+        now = time.monotonic()
+        if healthy:
+            self._healthy_until = now + self.HEALTH_TTL
+        else:
+            self._healthy_until = 0.0
+            self._retry_after = now + self.HEALTH_TTL
+
+    def encode(self, texts):
+        try:
+            vectors = self._call('encode', list(texts))
+        except EmbeddingServiceError:
+            self._mark(False)
+            raise
+        self._mark(True)
+        return vectors
+
+    def ping(self):
+        try:
+            self._call('ping')
+        except EmbeddingServiceError:
+            self._mark(False)
+            return False
+        self._mark(True)
+        return True
+
+    def is_available(self):
+        """
+        Health check that never touches the socket: the service counts as
+        available unless a call failed within HEALTH_TTL, and the next
+        encode() finds out otherwise
+        """
+        now = time.monotonic()
+        return now < self._healthy_until or now >= self._retry_after
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Shared client for this process, or None when the service is not configured"""
+    global _client
+    if not service_enabled():
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = get_service_settings()
+                _client = EmbeddingServiceClient(config['ADDRESS'], config['AUTHKEY'], config['TIMEOUT'])
+    return _client
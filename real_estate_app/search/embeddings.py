@@ -0,0 +1,126 @@
+"""
+Persistent embedding store for semantic property search.
+
+Each property's searchable text is embedded once and stored in
+PropertyEmbedding together with a hash of the text it was computed from.
+Property saves only flag rows whose hash no longer matches; the
+`refresh_embeddings` management command re-embeds missing and stale rows in
+batches, so the search request path only ever encodes the query.
+"""
+import hashlib
+
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EMBEDDING_MODEL_NAME = getattr(settings, 'SEARCH_EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+
+# Bump when property_text() changes so every stored vector is rebuilt
+EMBEDDING_TEXT_VERSION = 1
+
+
+def get_model_version():
+    """Version tag stored with every vector (model name + text template version)"""
+    return f"{EMBEDDING_MODEL_NAME}:v{EMBEDDING_TEXT_VERSION}"
+
+
+def property_text(prop):
+    """Rich text representation of a property used for embedding"""
+    text = f"{prop.title} {prop.description} {prop.address} "
+    text += f"{prop.get_property_type_display()} {prop.get_listing_type_display()} "
+    text += f"{prop.bedrooms} bedroom {prop.bathrooms} bathroom "
+    text += f"{prop.square_footage} square feet"
+    return text
+
+
+def content_hash(prop):
+    """Hash of the embedded text, used to detect stale vectors"""
+    text = f"{get_model_version()}\n{property_text(prop)}"
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def mark_stale(prop):
+    """Flag the stored vector for refresh if the property's text changed"""
+    from .models import PropertyEmbedding
+
+    PropertyEmbedding.objects.filter(property_id=prop.pk, is_stale=False).exclude(
+        content_hash=content_hash(prop)
+    ).update(is_stale=True)
+
+
+def properties_needing_refresh(full=False):
+    """Properties without an up-to-date vector for the current model version"""
+    from django.db.models import Q
+    from properties.models import Property
+
+    queryset = Property.objects.all()
+    if full:
+        return queryset
+    return queryset.filter(
+        Q(embedding__isnull=True)
+        | Q(embedding__is_stale=True)
+        | ~Q(embedding__model_version=get_model_version())
+    )
+
+
+def refresh_embeddings(full=False, batch_size=64):
+    """
+    Embed every property whose stored vector is missing or stale.
+    Returns the number of properties (re)embedded.
+    """
+    from .models import PropertyEmbedding
+    from .semantic import encode_texts
+
+    model_version = get_model_version()
+    queryset = properties_needing_refresh(full=full).order_by('id')
+    refreshed = 0
+
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        vectors = encode_texts([property_text(prop) for prop in batch])
+        for prop, vector in zip(batch, vectors):
+            PropertyEmbedding.objects.update_or_create(
+                property=prop,
+                defaults={
+                    'model_version': model_version,
+                    'content_hash': content_hash(prop),
+                    'dimensions': vector.shape[0],
+                    'vector': vector.astype(np.float32).tobytes(),
+                    'is_stale': False,
+                },
+            )
+        refreshed += len(batch)
+
+    return refreshed
+
+
+def load_embedding_matrix(property_ids):
+    """
+    Load stored vectors for the given property ids.
+    Returns (ids, matrix) where matrix[i] is the vector of ids[i]; properties
+    without a vector for the current model version are omitted.
+    """
+    from .models import PropertyEmbedding
+
+    rows = PropertyEmbedding.objects.filter(
+        property_id__in=property_ids,
+        model_version=get_model_version(),
+    ).values_list('property_id', 'vector')
+
+    ids = []
+    vectors = []
+    for property_id, vector in rows:
+        ids.append(property_id)
+        vectors.append(np.frombuffer(vector, dtype=np.float32))
+
+    if not vectors:
+        return [], np.empty((0, 0), dtype=np.float32)
+    return ids, np.vstack(vectors)
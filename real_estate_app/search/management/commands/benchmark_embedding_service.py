@@ -0,0 +1,88 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+SAMPLE_QUERIES = [
+    '2 bedroom apartment near downtown',
+    'luxury villa with garden and pool',
+    'cozy house for rent in a quiet neighborhood',
+    'modern condo with city view',
+    'affordable family home near school',
+    'spacious apartment with balcony',
+    'house with parking and garden under 50 lakh',
+    'furnished studio flat close to transport',
+]
+
+
+class Command(BaseCommand):
+    help = 'Measure query encoding throughput: unbatched vs batched, in-process vs embedding service'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=512)
+        parser.add_argument('--batch-size', type=int, default=32)
+        parser.add_argument('--clients', type=int, default=8,
+                            help='Concurrent client threads sending single queries to the service')
+        parser.add_argument('--max-wait-ms', type=float, default=5)
+
+    def handle(self, *args, **options):
+        from search.embedding_service import EmbeddingService, EmbeddingServiceClient
+        from search.semantic import SEMANTIC_SEARCH_AVAILABLE, model_provider
+
+        if not SEMANTIC_SEARCH_AVAILABLE:
+            raise CommandError('Semantic search dependencies are not installed.')
+
+        model = model_provider.get()
+        queries = [f'{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} {i}' for i in range(options['queries'])]
+
+        def encode(texts):
+            return model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+
+        encode(queries[:8])  # warm up kernels
+
+        started = time.perf_counter()
+        for query in queries:
+            encode([query])
+        self._report('in-process, unbatched', len(queries), time.perf_counter() - started)
+
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+        for start in range(0, len(queries), batch_size):
+            encode(queries[start:start + batch_size])
+        self._report(f'in-process, batches of {batch_size}', len(queries), time.perf_counter() - started)
+
+        for max_batch in (1, batch_size):
+            address = os.path.join(tempfile.mkdtemp(), 'embeddings.sock')
+            authkey = os.urandom(16)
+            service = EmbeddingService(encode, address, authkey, max_batch=max_batch,
+                                       max_wait_ms=options['max_wait_ms'])
+            server = threading.Thread(target=service.serve_forever, daemon=True)
+            server.start()
+            while not os.path.exists(address):
+                time.sleep(0.01)
+
+            client = EmbeddingServiceClient(address, authkey, timeout=30)
+            chunks = [queries[i::options['clients']] for i in range(options['clients'])]
+
+            def run(chunk):
+                for query in chunk:
+                    client.encode([query])
+
+            workers = [threading.Thread(target=run, args=(chunk,)) for chunk in chunks]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+            service.stop()
+
+            stats = service.stats
+            label = f"service, {options['clients']} clients, max batch {max_batch}"
+            self._report(label, len(queries), elapsed,
+                         f"avg batch {stats['texts'] / max(stats['batches'], 1):.1f}")
+
+    def _report(self, label, count, elapsed, extra=''):
+        self.stdout.write(f'{label:<42} {count / elapsed:>8.1f} queries/s  {extra}')
@@ -0,0 +1,112 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Compare recall and latency of the IVF index against the exact scan on synthetic listings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                            help='Catalogue sizes to benchmark (default: 10k 100k 1M)')
+        parser.add_argument('--dimensions', type=int, default=384,
+                            help='Vector size (all-MiniLM-L6-v2 produces 384)')
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--k', type=int, default=50)
+        parser.add_argument('--nprobe', type=int, nargs='+', default=[8, 16, 32])
+        parser.add_argument('--filtered', action='store_true',
+                            help='Push down a typical structured filter (available, type, bedrooms)')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        from search.ann import ANN_AVAILABLE, ExactIndex, IVFIndex, encode_attributes
+
+        if not ANN_AVAILABLE:
+            raise CommandError('NumPy is required to run the benchmark.')
+        import numpy as np
+
+        rng = np.random.default_rng(42)
+        filters = None
+        if options['filtered']:
+            filters = {'status': 'available', 'property_types': ['apartment', 'condo'], 'min_bedrooms': 2}
+
+        results = []
+        for size in options['sizes']:
+            vectors, queries = self._synthetic_vectors(rng, size, options['dimensions'], options['queries'])
+            attributes = encode_attributes(self._synthetic_attributes(rng, size))
+            ids = np.arange(1, size + 1)
+
+            exact = ExactIndex().build(ids, vectors, attributes)
+            started = time.perf_counter()
+            ivf = IVFIndex().build(ids, vectors, attributes)
+            build_seconds = time.perf_counter() - started
+
+            exact_ids, exact_ms = self._run(exact, queries, options['k'], filters)
+            results.append({
+                'size': size, 'index': 'exact', 'nprobe': None, 'recall': 1.0,
+                'mean_ms': float(np.mean(exact_ms)), 'p95_ms': float(np.percentile(exact_ms, 95)),
+                'build_seconds': 0.0,
+            })
+
+            for nprobe in options['nprobe']:
+                ivf.nprobe = nprobe
+                ivf_ids, ivf_ms = self._run(ivf, queries, options['k'], filters)
+                recall = np.mean([
+                    len(set(found) & set(expected)) / max(len(expected), 1)
+                    for found, expected in zip(ivf_ids, exact_ids)
+                ])
+                results.append({
+                    'size': size, 'index': 'ivf', 'nprobe': nprobe, 'recall': float(recall),
+                    'mean_ms': float(np.mean(ivf_ms)), 'p95_ms': float(np.percentile(ivf_ms, 95)),
+                    'build_seconds': build_seconds, 'nlist': len(ivf.centroids),
+                })
+
+            del vectors, exact, ivf
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{'size':>9} {'index':>6} {'nprobe':>6} {'recall@k':>9} {'mean ms':>9} {'p95 ms':>9} {'build s':>8}")
+        for row in results:
+            self.stdout.write(
+                f"{row['size']:>9} {row['index']:>6} {str(row['nprobe'] or '-'):>6} "
+                f"{row['recall']:>9.3f} {row['mean_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['build_seconds']:>8.1f}"
+            )
+
+    def _synthetic_vectors(self, rng, size, dimensions, query_count):
+        """Clustered unit vectors, roughly shaped like sentence embeddings of listings"""
+        import numpy as np
+
+        topics = rng.standard_normal((max(size // 500, 8), dimensions)).astype(np.float32)
+        vectors = np.empty((size, dimensions), dtype=np.float32)
+        chunk = 100000
+        for start in range(0, size, chunk):
+            end = min(start + chunk, size)
+            assigned = topics[rng.integers(len(topics), size=end - start)]
+            vectors[start:end] = assigned + 1.2 * rng.standard_normal((end - start, dimensions)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        queries = topics[rng.integers(len(topics), size=query_count)]
+        queries = queries + 0.8 * rng.standard_normal(queries.shape).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        return vectors, queries
+
+    def _synthetic_attributes(self, rng, size):
+        statuses = rng.choice(['available', 'pending', 'sold'], size=size, p=[0.7, 0.2, 0.1])
+        types = rng.choice(['house', 'apartment', 'condo', 'villa'], size=size)
+        bedrooms = rng.integers(1, 6, size=size)
+        bathrooms = rng.integers(1, 4, size=size)
+        prices = rng.integers(1000000, 30000000, size=size)
+        return zip(statuses, types, bedrooms, bathrooms, prices)
+
+    def _run(self, index, queries, k, filters):
+        found = []
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            ids, _ = index.search(query, k=k, filters=filters)
+            timings.append((time.perf_counter() - started) * 1000)
+            found.append(ids.tolist())
+        return found, timings
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Build the approximate nearest-neighbour index used by semantic search'
+
+    def handle(self, *args, **options):
+        from search.ann import ANN_AVAILABLE, build_property_index, get_index_settings
+
+        if not ANN_AVAILABLE:
+            raise CommandError('NumPy is required to build the search index.')
+
+        config = get_index_settings()
+        self.stdout.write(f"Building {config['BACKEND']} index at {config['PATH']}...")
+
+        index = build_property_index()
+        if not len(index):
+            self.stdout.write(self.style.WARNING(
+                'No embeddings found - run `manage.py refresh_embeddings` first'
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {len(index)} properties'))
@@ -0,0 +1,86 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Compute recommendations for all customers in one batch (run periodically, e.g. nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=20,
+            help='Recommendations stored per user (default: 20)',
+        )
+        parser.add_argument(
+            '--min-score',
+            type=float,
+            default=0.3,
+            help='Minimum cosine score for a recommendation to be stored (default: 0.3)',
+        )
+        parser.add_argument(
+            '--embeddings',
+            action='store_true',
+            help='Include stored semantic embeddings in the property features',
+        )
+        parser.add_argument(
+            '--user-chunk',
+            type=int,
+            default=1000,
+            help='Users scored per matrix multiply (default: 1000)',
+        )
+        parser.add_argument(
+            '--property-chunk',
+            type=int,
+            default=5000,
+            help='Properties scored per matrix multiply (default: 5000)',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Only compute recommendations for this user id (repeatable)',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the run statistics as JSON',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            from search.batch_recommendations import compute_recommendations
+        except ImportError as e:
+            raise CommandError(f'Batch recommendations need numpy: {str(e)}')
+
+        started = time.perf_counter()
+
+        def progress(stats):
+            if not options['json']:
+                self.stdout.write(
+                    f"  {stats['users']} users processed, "
+                    f"{stats['recommendations']} recommendations written"
+                )
+
+        stats = compute_recommendations(
+            top_k=options['top_k'],
+            min_score=options['min_score'],
+            use_embeddings=options['embeddings'],
+            user_chunk=options['user_chunk'],
+            property_chunk=options['property_chunk'],
+            user_ids=options['user_ids'],
+            progress=progress,
+        )
+        stats['seconds'] = round(time.perf_counter() - started, 2)
+
+        if options['json']:
+            self.stdout.write(json.dumps(stats))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Scored {stats['profiled_users']} of {stats['users']} customers against "
+            f"{stats['properties']} properties: {stats['recommendations']} recommendations "
+            f"in {stats['seconds']}s"
+        ))
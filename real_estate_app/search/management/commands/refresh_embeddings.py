@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Embed properties whose stored search vectors are missing or stale'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-embed every property instead of only missing/stale ones',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=64,
+            help='Number of properties encoded per model call (default: 64)',
+        )
+        parser.add_argument(
+            '--watch',
+            type=int,
+            default=0,
+            metavar='SECONDS',
+            help='Keep running and check for stale embeddings every SECONDS',
+        )
+
+    def handle(self, *args, **options):
+        from search.semantic import SEMANTIC_SEARCH_AVAILABLE
+        from search.embeddings import refresh_embeddings, get_model_version
+
+        if not SEMANTIC_SEARCH_AVAILABLE:
+            raise CommandError('Semantic search dependencies are not installed.')
+
+        self.stdout.write(f'Refreshing property embeddings ({get_model_version()})...')
+
+        full = options['all']
+        while True:
+            refreshed = refresh_embeddings(full=full, batch_size=options['batch_size'])
+            if refreshed:
+                self.stdout.write(self.style.SUCCESS(f'Embedded {refreshed} properties'))
+
+            if not options['watch']:
+                break
+            full = False
+            time.sleep(options['watch'])
+
+        if not refreshed:
+            self.stdout.write('All property embeddings are up to date')
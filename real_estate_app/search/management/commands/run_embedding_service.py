@@ -0,0 +1,50 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Run the shared embedding service that batches query encoding for all web workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--address', help='Unix socket path (default: SEARCH_EMBEDDING_SERVICE ADDRESS)')
+        parser.add_argument('--max-batch', type=int, help='Maximum texts encoded per model call')
+        parser.add_argument('--max-wait-ms', type=float, help='How long to wait for a batch to fill')
+
+    def handle(self, *args, **options):
+        from search.embedding_service import EmbeddingService, get_service_settings
+        from search.semantic import SEMANTIC_SEARCH_AVAILABLE, model_provider
+
+        if not SEMANTIC_SEARCH_AVAILABLE:
+            raise CommandError('Semantic search dependencies are not installed.')
+
+        config = get_service_settings()
+        address = options['address'] or config['ADDRESS']
+        if not address:
+            raise CommandError('Set SEARCH_EMBEDDING_SERVICE["ADDRESS"] or pass --address.')
+
+        self.stdout.write(f'Loading model {model_provider.model_name}...')
+        model = model_provider.get()
+
+        def encode(texts):
+            return model.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype('float32')
+
+        service = EmbeddingService(
+            encode,
+            address,
+            config['AUTHKEY'],
+            max_batch=options['max_batch'] or config['MAX_BATCH'],
+            max_wait_ms=options['max_wait_ms'] if options['max_wait_ms'] is not None else config['MAX_WAIT_MS'],
+        )
+        signal.signal(signal.SIGTERM, lambda *args: service.stop())
+
+        self.stdout.write(self.style.SUCCESS(f'Embedding service listening on {address}'))
+        try:
+            service.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stats = service.stats
+            self.stdout.write(
+                f"Served {stats['requests']} requests ({stats['texts']} texts) in {stats['batches']} batches"
+            )
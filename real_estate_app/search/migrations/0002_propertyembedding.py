@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0017_add_dual_confirmation_fields'),
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_version', models.CharField(max_length=100)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('dimensions', models.PositiveSmallIntegerField()),
+                ('vector', models.BinaryField()),
+                ('is_stale', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('property', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='embedding', to='properties.property')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model_version', 'is_stale'], name='search_prop_model_v_8f6f31_idx')],
+            },
+        ),
+    ]
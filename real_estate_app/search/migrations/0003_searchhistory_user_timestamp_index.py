@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0002_propertyembedding'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='searchhistory',
+            index=models.Index(fields=['user', 'timestamp'], name='search_sear_user_id_231617_idx'),
+        ),
+    ]
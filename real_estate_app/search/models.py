@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.db.models.signals import post_save, pre_save, post_delete
+from django.dispatch import receiver
 from properties.models import Property
 
 class SearchHistory(models.Model):
@@ -11,6 +13,9 @@ class SearchHistory(models.Model):
     class Meta:
         verbose_name_plural = 'Search histories'
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['user', 'timestamp']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.query}"
@@ -26,4 +31,89 @@ class Recommendation(models.Model):
         ordering = ['-score', '-created_at']
     
     def __str__(self):
-        return f"{self.user.username} - {self.property.title} ({self.score})"
\ No newline at end of file
+        return f"{self.user.username} - {self.property.title} ({self.score})"
+
+
+class PropertyEmbedding(models.Model):
+    """Stored sentence embedding of a property's searchable text"""
+    property = models.OneToOneField(Property, on_delete=models.CASCADE, related_name='embedding')
+    model_version = models.CharField(max_length=100)
+    content_hash = models.CharField(max_length=64)
+    dimensions = models.PositiveSmallIntegerField()
+    vector = models.BinaryField()  # float32, L2-normalized
+    is_stale = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['model_version', 'is_stale']),
+        ]
+    
+    def __str__(self):
+        return f"Embedding for {self.property_id} ({self.model_version})"
+
+
+@receiver(post_save, sender=Property)
+def mark_property_embedding_stale(sender, instance, **kwargs):
+    from .embeddings import mark_stale
+    mark_stale(instance)
+
+
+# Fields that can change which searches a property matches or how it ranks
+SEARCHABLE_FIELDS = (
+    'title', 'description', 'address', 'price', 'bedrooms', 'bathrooms',
+    'square_footage', 'status', 'listing_type', 'property_type',
+)
+
+
+@receiver(pre_save, sender=Property)
+def remember_searchable_state(sender, instance, **kwargs):
+    instance._search_previous_state = None
+    if instance.pk:
+        instance._search_previous_state = Property.objects.filter(
+            pk=instance.pk
+        ).values(*SEARCHABLE_FIELDS).first()
+
+
+@receiver(post_save, sender=Property)
+def invalidate_cached_search_results(sender, instance, **kwargs):
+    from .result_cache import invalidate_on_commit
+
+    previous = getattr(instance, '_search_previous_state', None)
+    if previous is None:
+        if instance.status == 'available':
+            invalidate_on_commit(instance.property_type)
+        return
+
+    # Searches only return available properties
+    if previous['status'] != 'available' and instance.status != 'available':
+        return
+    if any(previous[field] != getattr(instance, field) for field in SEARCHABLE_FIELDS):
+        invalidate_on_commit(previous['property_type'], instance.property_type)
+
+
+@receiver(post_delete, sender=Property)
+def invalidate_cached_search_results_on_delete(sender, instance, **kwargs):
+    from .result_cache import invalidate_on_commit
+
+    if instance.status == 'available':
+        invalidate_on_commit(instance.property_type)
+
+
+@receiver(post_save, sender=SearchHistory)
+def add_query_to_suggestions(sender, instance, created, **kwargs):
+    if created:
+        from .autocomplete import record_query
+        record_query(instance.query)
+
+
+@receiver(post_save, sender=Property)
+def update_property_suggestion(sender, instance, **kwargs):
+    from .autocomplete import update_property
+    update_property(instance)
+
+
+@receiver(post_delete, sender=Property)
+def remove_property_suggestion(sender, instance, **kwargs):
+    from .autocomplete import remove_property
+    remove_property(instance.pk)
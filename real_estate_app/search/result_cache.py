@@ -0,0 +1,148 @@
+"""
+Cache of ranked search results keyed on the normalized query and its intent.
+
+Entries store the ranked property ids produced by search_properties for
+SEARCH_RESULT_CACHE_TTL seconds. Every entry also embeds a generation number
+for each property type its intent can match; a Property change that could
+affect results bumps only the generations of its (old and new) type, so a
+villa edit does not evict cached apartment searches. Generations are bumped
+once the change commits and live in the default cache, which has to be
+shared by all worker processes (CACHE_REDIS_URL in settings) for an edit to
+expire the results cached by every worker.
+
+Hit and miss counters are kept in the cache as well (see cache_stats()).
+"""
+import hashlib
+import json
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = 'search:results'
+GENERATION_PREFIX = 'search:generation'
+HITS_KEY = 'search:results:hits'
+MISSES_KEY = 'search:results:misses'
+
+PROPERTY_TYPES = ('house', 'apartment', 'condo', 'villa')
+
+# Spelling variants that do not change what a query means
+QUERY_SYNONYMS = {
+    'bed': 'bedroom',
+    'beds': 'bedroom',
+    'bedrooms': 'bedroom',
+    'bhk': 'bedroom',
+    'bath': 'bathroom',
+    'baths': 'bathroom',
+    'bathrooms': 'bathroom',
+    'apartments': 'apartment',
+    'houses': 'house',
+    'villas': 'villa',
+    'condos': 'condo',
+    'flats': 'flat',
+}
+
+
+def get_ttl():
+    return getattr(settings, 'SEARCH_RESULT_CACHE_TTL', 300)
+
+
+def normalize_query(query):
+    """Lower-case, strip punctuation and unify spelling variants"""
+    words = re.findall(r'[a-z0-9]+', query.lower())
+    return ' '.join(QUERY_SYNONYMS.get(word, word) for word in words)
+
+
+def _generation_keys(intent):
+    types = intent.get('property_types') or PROPERTY_TYPES
+    return [f'{GENERATION_PREFIX}:{prop_type}' for prop_type in sorted(types)]
+
+
+def _get_generations(keys):
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # Seed from the clock so an evicted counter never repeats an old value
+            cache.add(key, time.time_ns(), None)
+            generations[key] = cache.get(key)
+    return generations
+
+
+def make_key(query, intent, mode):
+    """Cache key for a query; `mode` separates semantic and structured rankings"""
+    generation_keys = _generation_keys(intent)
+    generations = _get_generations(generation_keys)
+    payload = json.dumps({
+        'query': normalize_query(query),
+        'intent': {
+            key: value for key, value in intent.items()
+            if key != 'semantic_keywords'
+        },
+        'mode': mode,
+        'generations': [generations[key] for key in generation_keys],
+    }, sort_keys=True)
+    return f"{KEY_PREFIX}:{hashlib.sha1(payload.encode('utf-8')).hexdigest()}"
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def get_ranked_ids(key):
+    """Return the cached ranked id list, or None on a miss"""
+    ids = cache.get(key)
+    _count(HITS_KEY if ids is not None else MISSES_KEY)
+    return ids
+
+
+def set_ranked_ids(key, ids):
+    cache.set(key, list(ids), get_ttl())
+
+
+def load_properties(ids):
+    """Fetch cached properties in their ranked order"""
+    from properties.models import Property
+
+    properties = Property.objects.in_bulk(ids)
+    return [properties[property_id] for property_id in ids if property_id in properties]
+
+
+def invalidate_property_types(*property_types):
+    """Expire every cached search that could match the given property types"""
+    for prop_type in set(filter(None, property_types)):
+        key = f'{GENERATION_PREFIX}:{prop_type}'
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def invalidate_on_commit(*property_types):
+    """
+    invalidate_property_types() once the current transaction commits, so no
+    request can cache the old results again under the new generation
+    """
+    transaction.on_commit(lambda: invalidate_property_types(*property_types))
+
+
+def cache_stats():
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counts.get(HITS_KEY, 0)
+    misses = counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+        'ttl': get_ttl(),
+        'backend': settings.CACHES['default']['BACKEND'],
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,129 @@
+"""
+Sentence-transformer model used by semantic search.
+
+The model is loaded lazily, once per process, by SemanticModelProvider:
+importing this module does not import torch. Requests never wait for the
+model - search_properties checks is_ready() and uses the structured search
+path while a background thread is loading it. Set SEARCH_MODEL_WARMUP = True
+to start loading as soon as Django starts instead of on the first query.
+
+When SEARCH_EMBEDDING_SERVICE is configured, queries are encoded by the
+shared embedding service process (see embedding_service.py) and the local
+model is only loaded as a fallback.
+
+The model is optional: when sentence-transformers or numpy are missing,
+SEMANTIC_SEARCH_AVAILABLE is False and callers fall back to structured search.
+"""
+import importlib.util
+import threading
+
+from .embeddings import EMBEDDING_MODEL_NAME
+from .embedding_service import EmbeddingServiceError, get_client
+
+SEMANTIC_SEARCH_AVAILABLE = all(
+    importlib.util.find_spec(module) is not None
+    for module in ('sentence_transformers', 'numpy')
+)
+if not SEMANTIC_SEARCH_AVAILABLE:
+    print("Warning: Semantic search dependencies not available. Install sentence-transformers for enhanced search.")
+
+
+class SemanticModelProvider:
+    """Loads one SentenceTransformer per process and shares it between threads"""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._loading_thread = None
+        self.load_error = None
+
+    def is_ready(self):
+        """True once the model is loaded and can encode without blocking"""
+        return self._model is not None
+
+    def is_loading(self):
+        return self._loading_thread is not None and self._loading_thread.is_alive()
+
+    def get(self):
+        """Return the model, loading it in the calling thread if needed"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+
+    def _load(self):
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(self.model_name)
+
+    def _warm_up(self):
+        try:
+            self.get()
+        except Exception as e:
+            self.load_error = str(e)
+            print(f"Semantic model failed to load: {str(e)}")
+
+    def warm_up(self, background=True):
+        """Start loading the model; with background=False wait until it is loaded"""
+        if not SEMANTIC_SEARCH_AVAILABLE or self.is_ready() or self.load_error:
+            return
+        if not background:
+            self._warm_up()
+            return
+        if self.is_loading():
+            return
+        # _lock is held for the whole load; only guard starting the thread here
+        with self._start_lock:
+            if self._model is None and not self.is_loading():
+                self._loading_thread = threading.Thread(
+                    target=self._warm_up, name='semantic-model-warmup', daemon=True
+                )
+                self._loading_thread.start()
+
+
+model_provider = SemanticModelProvider(EMBEDDING_MODEL_NAME)
+
+
+def semantic_search_ready():
+    """
+    True when semantic ranking can run without blocking the request.
+    Triggers a background load the first time the model is needed.
+    """
+    client = get_client()
+    if client is not None and client.is_available():
+        return True
+    if not SEMANTIC_SEARCH_AVAILABLE:
+        return False
+    if model_provider.is_ready():
+        return True
+    model_provider.warm_up(background=True)
+    return False
+
+
+def encode_texts(texts, block=True):
+    """
+    Encode texts into L2-normalized float32 vectors (one row per text).
+
+    Uses the embedding service when one is configured and falls back to the
+    in-process model otherwise. With block=False the in-process fallback is
+    only used if the model is already loaded; EmbeddingServiceError is raised
+    instead of loading it in the caller's thread.
+    """
+    import numpy as np
+
+    client = get_client()
+    if client is not None:
+        try:
+            return np.asarray(client.encode(texts), dtype=np.float32)
+        except EmbeddingServiceError as e:
+            print(f"Embedding service error, encoding in-process: {str(e)}")
+            if not block and not model_provider.is_ready():
+                model_provider.warm_up(background=True)
+                raise
+
+    embeddings = model_provider.get().encode(
+        list(texts), normalize_embeddings=True, convert_to_numpy=True
+    )
+    return np.asarray(embeddings, dtype=np.float32)
@@ -0,0 +1,92 @@
+"""
+Background recommendation updates.
+
+Searches and favorites call search.views.update_recommendations, which only
+queues an event; the handler below applies all of a user's queued events in
+one run with a single upsert.
+"""
+import datetime
+
+from django.utils import timezone
+
+from core.tasks import task
+from properties.keywords import jaccard, recommendation_matcher
+from properties.models import Property
+from .models import Recommendation
+
+UPDATE_RECOMMENDATIONS = 'search.update_recommendations'
+
+
+def extract_keywords_from_query(query_text):
+    """Bitmask of the recommendation keyword groups mentioned in a search query"""
+    return recommendation_matcher.mask(query_text)
+
+
+def calculate_property_relevance(property_mask, query_mask):
+    """Calculate how relevant a property is to the search query"""
+    if not query_mask or not property_mask:
+        return 0.5  # Base relevance for non-semantic matches
+    
+    # Jaccard similarity of the keyword groups
+    return jaccard(query_mask, property_mask, empty=0.5)
+
+
+def score_results(query, property_ids, masks):
+    """
+    Scores of one search event: rank position combined with keyword relevance.
+    `masks` maps property id to its stored keyword_mask.
+    """
+    query_mask = extract_keywords_from_query(query)
+    scores = []
+    for i, property_id in enumerate(property_ids):
+        if property_id not in masks:
+            continue
+        # Calculate base score based on search rank
+        rank_score = 1.0 - (i * 0.1)  # Decreasing score for lower ranked results
+        
+        # Calculate semantic relevance
+        semantic_score = calculate_property_relevance(masks[property_id], query_mask)
+        
+        # Combine scores
+        final_score = min((rank_score * 0.6) + (semantic_score * 0.4), 1.0)
+        
+        # Only add if score is meaningful
+        if final_score > 0.3:
+            scores.append((property_id, final_score))
+    return scores
+
+
+@task(UPDATE_RECOMMENDATIONS)
+def update_recommendations(key, events):
+    """Apply every queued search/favorite event of one user (key = user id)"""
+    user_id = int(key)
+    
+    # Clear old recommendations older than 30 days
+    old_date = timezone.now() - datetime.timedelta(days=30)
+    Recommendation.objects.filter(user_id=user_id, created_at__lt=old_date).delete()
+    
+    property_ids = {property_id for event in events for property_id in event['property_ids']}
+    masks = dict(Property.objects.filter(id__in=property_ids).values_list('id', 'keyword_mask'))
+    scores = dict(
+        Recommendation.objects.filter(user_id=user_id, property_id__in=masks)
+        .values_list('property_id', 'score')
+    )
+    
+    # Replay events in order: a new recommendation takes the event's score,
+    # an existing one moves 30% towards it
+    for event in events:
+        for property_id, final_score in score_results(event['query'], event['property_ids'], masks):
+            if property_id in scores:
+                scores[property_id] = (scores[property_id] * 0.7) + (final_score * 0.3)
+            else:
+                scores[property_id] = final_score
+    
+    Recommendation.objects.bulk_create(
+        [
+            Recommendation(user_id=user_id, property_id=property_id, score=score)
+            for property_id, score in scores.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'property'],
+        update_fields=['score'],
+    )
@@ -7,4 +7,5 @@ urlpatterns = [
     path('', views.search_properties, name='search'),
     path('suggestions/', views.search_suggestions, name='suggestions'),
     path('recommendations/', views.recommendations_view, name='recommendations'),
+    path('cache-stats/', views.search_cache_stats, name='cache_stats'),
 ]
\ No newline at end of file
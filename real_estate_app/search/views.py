@@ -1,6 +1,6 @@
 from django.shortcuts import render, redirect
-from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.db.models import Q, prefetch_related_objects
 from django.http import JsonResponse
 from django.views.decorators.http import require_GET
 import json
@@ -8,23 +8,22 @@ import re
 import datetime
 from collections import Counter
 
-try:
-    from sentence_transformers import SentenceTransformer
-    import numpy as np
-    from sklearn.metrics.pairwise import cosine_similarity
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    SEMANTIC_SEARCH_AVAILABLE = True
-except ImportError:
-    model = None
-    SEMANTIC_SEARCH_AVAILABLE = False
-    print("Warning: Semantic search dependencies not available. Install sentence-transformers and scikit-learn for enhanced search.")
-
 from properties.models import Property, Favorite
+from properties import fulltext, relationships
+from core.tasks import enqueue
 from .models import SearchHistory, Recommendation
+from .semantic import SEMANTIC_SEARCH_AVAILABLE, encode_texts, model_provider, semantic_search_ready
+from .embeddings import load_embedding_matrix, get_model_version
+from .ann import get_property_index, get_index_settings
+from . import autocomplete, result_cache
+from .tasks import UPDATE_RECOMMENDATIONS
 
 class SmartSearchEngine:
     """Advanced search engine with semantic understanding"""
     
+    LOW_PRICE_MAX = 5000000  # Under 50 lakh
+    HIGH_PRICE_MIN = 10000000  # Above 1 crore
+    
     def __init__(self):
         self.property_type_synonyms = {
             'house': ['home', 'villa', 'residence', 'dwelling', 'mansion'],
@@ -129,62 +128,135 @@ class SmartSearchEngine:
         # Price range filtering
         if intent['price_range']:
             if intent['price_range'] == 'low':
-                query &= Q(price__lte=5000000)  # Under 50 lakh
+                query &= Q(price__lte=self.LOW_PRICE_MAX)
             elif intent['price_range'] == 'high':
-                query &= Q(price__gte=10000000)  # Above 1 crore
-        
-        # Text-based filtering (title, description, address)
-        text_query = Q()
-        for keyword in intent['semantic_keywords']:
-            text_query |= (
-                Q(title__icontains=keyword) |
-                Q(description__icontains=keyword) |
-                Q(address__icontains=keyword)
-            )
+                query &= Q(price__gte=self.HIGH_PRICE_MIN)
+        
+        # Text-based filtering (title, description, address) through the
+        # full-text index, or substring scans where the database has none
+        if fulltext.is_supported():
+            text_query = fulltext.match_condition(intent['semantic_keywords'])
+        else:
+            text_query = Q()
+            for keyword in intent['semantic_keywords']:
+                text_query |= (
+                    Q(title__icontains=keyword) |
+                    Q(description__icontains=keyword) |
+                    Q(address__icontains=keyword)
+                )
         
         if text_query:
             query &= text_query
         
         return query
 
-    def perform_semantic_search(self, query, properties):
-        """Perform semantic search using sentence transformers"""
-        if not SEMANTIC_SEARCH_AVAILABLE or not properties.exists():
+    def order_by_text_rank(self, properties, intent):
+        """Order structured results by full-text relevance, newest first on ties"""
+        rank = fulltext.rank_expression(intent['semantic_keywords']) if fulltext.is_supported() else None
+        if rank is None:
+            return properties.order_by('-created_at')
+        return properties.annotate(search_rank=rank).order_by('-search_rank', '-created_at')
+
+    def build_index_filters(self, intent):
+        """Structured part of build_smart_query expressed as ANN index filters"""
+        filters = {'status': 'available'}
+        
+        if intent['property_types']:
+            filters['property_types'] = intent['property_types']
+        if intent['bedrooms']:
+            filters['min_bedrooms'] = intent['bedrooms']
+        if intent['bathrooms']:
+            filters['min_bathrooms'] = intent['bathrooms']
+        
+        if intent['price_range'] == 'low':
+            filters['max_price'] = self.LOW_PRICE_MAX
+        elif intent['price_range'] == 'high':
+            filters['min_price'] = self.HIGH_PRICE_MIN
+        
+        return filters
+
+    def score_properties(self, query_embedding, property_objects):
+        """Score properties with their stored vectors; unembedded ones are left out"""
+        embedded_ids, property_matrix = load_embedding_matrix(
+            [prop.id for prop in property_objects]
+        )
+        if not embedded_ids:
+            return {}
+        
+        # Vectors are L2-normalized, so the dot product is the cosine similarity
+        similarities = property_matrix @ query_embedding
+        return dict(zip(embedded_ids, similarities.tolist()))
+
+    def retrieve_candidates(self, query_embedding, properties, intent):
+        """
+        Fetch candidates from the ANN index with the structured filters pushed
+        down, then apply the full smart query to the short list in SQL.
+        Returns (property_objects, scores_by_id), or None when no usable index exists.
+        """
+        index = get_property_index()
+        if index is None or index.model_version != get_model_version():
+            return None
+        
+        candidate_ids, candidate_scores = index.search(
+            query_embedding,
+            k=get_index_settings()['CANDIDATES'],
+            filters=self.build_index_filters(intent),
+        )
+        scores_by_id = dict(zip(candidate_ids.tolist(), candidate_scores.tolist()))
+        
+        # Listings created or edited since the index was built are scored exactly
+        built_at = datetime.datetime.fromtimestamp(index.built_at, tz=datetime.timezone.utc)
+        property_objects = list(
+            properties.filter(Q(id__in=list(scores_by_id)) | Q(updated_at__gte=built_at))
+        )
+        recent = [prop for prop in property_objects if prop.updated_at >= built_at]
+        if recent:
+            scores_by_id.update(self.score_properties(query_embedding, recent))
+        
+        return property_objects, scores_by_id
+
+    def perform_semantic_search(self, query, properties, intent=None):
+        """
+        Rank properties against the query using their stored embeddings.
+        Returns None when ranking cannot run (model still loading, embedding
+        service down) so the caller can use the structured order instead.
+        """
+        if not semantic_search_ready():
+            return None
+        if not properties.exists():
             return properties
         
         try:
-            # Prepare property texts for embedding
-            property_texts = []
-            property_objects = list(properties)
-            
-            for prop in property_objects:
-                # Create rich text representation
-                text = f"{prop.title} {prop.description} {prop.address} "
-                text += f"{prop.get_property_type_display()} {prop.get_listing_type_display()} "
-                text += f"{prop.bedrooms} bedroom {prop.bathrooms} bathroom "
-                text += f"{prop.square_footage} square feet"
-                property_texts.append(text)
+            # Only the query is encoded per request; property vectors come from
+            # the embedding store maintained by `manage.py refresh_embeddings`
+            query_embedding = encode_texts([query], block=False)[0]
             
-            # Generate embeddings
-            query_embedding = model.encode([query])
-            property_embeddings = model.encode(property_texts)
+            candidates = None
+            if intent is not None:
+                candidates = self.retrieve_candidates(query_embedding, properties, intent)
             
-            # Calculate similarities
-            similarities = cosine_similarity(query_embedding, property_embeddings)[0]
+            if candidates is not None:
+                property_objects, scores_by_id = candidates
+            else:
+                property_objects = list(properties)
+                scores_by_id = self.score_properties(query_embedding, property_objects)
             
             # Sort by similarity and filter by threshold
             similarity_threshold = 0.15  # Lowered threshold for more results
-            property_scores = list(zip(property_objects, similarities))
-            property_scores = [(prop, score) for prop, score in property_scores if score > similarity_threshold]
+            property_scores = [
+                (prop, scores_by_id[prop.id]) for prop in property_objects
+                if prop.id in scores_by_id and scores_by_id[prop.id] > similarity_threshold
+            ]
             property_scores.sort(key=lambda x: x[1], reverse=True)
             
-            # Return sorted properties
+            # Properties not embedded yet keep their structured order after the ranked ones
             sorted_properties = [prop for prop, score in property_scores]
+            sorted_properties.extend(prop for prop in property_objects if prop.id not in scores_by_id)
             return sorted_properties
             
         except Exception as e:
             print(f"Semantic search error: {str(e)}")
-            return properties
+            return None
 
 search_engine = SmartSearchEngine()
 
@@ -207,36 +279,63 @@ def search_properties(request):
         intent = search_engine.extract_search_intent(query)
         search_metadata['intent'] = intent
         
-        # Build smart query
-        smart_query = search_engine.build_smart_query(intent)
-        filtered_properties = Property.objects.filter(smart_query)
+        # Apply semantic search if available; while the model is still
+        # loading in the background the structured results are used instead
+        use_semantic = len(query.split()) > 1 and semantic_search_ready()
         
-        # Apply semantic search if available
-        if SEMANTIC_SEARCH_AVAILABLE and len(query.split()) > 1:
-            results = search_engine.perform_semantic_search(query, filtered_properties)
-        else:
-            # Fallback to filtered results
-            results = list(filtered_properties.order_by('-created_at'))
+        # Reuse the ranking of an identical (normalized) recent query
+        cache_key = result_cache.make_key(query, intent, 'semantic' if use_semantic else 'structured')
+        cached_ids = result_cache.get_ranked_ids(cache_key)
         
-        # Limit results for performance
-        results = results[:50]
+        if cached_ids is not None:
+            results = result_cache.load_properties(cached_ids)
+        else:
+            # Build smart query
+            smart_query = search_engine.build_smart_query(intent)
+            filtered_properties = Property.objects.filter(smart_query)
+            
+            results = None
+            if use_semantic:
+                results = search_engine.perform_semantic_search(query, filtered_properties, intent)
+                if results is None:
+                    # Ranking did not run; cache the structured order under its own key
+                    cache_key = result_cache.make_key(query, intent, 'structured')
+            if results is None:
+                # Fallback to filtered results, best text matches first
+                results = list(search_engine.order_by_text_rank(filtered_properties, intent))
+            
+            # Limit results for performance
+            results = list(results[:50])
+            result_cache.set_ranked_ids(cache_key, [prop.id for prop in results])
         
         # Update user recommendations
         if results:
             update_recommendations(request.user, query, results[:10])
+        
+        # One query for the thumbnails of all results
+        prefetch_related_objects(results, 'images')
+    
+    search_metadata['semantic_warming'] = model_provider.is_loading()
     
-    # Get user favorites
+    # Get user favorites (among the results shown)
     favorite_property_ids = []
     if request.user.is_authenticated and hasattr(request.user, 'is_customer'):
         if callable(getattr(request.user, 'is_customer', None)) and request.user.is_customer():
-            favorite_property_ids = list(
-                Favorite.objects.filter(user=request.user)
-                .values_list('property__id', flat=True)
+            favorite_property_ids = relationships.ids_with(
+                relationships.get_relationships(request.user, [prop.id for prop in results]),
+                'is_favorite'
             )
     
+    # Latest searches for the history card; counted only when there are more
+    user_searches = SearchHistory.objects.filter(user=request.user)
+    recent_searches = list(user_searches[:4])
+    search_history_count = user_searches.count() if len(recent_searches) > 3 else len(recent_searches)
+    
     context = {
         'query': query,
         'results': results,
+        'recent_searches': recent_searches[:3],
+        'search_history_count': search_history_count,
         'favorite_property_ids': favorite_property_ids,
         'current_time': datetime.datetime.now(),
         'search_metadata': search_metadata,
@@ -245,30 +344,20 @@ def search_properties(request):
     
     return render(request, 'search/search_results.html', context)
 
+@login_required
+@user_passes_test(lambda user: user.is_superuser)
+def search_cache_stats(request):
+    """Hit/miss counters of the search result cache (for sizing the cache)"""
+    return JsonResponse(result_cache.cache_stats())
+
 @require_GET
 def search_suggestions(request):
-    """API endpoint for search suggestions"""
+    """API endpoint for search suggestions (served from the in-memory prefix index)"""
     query = request.GET.get('q', '').strip()
     suggestions = []
     
     if len(query) >= 2:
-        # Get recent searches
-        recent_searches = SearchHistory.objects.filter(
-            query__icontains=query
-        ).values_list('query', flat=True).distinct()[:5]
-        
-        # Get property titles and addresses that match
-        property_matches = Property.objects.filter(
-            Q(title__icontains=query) | Q(address__icontains=query),
-            status='available'
-        ).values_list('title', 'address')[:5]
-        
-        # Combine suggestions
-        suggestions.extend(list(recent_searches))
-        suggestions.extend([f"{title} - {address}" for title, address in property_matches])
-        
-        # Remove duplicates and limit
-        suggestions = list(set(suggestions))[:8]
+        suggestions = autocomplete.suggest(query, limit=8)
     
     return JsonResponse({'suggestions': suggestions})
 
@@ -291,13 +380,15 @@ def recommendations_view(request):
     # Analyze user preferences
     user_preferences = analyze_user_preferences(request.user)
     
-    # Get favorite property IDs
+    # Get favorite property IDs (among the recommendations shown)
     favorite_property_ids = []
     if hasattr(request.user, 'is_customer') and callable(getattr(request.user, 'is_customer', None)):
         if request.user.is_customer():
-            favorite_property_ids = list(
-                Favorite.objects.filter(user=request.user)
-                .values_list('property__id', flat=True)
+            favorite_property_ids = relationships.ids_with(
+                relationships.get_relationships(
+                    request.user, [recommendation.property_id for recommendation in recommendations]
+                ),
+                'is_favorite'
             )
     
     context = {
@@ -351,87 +442,11 @@ def analyze_user_preferences(user):
     return preferences
 
 def update_recommendations(user, query, results):
-    """Update user recommendations based on search results with enhanced keyword matching"""
+    """Queue a recommendation update for the user; applied by the background worker"""
     if not results:
         return
     
-    # Define keyword groups for semantic similarity (same as in properties/views.py)
-    keyword_groups = {
-        'luxury': ['luxury', 'premium', 'elegant', 'upscale', 'high-end', 'deluxe', 'exclusive', 'sophisticated'],
-        'cozy': ['cozy', 'comfortable', 'warm', 'inviting', 'charming', 'intimate', 'homely', 'snug'],
-        'modern': ['modern', 'contemporary', 'stylish', 'updated', 'renovated', 'new', 'sleek', 'chic'],
-        'spacious': ['spacious', 'large', 'big', 'roomy', 'vast', 'expansive', 'wide', 'generous'],
-        'beautiful': ['beautiful', 'stunning', 'gorgeous', 'lovely', 'attractive', 'magnificent', 'spectacular'],
-        'quiet': ['quiet', 'peaceful', 'serene', 'tranquil', 'calm', 'silent', 'secluded'],
-        'family': ['family', 'kids', 'children', 'school', 'playground', 'safe', 'friendly'],
-        'garden': ['garden', 'yard', 'outdoor', 'green', 'lawn', 'patio', 'terrace', 'balcony'],
-        'view': ['view', 'scenic', 'mountain', 'valley', 'city', 'panoramic', 'overlooking'],
-        'convenient': ['convenient', 'accessible', 'central', 'nearby', 'close', 'walking', 'transport']
-    }
-    
-    def extract_keywords_from_query(query_text):
-        """Extract semantic keywords from search query"""
-        query_lower = query_text.lower()
-        found_keywords = set()
-        
-        for group_name, keywords in keyword_groups.items():
-            for keyword in keywords:
-                if keyword in query_lower:
-                    found_keywords.add(group_name)
-                    break
-        
-        return found_keywords
-    
-    def calculate_property_relevance(property_obj, query_keywords):
-        """Calculate how relevant a property is to the search query"""
-        property_title_lower = property_obj.title.lower()
-        property_desc_lower = property_obj.description.lower()
-        
-        property_keywords = set()
-        for group_name, keywords in keyword_groups.items():
-            for keyword in keywords:
-                if keyword in property_title_lower or keyword in property_desc_lower:
-                    property_keywords.add(group_name)
-                    break
-        
-        if not query_keywords or not property_keywords:
-            return 0.5  # Base relevance for non-semantic matches
-        
-        # Calculate Jaccard similarity
-        intersection = len(query_keywords.intersection(property_keywords))
-        union = len(query_keywords.union(property_keywords))
-        
-        return intersection / union if union > 0 else 0.5
-    
-    # Extract semantic keywords from the search query
-    query_keywords = extract_keywords_from_query(query)
-    
-    # Clear old recommendations older than 30 days
-    old_date = datetime.datetime.now() - datetime.timedelta(days=30)
-    Recommendation.objects.filter(user=user, created_at__lt=old_date).delete()
-    
-    # Add new recommendations with enhanced scoring
-    for i, property_obj in enumerate(results):
-        # Calculate base score based on search rank
-        rank_score = 1.0 - (i * 0.1)  # Decreasing score for lower ranked results
-        
-        # Calculate semantic relevance
-        semantic_score = calculate_property_relevance(property_obj, query_keywords)
-        
-        # Combine scores
-        final_score = (rank_score * 0.6) + (semantic_score * 0.4)
-        final_score = min(final_score, 1.0)
-        
-        # Only add if score is meaningful
-        if final_score > 0.3:
-            # Create or update recommendation
-            recommendation, created = Recommendation.objects.get_or_create(
-                user=user,
-                property=property_obj,
-                defaults={'score': final_score}
-            )
-            
-            if not created:
-                # Update existing recommendation (weighted average)
-                recommendation.score = (recommendation.score * 0.7) + (final_score * 0.3)
-                recommendation.save()
\ No newline at end of file
+    enqueue(UPDATE_RECOMMENDATIONS, user.pk, {
+        'query': query,
+        'property_ids': [property_obj.id for property_obj in results],
+    })